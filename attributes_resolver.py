@@ -0,0 +1,111 @@
+import json
+import threading
+from collections import OrderedDict
+from sqlalchemy import text, bindparam
+
+
+class AttributesResolver:
+    """state_attributes를 attributes_id 단위로 한 번만 가져와 파싱하는 캐시
+
+    HA는 같은 속성 묶음(shared_attrs)을 수천 개의 states 행이 공유하므로,
+    결과에 나온 고유 attributes_id만 일괄 조회하고 파싱한 dict를 LRU로 보관한다.
+    같은 id의 행들은 같은 dict 객체를 참조하므로 메모리와 파싱 비용이 행 수가 아니라
+    고유 속성 묶음 수에 비례한다.
+    """
+
+    def __init__(self, ha_db, max_entries=50000, batch_size=1000):
+        self.ha_db = ha_db
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self._parsed = OrderedDict()  # attributes_id -> dict
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, attributes_ids):
+        """attributes_id 목록(결측값 제외)을 {id: 파싱된 속성 dict}로 변환 (없는 id는 제외)"""
+        ids = {int(i) for i in attributes_ids}
+        found = {}
+        with self._lock:
+            for attributes_id in ids:
+                attrs = self._parsed.get(attributes_id)
+                if attrs is not None:
+                    self._parsed.move_to_end(attributes_id)
+                    found[attributes_id] = attrs
+            self.hits += len(found)
+            missing = sorted(ids - found.keys())
+            self.misses += len(missing)
+
+        for start in range(0, len(missing), self.batch_size):
+            fetched = self._fetch(missing[start:start + self.batch_size])
+            found.update(fetched)
+            self._store(fetched)
+        return found
+
+    def _fetch(self, ids):
+        """shared_attrs를 일괄 조회해 id마다 한 번씩 파싱"""
+        if self.ha_db.engine.dialect.name == 'postgresql':
+            stmt = text(
+                "SELECT attributes_id, shared_attrs FROM state_attributes "
+                "WHERE attributes_id = ANY(:ids)"
+            )
+        else:
+            stmt = text(
+                "SELECT attributes_id, shared_attrs FROM state_attributes "
+                "WHERE attributes_id IN :ids"
+            ).bindparams(bindparam('ids', expanding=True))
+        rows = self.ha_db.read_sql(stmt, {'ids': ids}, use_cache=False)
+
+        parsed = {}
+        for attributes_id, shared_attrs in zip(rows['attributes_id'], rows['shared_attrs']):
+            try:
+                parsed[int(attributes_id)] = json.loads(shared_attrs) if shared_attrs else {}
+            except ValueError:
+                parsed[int(attributes_id)] = {}
+        return parsed
+
+    def _store(self, parsed):
+        with self._lock:
+            for attributes_id, attrs in parsed.items():
+                self._parsed[attributes_id] = attrs
+                self._parsed.move_to_end(attributes_id)
+            while len(self._parsed) > self.max_entries:
+                self._parsed.popitem(last=False)
+
+    def attach(self, df, column='attributes_id', name='attributes'):
+        """파싱된 속성 dict를 참조하는 컬럼 추가 (같은 id는 같은 객체를 공유)"""
+        mapping = self.resolve(df[column].dropna().unique())
+        df[name] = df[column].map(mapping)
+        return df
+
+    def expand(self, df, keys, column='attributes_id', prefix='attr_'):
+        """필요한 속성 키만 컬럼으로 펼치기 (키 조회는 고유 id마다 한 번)"""
+        mapping = self.resolve(df[column].dropna().unique())
+        for key in keys:
+            values = {attributes_id: attrs.get(key) for attributes_id, attrs in mapping.items()}
+            df[f'{prefix}{key}'] = df[column].map(values)
+        return df
+
+    def to_json(self, df, column='attributes_id'):
+        """속성을 JSON 문자열 Series로 (직렬화도 고유 id마다 한 번)"""
+        mapping = self.resolve(df[column].dropna().unique())
+        serialized = {
+            attributes_id: json.dumps(attrs, ensure_ascii=False)
+            for attributes_id, attrs in mapping.items()
+        }
+        return df[column].map(serialized)
+
+    def stats(self):
+        """캐시 항목 수와 적중/실패 횟수"""
+        with self._lock:
+            return {
+                'entries': len(self._parsed),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def clear(self):
+        """파싱된 속성 모두 제거 (통계는 유지)"""
+        with self._lock:
+            self._parsed.clear()
@@ -0,0 +1,258 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+import pandas as pd
+from sqlalchemy import text
+from recorder_generator import generate
+
+# 기본 규모 (states 행 수)
+SCALES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+
+# 기준 결과보다 이 배수 이상, 그리고 이 시간(ms) 이상 느려지면 회귀로 본다
+# (수 ms짜리 조회의 측정 잡음은 회귀로 세지 않는다)
+DEFAULT_TOLERANCE = 1.5
+DEFAULT_MIN_DELTA_MS = 5.0
+
+
+def parse_scale(value):
+    """'10k', '1m', '250000' 같은 규모 표기를 행 수로"""
+    value = value.lower()
+    if value in SCALES:
+        return SCALES[value]
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(value[-1], 1)
+    return int(float(value.rstrip('km')) * multiplier)
+
+
+def scale_label(rows):
+    for label, count in SCALES.items():
+        if count == rows:
+            return label
+    return str(rows)
+
+
+def ensure_database(data_dir, rows, regenerate=False):
+    """규모별 합성 recorder DB 경로 (없거나 regenerate면 새로 생성)"""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"recorder_{rows}.db")
+    if regenerate or not os.path.exists(path):
+        start = time.perf_counter()
+        counts = generate(path, rows)
+        print(f"[{scale_label(rows)}] DB 생성 ({time.perf_counter() - start:.1f}초): {counts}")
+    return path
+
+
+def shape_of(result):
+    """결과 형태 (DataFrame이면 (행, 열), fetch_page 결과면 페이지의 형태, 정수면 행 수)"""
+    if isinstance(result, tuple):
+        result = result[0]
+    if isinstance(result, pd.DataFrame):
+        return list(result.shape)
+    return [int(result)]
+
+
+def build_cases(ha_db, now, work_dir):
+    """ha_web_viewer.main과 get_logbook의 조회 경로별 벤치마크 함수
+
+    시간 범위는 DB의 마지막 기록 시각(now) 기준이라 예전에 만든 DB도 같은 결과를 낸다.
+    """
+    day = (now - 86400, now)
+    hour = (now - 3600, now)
+
+    # 가장 활동이 많은 조명과 센서 (엔티티 필터/제외 조건용)
+    top = ha_db.read_sql("""
+        SELECT sm.entity_id, COUNT(*) AS changes
+        FROM states s
+        JOIN states_meta sm ON s.metadata_id = sm.metadata_id
+        WHERE s.last_updated_ts BETWEEN :start_ts AND :end_ts
+        GROUP BY sm.entity_id
+        ORDER BY changes DESC
+    """, {'start_ts': day[0], 'end_ts': day[1]}, use_cache=False)
+    busiest = top['entity_id'].tolist()
+    light = next((e for e in busiest if e.startswith('light.')), 'light.')
+    sensor = next((e for e in busiest if e.startswith('sensor.')), 'sensor.')
+
+    def states(limit=100, entity_filter=None, window=(None, None)):
+        query, params = ha_db.build_states_query(entity_filter, *window, limit)
+        return lambda: ha_db.read_sql(query, params)
+
+    def events(limit=100, event_type_filter=None, window=(None, None)):
+        query, params = ha_db.build_events_query(event_type_filter, *window, limit)
+        return lambda: ha_db.read_sql(query, params)
+
+    def page(table, build, steps, **filters):
+        """첫 페이지부터 steps만큼 'next'로 넘긴 뒤 'prev'로 한 번 돌아오는 페이지 이동"""
+        def run():
+            query, params = build(limit=100, **filters)
+            df, first, last, _ = ha_db.fetch_page(table, query, params)
+            for _ in range(steps):
+                query, params = build(limit=100, cursor=last, **filters)
+                df, first, last, _ = ha_db.fetch_page(table, query, params, 'next')
+            query, params = build(limit=100, cursor=first, direction='prev', **filters)
+            return ha_db.fetch_page(table, query, params, 'prev')
+        return run
+
+    def generic(table):
+        return lambda: ha_db.read_sql(f"SELECT * FROM {table} LIMIT 100", {'limit': 100})
+
+    def with_attributes(expand_keys=None):
+        query, params = ha_db.build_states_query(None, *day, 10000)
+
+        def run():
+            df = ha_db.attributes.attach(ha_db.read_sql(query, params))
+            if expand_keys:
+                df = ha_db.attributes.expand(df, expand_keys)
+            return df
+        return run
+
+    def export(kind, **filters):
+        path = os.path.join(work_dir, f"export_{kind}.csv")
+        method = ha_db.export_states if kind == 'states' else ha_db.export_events
+        return lambda: method(path, 'csv', **filters)
+
+    def logbook(days=1, **kwargs):
+        end = datetime.fromtimestamp(now)
+        return lambda: ha_db.get_logbook(end - timedelta(days=days), end, **kwargs)
+
+    return {
+        'table_info': ha_db.get_table_info,
+        'states_latest_100': states(),
+        'states_latest_10000': states(10000),
+        'states_filter_light': states(100, 'light.'),
+        'states_range_1h': states(500000, window=hour),
+        'states_range_24h': states(500000, window=day),
+        'states_filter_range_24h': states(500000, light, day),
+        'states_page_walk': page('states', lambda **kw: ha_db.build_states_query(**kw), 5),
+        'states_page_walk_filter_24h': page(
+            'states', lambda **kw: ha_db.build_states_query(**kw), 5,
+            entity_filter='sensor.', start_ts=day[0], end_ts=day[1],
+        ),
+        'events_latest_100': events(),
+        'events_filter_automation': events(100, 'automation'),
+        'events_range_24h': events(500000, window=day),
+        'events_page_walk': page('events', lambda **kw: ha_db.build_events_query(**kw), 5),
+        'table_states_meta': generic('states_meta'),
+        'table_state_attributes': generic('state_attributes'),
+        'table_event_types': generic('event_types'),
+        'table_logbook': generic('logbook'),
+        'attributes_attach_24h': with_attributes(),
+        'attributes_expand_24h': with_attributes(['friendly_name', 'unit_of_measurement']),
+        'export_states_24h': export('states', start_ts=day[0], end_ts=day[1]),
+        'export_events_24h': export('events', start_ts=day[0], end_ts=day[1]),
+        'logbook_24h': logbook(),
+        'logbook_entity_24h': logbook(entity_id=light),
+        'logbook_exclude_24h': logbook(exclude_states=['unavailable'], exclude_entities=[sensor]),
+        'logbook_7d': logbook(7),
+    }
+
+
+def run_case(ha_db, func, repeat):
+    """캐시를 비운 상태에서 repeat번 실행해 (최소, 중앙값 ms, 결과 형태)
+
+    HomeAssistantDB 메서드는 실패하면 오류를 출력하고 None을 반환하므로,
+    결과가 None이면 측정값으로 남기지 않고 예외로 알린다.
+    """
+    samples, result = [], None
+    for _ in range(repeat):
+        ha_db.cache.clear()
+        ha_db.attributes.clear()
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+        if result is None:
+            raise RuntimeError("조회 실패 (결과가 None)")
+    return {
+        'min_ms': round(min(samples) * 1000, 2),
+        'median_ms': round(statistics.median(samples) * 1000, 2),
+        'shape': shape_of(result),
+    }
+
+
+def run_scale(path, repeat, only=None):
+    """DB 하나에 대해 모든 조회 경로 실행"""
+    os.environ['DB_URL'] = f"sqlite:///{path}"
+    from ha_db_reader import HomeAssistantDB
+
+    ha_db = HomeAssistantDB()
+    with ha_db.engine.connect() as conn:
+        now = conn.execute(text("SELECT MAX(last_updated_ts) FROM states")).scalar()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, func in build_cases(ha_db, now, work_dir).items():
+            if only and not any(pattern in name for pattern in only):
+                continue
+            results[name] = run_case(ha_db, func, repeat)
+            r = results[name]
+            print(f"  {name:<30} {r['median_ms']:>10.2f} ms (최소 {r['min_ms']:.2f})  형태 {r['shape']}")
+    ha_db.engine.dispose()
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE, min_delta_ms=DEFAULT_MIN_DELTA_MS):
+    """기준 결과와 비교해 회귀 목록 반환 (느려졌거나 결과 형태가 달라진 경우)"""
+    regressions = []
+    for scale, cases in results.items():
+        for name, current in cases.items():
+            previous = baseline.get(scale, {}).get(name)
+            if previous is None:
+                continue
+            if previous['shape'] != current['shape']:
+                regressions.append(
+                    f"[{scale}] {name}: 결과 형태 변경 {previous['shape']} -> {current['shape']}"
+                )
+            slower = current['median_ms'] - previous['median_ms']
+            if current['median_ms'] > previous['median_ms'] * tolerance and slower >= min_delta_ms:
+                regressions.append(
+                    f"[{scale}] {name}: {previous['median_ms']:.2f} ms -> {current['median_ms']:.2f} ms "
+                    f"({current['median_ms'] / max(previous['median_ms'], 1e-9):.1f}배)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="합성 recorder DB로 조회 경로 벤치마크")
+    parser.add_argument('--scales', nargs='+', default=['10k', '1m'],
+                        help="states 행 수 (10k, 1m, 10m 또는 숫자)")
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'ha_recorder_bench'),
+                        help="합성 DB를 보관할 디렉터리 (규모별로 재사용)")
+    parser.add_argument('--regenerate', action='store_true', help="합성 DB를 새로 생성")
+    parser.add_argument('--repeat', type=int, default=3, help="경로별 반복 횟수")
+    parser.add_argument('--only', nargs='+', help="이름에 이 문자열이 들어간 경로만 실행")
+    parser.add_argument('--output', help="결과를 저장할 JSON 파일")
+    parser.add_argument('--baseline', help="비교할 기준 결과 JSON 파일")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="기준 대비 허용 배수 (중앙값 기준)")
+    parser.add_argument('--min-delta-ms', type=float, default=DEFAULT_MIN_DELTA_MS,
+                        help="회귀로 볼 최소 증가 시간 (ms)")
+    args = parser.parse_args()
+
+    results = {}
+    for scale in args.scales:
+        rows = parse_scale(scale)
+        path = ensure_database(args.data_dir, rows, args.regenerate)
+        print(f"[{scale_label(rows)}] {path}")
+        results[scale_label(rows)] = run_scale(path, args.repeat, args.only)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"결과 저장: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\n회귀 {len(regressions)}건:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n기준 대비 회귀 없음")
+
+
+if __name__ == "__main__":
+    main()
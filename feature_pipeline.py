@@ -0,0 +1,229 @@
+import json
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from local_tz import LOCAL_TZ
+
+# .env 파일에서 환경 변수 로드
+load_dotenv()
+
+# 맥락 엔티티 컬럼을 제외한 기본 특징 컬럼
+BASE_COLUMNS = [
+    'entity',             # 엔티티 코드
+    'state',              # 새 상태 코드
+    'hour_sin', 'hour_cos',
+    'weekday_sin', 'weekday_cos',
+    'since_last_change',  # 같은 엔티티의 직전 상태 변경 이후 초 (처음이면 -1)
+]
+
+# 기간 내 상태 변경(속성만 바뀐 행 제외)을 시간순으로 읽는 쿼리
+STATE_CHANGES_QUERY = """
+SELECT
+    s.state_id,
+    sm.entity_id,
+    s.state,
+    s.last_updated_ts AS ts
+FROM states s
+JOIN states_meta sm ON s.metadata_id = sm.metadata_id
+WHERE s.last_updated_ts BETWEEN :start_ts AND :end_ts
+  AND (s.last_changed_ts IS NULL OR s.last_changed_ts = s.last_updated_ts)
+ORDER BY s.last_updated_ts, s.state_id
+"""
+
+# 기간 내 상태 변경이 많은 엔티티
+TOP_ENTITIES_QUERY = """
+SELECT sm.entity_id, COUNT(*) AS changes
+FROM states s
+JOIN states_meta sm ON s.metadata_id = sm.metadata_id
+WHERE s.last_updated_ts BETWEEN :start_ts AND :end_ts
+  AND (s.last_changed_ts IS NULL OR s.last_changed_ts = s.last_updated_ts)
+GROUP BY sm.entity_id
+ORDER BY changes DESC
+LIMIT :limit
+"""
+
+
+def state_change_chunks(ha_db, start_ts, end_ts, chunksize=100000):
+    """recorder DB의 상태 변경을 시간순 청크(state_id, entity_id, state, ts)로 생성"""
+    return ha_db.iter_sql(
+        STATE_CHANGES_QUERY, {'start_ts': start_ts, 'end_ts': end_ts}, chunksize
+    )
+
+
+def top_entities(ha_db, start_ts, end_ts, limit=10):
+    """기간 내 상태 변경이 가장 많은 엔티티 ID 목록 (맥락 엔티티 기본값)"""
+    df = ha_db.read_sql(
+        TOP_ENTITIES_QUERY, {'start_ts': start_ts, 'end_ts': end_ts, 'limit': limit}
+    )
+    return df['entity_id'].tolist()
+
+
+class FeaturePipeline:
+    """상태 변경 이력을 청크 단위로 받아 이벤트별 특징 행렬(float32)로 변환
+
+    청크 사이에 이어져야 하는 값(엔티티별 마지막 변경 시각, 맥락 엔티티의 현재 상태,
+    엔티티/상태 코드표)만 작은 배열로 들고 다니므로, 메모리 사용량은 전체 이력이 아니라
+    청크 크기 x 컬럼 수로 정해진다. 청크 안의 계산은 모두 NumPy/pandas 벡터 연산이다.
+
+    맥락 엔티티 컬럼에는 이벤트 직전 시점의 그 엔티티 상태 코드가 들어간다
+    (이벤트 자신의 새 상태가 새어 들어가지 않도록 직전 값 사용, 모르면 -1).
+    """
+
+    def __init__(self, context_entities=(), tz=LOCAL_TZ):
+        self.context_entities = list(context_entities)
+        self.tz = tz
+        self.entity_codes = {}
+        self.state_codes = {}
+        self.columns = BASE_COLUMNS + [f'ctx:{entity_id}' for entity_id in self.context_entities]
+
+        self._context_codes = np.array(
+            [self._code(self.entity_codes, entity_id) for entity_id in self.context_entities],
+            dtype=np.int64
+        )
+        self._last_change = np.full(len(self.entity_codes), np.nan)
+        self._context_state = np.full(len(self.context_entities), -1.0)
+
+    @staticmethod
+    def _code(mapping, value):
+        return mapping.setdefault(value, len(mapping))
+
+    def _encode(self, mapping, values):
+        """문자열 배열을 정수 코드로 (사전 조회는 고유 값마다 한 번)"""
+        codes, uniques = pd.factorize(values)
+        table = np.array([self._code(mapping, value) for value in uniques], dtype=np.int64)
+        return table[codes] if len(codes) else np.empty(0, dtype=np.int64)
+
+    def transform(self, chunk):
+        """시간순 청크(entity_id, state, ts) 하나를 특징 행렬로 변환
+
+        Returns:
+            ndarray: (행 수, 컬럼 수) float32
+        """
+        n = len(chunk)
+        features = np.empty((n, len(self.columns)), dtype=np.float32)
+        if n == 0:
+            return features
+
+        ts = chunk['ts'].to_numpy(dtype=np.float64)
+        entities = self._encode(self.entity_codes, chunk['entity_id'].to_numpy())
+        states = self._encode(self.state_codes, chunk['state'].astype(str).to_numpy())
+        features[:, 0] = entities
+        features[:, 1] = states
+
+        # 현지 시각 기준 주기 인코딩
+        local = pd.to_datetime(ts, unit='s', utc=True).tz_convert(self.tz)
+        hour = local.hour + local.minute / 60 + local.second / 3600
+        weekday = local.dayofweek + hour / 24
+        features[:, 2] = np.sin(2 * np.pi * hour / 24)
+        features[:, 3] = np.cos(2 * np.pi * hour / 24)
+        features[:, 4] = np.sin(2 * np.pi * weekday / 7)
+        features[:, 5] = np.cos(2 * np.pi * weekday / 7)
+
+        # 같은 엔티티의 직전 변경 시각 (청크 첫 등장은 이전 청크에서 이어받음)
+        if len(self._last_change) < len(self.entity_codes):
+            grown = np.full(len(self.entity_codes), np.nan)
+            grown[:len(self._last_change)] = self._last_change
+            self._last_change = grown
+        ts_series = pd.Series(ts)
+        previous = ts_series.groupby(entities).shift(1).to_numpy(copy=True)
+        first = np.isnan(previous)
+        previous[first] = self._last_change[entities[first]]
+        since = ts - previous
+        features[:, 6] = np.where(np.isnan(since), -1.0, since)
+        last = ts_series.groupby(entities).last()
+        self._last_change[last.index.to_numpy()] = last.to_numpy()
+
+        # 맥락 엔티티의 이벤트 직전 상태: 해당 엔티티 행의 상태를 한 칸 밀어 forward-fill
+        if len(self.context_entities):
+            own = entities[:, None] == self._context_codes[None, :]
+            values = np.where(own, states[:, None].astype(np.float64), np.nan)
+            shifted = np.vstack([self._context_state[None, :], values[:-1]])
+            filled = pd.DataFrame(shifted).ffill().to_numpy()
+            features[:, len(BASE_COLUMNS):] = filled
+            # 다음 청크를 위해 청크 끝 시점 상태 보관
+            tail = pd.DataFrame(np.vstack([filled[-1:], values[-1:]])).ffill().to_numpy()
+            self._context_state = tail[-1]
+        return features
+
+    def run(self, chunks, out_path=None):
+        """청크들을 모두 변환
+
+        Args:
+            chunks (iterable): 시간순 DataFrame 청크 (state_change_chunks 등)
+            out_path (str): 지정하면 행렬을 메모리에 모으지 않고 float32 원시 파일로 이어 쓰고
+                out_path + '.json'에 컬럼/행 수를 기록한다 (load_features로 memmap 열기)
+
+        Returns:
+            ndarray: 특징 행렬 (out_path를 지정하면 memmap)
+        """
+        if out_path is None:
+            parts = [self.transform(chunk) for chunk in chunks]
+            if not parts:
+                return np.empty((0, len(self.columns)), dtype=np.float32)
+            return np.concatenate(parts)
+
+        rows = 0
+        with open(out_path, 'wb') as f:
+            for chunk in chunks:
+                features = self.transform(chunk)
+                f.write(features.tobytes())
+                rows += len(features)
+        with open(out_path + '.json', 'w', encoding='utf-8') as f:
+            json.dump({
+                'columns': self.columns,
+                'rows': rows,
+                'dtype': 'float32',
+                'entities': list(self.entity_codes),
+                'states': list(self.state_codes),
+            }, f, ensure_ascii=False)
+        return load_features(out_path)[0]
+
+    def decode_entity(self, code):
+        """엔티티 코드를 entity_id로"""
+        return list(self.entity_codes)[int(code)]
+
+    def decode_state(self, code):
+        """상태 코드를 상태 값으로"""
+        return list(self.state_codes)[int(code)]
+
+
+def load_features(path):
+    """run(out_path=...)로 저장한 특징 행렬을 읽기 전용 memmap으로 열기
+
+    Returns:
+        tuple: (memmap 행렬, 메타데이터 dict)
+    """
+    with open(path + '.json', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta['rows'] == 0:
+        return np.empty((0, len(meta['columns'])), dtype=meta['dtype']), meta
+    matrix = np.memmap(path, dtype=meta['dtype'], mode='r', shape=(meta['rows'], len(meta['columns'])))
+    return matrix, meta
+
+
+def main():
+    from ha_db_reader import HomeAssistantDB
+
+    parser = argparse.ArgumentParser(description="recorder 상태 이력으로 이벤트별 특징 행렬 생성")
+    parser.add_argument('out', help="특징 행렬을 저장할 파일 경로 (메타데이터는 <경로>.json)")
+    parser.add_argument('--days', type=int, default=30, help="사용할 최근 일수")
+    parser.add_argument('--context', type=int, default=10, help="맥락 엔티티 수 (변경이 많은 순)")
+    parser.add_argument('--chunksize', type=int, default=100000, help="한 번에 처리할 행 수")
+    args = parser.parse_args()
+
+    ha_db = HomeAssistantDB()
+    end_ts = datetime.now().timestamp()
+    start_ts = end_ts - timedelta(days=args.days).total_seconds()
+
+    pipeline = FeaturePipeline(top_entities(ha_db, start_ts, end_ts, args.context))
+    matrix = pipeline.run(
+        state_change_chunks(ha_db, start_ts, end_ts, args.chunksize), out_path=args.out
+    )
+    print(f"특징 행렬: {matrix.shape} ({matrix.nbytes / 1024 / 1024:.1f} MB) -> {args.out}")
+    print(f"컬럼: {pipeline.columns}")
+
+
+if __name__ == "__main__":
+    main()
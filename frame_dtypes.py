@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+# 알려진 recorder/로그북 컬럼의 목표 타입
+#   category: 값 종류가 적은 문자열 (종류 수가 행 수의 MAX_CATEGORY_RATIO 이하일 때만)
+#   id: 값 범위에 맞는 가장 작은 정수 (결측값이 있으면 nullable 정수)
+#   float64: epoch 초 타임스탬프 (keyset 커서가 정확한 값을 비교하므로 float32로 줄이지 않는다)
+#   datetime: UTC datetime64
+COLUMN_DTYPES = {
+    'entity_id': 'category',
+    'state': 'category',
+    'entity_state': 'category',
+    'event_type': 'category',
+    'event_type_name': 'category',
+    'domain': 'category',
+    'name': 'category',
+    'message': 'category',
+    'state_id': 'id',
+    'old_state_id': 'id',
+    'metadata_id': 'id',
+    'attributes_id': 'id',
+    'event_id': 'id',
+    'data_id': 'id',
+    'event_type_id': 'id',
+    'last_changed_ts': 'float64',
+    'last_updated_ts': 'float64',
+    'last_reported_ts': 'float64',
+    'time_fired_ts': 'float64',
+    'ts': 'float64',
+    'time_fired': 'datetime',
+    'when': 'datetime',
+}
+
+# 고유 값 비율이 이보다 높으면 category가 오히려 커지므로 문자열로 둔다
+MAX_CATEGORY_RATIO = 0.5
+
+INT_WIDTHS = (8, 16, 32, 64)
+
+
+def _to_id(series):
+    """값 범위에 맞는 가장 작은 정수 타입으로 (결측값이 있으면 Int8~Int64)"""
+    values = pd.to_numeric(series)
+    present = values.dropna()
+    if present.empty or (present != np.floor(present)).any():
+        return series
+    lo, hi = present.min(), present.max()
+    width = next(w for w in INT_WIDTHS if np.iinfo(f'int{w}').min <= lo and hi <= np.iinfo(f'int{w}').max)
+    return values.astype(f'Int{width}' if len(present) < len(values) else f'int{width}')
+
+
+def _to_category(series, max_ratio):
+    if isinstance(series.dtype, pd.CategoricalDtype) or series.empty:
+        return series
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if series.nunique() > max_ratio * len(series):
+        return series
+    return series.astype('category')
+
+
+def compact_frame(df, dtypes=None, max_category_ratio=MAX_CATEGORY_RATIO):
+    """알려진 컬럼을 작은 타입으로 바꾼 DataFrame과 메모리 보고
+
+    Args:
+        df (DataFrame): 변환할 결과 (수정하지 않는다)
+        dtypes (dict): 컬럼 -> 'category'/'id'/'float64'/'datetime' (기본값: COLUMN_DTYPES)
+        max_category_ratio (float): category로 바꿀 최대 고유 값 비율
+
+    Returns:
+        tuple: (DataFrame, {'before': 바이트, 'after': 바이트, 'columns': {컬럼: '이전 -> 이후'}})
+    """
+    dtypes = COLUMN_DTYPES if dtypes is None else dtypes
+    before = int(df.memory_usage(deep=True).sum())
+    out = df.copy(deep=False)
+    changed = {}
+    for column, kind in dtypes.items():
+        if column not in out.columns:
+            continue
+        series = out[column]
+        if kind == 'category':
+            converted = _to_category(series, max_category_ratio)
+        elif kind == 'id':
+            converted = _to_id(series)
+        elif kind == 'datetime':
+            converted = series if pd.api.types.is_datetime64_any_dtype(series) \
+                else pd.to_datetime(series, utc=True, format='ISO8601')
+        else:
+            converted = series.astype(kind)
+        if converted.dtype != series.dtype:
+            out[column] = converted
+            changed[column] = f"{series.dtype} -> {converted.dtype}"
+
+    return out, {
+        'before': before,
+        'after': int(out.memory_usage(deep=True).sum()),
+        'columns': changed,
+    }
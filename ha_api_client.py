@@ -0,0 +1,125 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+# .env 파일에서 환경 변수 로드
+load_dotenv()
+
+# 일시적인 서버 오류로 보고 재시도하는 HTTP 상태 코드
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HAClient:
+    """Home Assistant REST API 공용 클라이언트
+
+    하나의 requests.Session으로 커넥션을 재사용(keep-alive)하고, gzip/deflate 응답을
+    받으며, 연결 오류와 일시적인 5xx/429 응답은 지터가 있는 지수 백오프로 재시도한다.
+    요청마다 걸린 시간을 기록해 지연 시간 통계를 제공한다.
+    """
+
+    def __init__(self, base_url=None, token=None, connect_timeout=None, read_timeout=None,
+                 retries=None, backoff=None, pool_size=10, history=1000):
+        self.base_url = (base_url or os.getenv('HA_URL') or '').rstrip('/')
+        self.token = token or os.getenv('HA_TOKEN')
+        self.timeout = (
+            float(connect_timeout or os.getenv('HA_CONNECT_TIMEOUT', '5')),
+            float(read_timeout or os.getenv('HA_READ_TIMEOUT', '30')),
+        )
+        self.retries = int(retries if retries is not None else os.getenv('HA_RETRIES', '3'))
+        self.backoff = float(backoff if backoff is not None else os.getenv('HA_BACKOFF', '0.5'))
+
+        self.session = requests.Session()
+        # 재시도는 직접 처리하므로 어댑터 자체 재시도는 끈다
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+        })
+
+        self._latencies = deque(maxlen=history)  # (경로, 초, 상태 코드 또는 None)
+        self._lock = threading.Lock()
+        self.retry_count = 0
+        self.error_count = 0
+
+    def get(self, path, params=None, timeout=None):
+        """GET 요청 후 JSON 응답 반환 (재시도 후에도 실패하면 requests 예외 발생)"""
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=timeout or self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._record(path, time.perf_counter() - start, None)
+                if attempt == self.retries:
+                    self.error_count += 1
+                    raise
+                self._wait(attempt)
+                continue
+
+            self._record(path, time.perf_counter() - start, response.status_code)
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                self._wait(attempt)
+                continue
+            if not response.ok:
+                self.error_count += 1
+            response.raise_for_status()
+            return response.json()
+
+    def _wait(self, attempt):
+        """지수 백오프에 full jitter를 적용해 대기"""
+        self.retry_count += 1
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def _record(self, path, seconds, status):
+        with self._lock:
+            self._latencies.append((path, seconds, status))
+
+    def metrics(self):
+        """최근 요청들의 지연 시간 통계 (밀리초)"""
+        with self._lock:
+            samples = sorted(seconds for _, seconds, _ in self._latencies)
+        if not samples:
+            return {'requests': 0, 'retries': self.retry_count, 'errors': self.error_count}
+
+        def percentile(p):
+            return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+        return {
+            'requests': len(samples),
+            'p50_ms': percentile(0.50),
+            'p99_ms': percentile(0.99),
+            'max_ms': samples[-1] * 1000,
+            'retries': self.retry_count,
+            'errors': self.error_count,
+        }
+
+    def metrics_summary(self):
+        """화면에 표시할 한 줄 요약 (아직 요청이 없으면 None)"""
+        metrics = self.metrics()
+        if not metrics['requests']:
+            return None
+        return (
+            f"REST 요청 {metrics['requests']}회 · p50 {metrics['p50_ms']:.0f} ms · "
+            f"p99 {metrics['p99_ms']:.0f} ms · 재시도 {metrics['retries']}회"
+        )
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_default_client():
+    """프로세스 전체에서 공유하는 HAClient (페이지들이 같은 커넥션 풀을 사용)"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HAClient()
+        return _default_client
@@ -0,0 +1,178 @@
+import os
+import time
+import asyncio
+import threading
+import argparse
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from ha_db_reader import HomeAssistantDB
+
+# .env 파일에서 환경 변수 로드
+load_dotenv()
+
+# DB 종류별 asyncio 드라이버 (SQLite는 로컬 테스트용, 모두 requirements.txt에 포함)
+ASYNC_DRIVERS = {
+    'sqlite': 'aiosqlite',
+    'postgresql': 'asyncpg',
+    'mysql': 'aiomysql',
+    'mariadb': 'aiomysql',
+}
+
+
+def async_url(url):
+    """동기 DB URL을 asyncio 드라이버 URL로 변환 (이미 asyncio 드라이버면 그대로)"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None:
+        raise ValueError(f"asyncio 드라이버를 알 수 없는 DB입니다: {backend}")
+    if url.get_driver_name() == driver:
+        return url
+    return url.set(drivername=f"{backend}+{driver}")
+
+
+class AsyncHomeAssistantDB:
+    """SQLAlchemy asyncio 엔진으로 쿼리를 실행하는 HomeAssistantDB
+
+    쿼리 생성, 결과 캐시, 이름 -> id 표, 속성 캐시와 계측기는 동기 HomeAssistantDB와
+    공유하고 실행만 비동기로 한다. 서로 의존하지 않는 쿼리를 gather로 한꺼번에 보내면
+    화면 하나의 비용이 쿼리 시간의 합이 아니라 가장 느린 쿼리 시간이 된다.
+    비동기 연결은 이벤트 루프에 묶이므로 전용 루프 스레드 하나에서 모두 실행하고,
+    Streamlit 같은 동기 코드는 run()/fetch_all()로 결과를 기다린다.
+    """
+
+    def __init__(self, ha_db=None):
+        self.ha_db = ha_db or HomeAssistantDB()
+        # ASYNC_DB_URL이 없으면 DB_URL의 드라이버만 바꿔 쓴다 (ASYNC_DRIVERS)
+        self.engine = create_async_engine(async_url(os.getenv('ASYNC_DB_URL') or self.ha_db.db_url))
+        self.ha_db.profiler.attach(self.engine.sync_engine)
+        self.cache = self.ha_db.cache
+        self._loop = None
+        self._lock = threading.Lock()
+
+    async def read_sql(self, query, params=None, ttl=None, use_cache=True, compact=False):
+        """HomeAssistantDB.read_sql의 비동기 버전 (같은 캐시를 쓴다)"""
+        if isinstance(query, str):
+            query = text(query)
+        if not use_cache:
+            df = await self._read_frame(query, params)
+            return self.ha_db._compact(df) if compact else df
+
+        params = self.cache.snap_params(params)
+        key = self.cache.make_key(query, params) + (compact,)
+        df = self.cache.get(key)
+        if df is None:
+            df = await self._read_frame(query, params)
+            if compact:
+                df = self.ha_db._compact(df)
+            self.cache.put(key, df, ttl)
+        # 호출자가 결과를 수정해도 캐시된 원본은 그대로 두기 위해 복사본 반환
+        return df.copy()
+
+    async def _read_frame(self, query, params=None):
+        """쿼리 실행, fetch, DataFrame 생성을 나눠 재고 계측 기록에 남긴다"""
+        async with self.engine.connect() as conn:
+            start = time.perf_counter()
+            result = await conn.execute(query, params or {})
+            executed = time.perf_counter()
+            rows = result.fetchall()
+            fetched = time.perf_counter()
+            df = pd.DataFrame.from_records(rows, columns=list(result.keys()), coerce_float=True)
+            built = time.perf_counter()
+            # 실행 계획 수집은 동기 API를 쓰므로 연결의 greenlet 안에서 실행한다
+            await conn.run_sync(
+                self.ha_db.profiler.complete, df, fetched - executed, built - fetched, built - start
+            )
+        return df
+
+    async def get_table_info(self):
+        """테이블 정보 조회 (실패하면 None)"""
+        try:
+            # 테이블 목록은 거의 바뀌지 않으므로 길게 캐시한다
+            return await self.read_sql(self.ha_db.table_info_query(), ttl=600)
+        except Exception as e:
+            print(f"테이블 정보 조회 실패: {str(e)}")
+            return None
+
+    async def fetch_page(self, table, query, params, direction='next', compact=False):
+        """HomeAssistantDB.fetch_page의 비동기 버전"""
+        page_size = params['limit']
+        df = await self.read_sql(query, {**params, 'limit': page_size + 1}, compact=compact)
+        return self.ha_db.page_result(table, df, page_size, direction)
+
+    async def gather(self, queries):
+        """서로 독립인 조회를 동시에 실행
+
+        Args:
+            queries (dict): 이름 -> 코루틴 또는 read_sql 인자 튜플 (query, params)
+
+        Returns:
+            dict: 이름 -> 결과 (모든 조회가 끝난 뒤 함께 반환)
+        """
+        coroutines = [
+            query if asyncio.iscoroutine(query) else self.read_sql(*query)
+            for query in queries.values()
+        ]
+        results = await asyncio.gather(*coroutines)
+        return dict(zip(queries, results))
+
+    def run(self, coroutine):
+        """전용 이벤트 루프 스레드에서 코루틴을 실행하고 결과를 기다린다 (동기 코드용)"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever, name='ha-db-async', daemon=True
+                ).start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def fetch_all(self, queries):
+        """gather의 동기 버전"""
+        return self.run(self.gather(queries))
+
+    def close(self):
+        """연결 풀을 닫고 루프 스레드 종료"""
+        if self._loop is not None:
+            self.run(self.engine.dispose())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="독립 쿼리의 순차 실행과 동시 실행 시간 비교")
+    parser.add_argument('--hours', type=float, default=24, help="조회할 최근 시간 범위")
+    parser.add_argument('--limit', type=int, default=100000, help="쿼리별 최대 행 수")
+    args = parser.parse_args()
+
+    ha_db = HomeAssistantDB()
+    async_db = AsyncHomeAssistantDB(ha_db)
+    end_ts = time.time()
+    start_ts = end_ts - args.hours * 3600
+    queries = {
+        'table_info': (ha_db.table_info_query(),),
+        'states': ha_db.build_states_query(None, start_ts, end_ts, args.limit),
+        'events': ha_db.build_events_query(None, start_ts, end_ts, args.limit),
+    }
+
+    start = time.perf_counter()
+    for query in queries.values():
+        ha_db.read_sql(*query, use_cache=False)
+    serial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = async_db.fetch_all({
+        name: async_db.read_sql(*query, use_cache=False) for name, query in queries.items()
+    })
+    concurrent = time.perf_counter() - start
+
+    for name, df in results.items():
+        print(f"{name}: {df.shape}")
+    print(f"순차 실행: {serial * 1000:.1f} ms, 동시 실행: {concurrent * 1000:.1f} ms")
+    async_db.close()
+
+
+if __name__ == "__main__":
+    main()
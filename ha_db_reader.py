@@ -1,25 +1,129 @@
 import os
+import json
+import time
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, bindparam
 import pandas as pd
 from datetime import datetime, timedelta
+from query_cache import QueryCache
+from attributes_resolver import AttributesResolver
+from query_profiler import QueryProfiler
+from lookup_table import LookupTable
+from frame_dtypes import compact_frame
 
 # .env 파일에서 환경 변수 로드
 load_dotenv()
 
+# 로그북에 표시되는 이벤트 타입
+LOGBOOK_EVENT_TYPES = (
+    'logbook_entry',
+    'automation_triggered',
+    'script_started',
+    'homeassistant_start',
+    'homeassistant_stop',
+)
+
+def _parse_event_data(shared_data):
+    """event_data.shared_data JSON 파싱
+
+    event_data가 없는 이벤트는 LEFT JOIN 결과가 NULL(pandas에서는 NaN)인데
+    NaN은 참으로 평가되므로 문자열일 때만 파싱한다.
+    """
+    if isinstance(shared_data, str) and shared_data:
+        return json.loads(shared_data)
+    return {}
+
+
 class HomeAssistantDB:
+    # keyset 페이지네이션에 사용하는 (정렬 타임스탬프 컬럼, 고유 ID 컬럼)
+    KEYSET_COLUMNS = {
+        'states': ('s.last_updated_ts', 's.state_id'),
+        'events': ('e.time_fired_ts', 'e.event_id'),
+    }
+
     def __init__(self):
         # PostgreSQL DB 연결 문자열
         self.db_url = os.getenv('DB_URL')
         self.engine = create_engine(self.db_url)
+        # 쿼리 결과 캐시 (크기 한도 MB, 항목 TTL 초, 시간 범위 버킷 초)
+        self.cache = QueryCache(
+            max_bytes=int(float(os.getenv('QUERY_CACHE_MAX_MB', '256')) * 1024 * 1024),
+            ttl=float(os.getenv('QUERY_CACHE_TTL', '60')),
+            bucket_seconds=float(os.getenv('QUERY_CACHE_BUCKET', '60')),
+        )
+        # attributes_id별 파싱된 속성 캐시
+        self.attributes = AttributesResolver(
+            self, max_entries=int(os.getenv('ATTRIBUTES_CACHE_SIZE', '50000'))
+        )
+        # 문장별 실행/fetch/DataFrame 생성 시간 계측 (QUERY_PROFILE_EXPLAIN=1이면 실행 계획도 수집)
+        self.profiler = QueryProfiler(
+            history=int(os.getenv('QUERY_PROFILE_HISTORY', '200')),
+            explain=os.getenv('QUERY_PROFILE_EXPLAIN') == '1',
+        ).attach(self.engine)
+        # 엔티티/이벤트 타입 이름 -> id 표 (필터를 id IN 조건으로 바꾸는 데 사용)
+        lookup_refresh = float(os.getenv('LOOKUP_REFRESH', '300'))
+        self.entities = LookupTable(self, 'states_meta', 'metadata_id', 'entity_id', lookup_refresh)
+        self.event_types = LookupTable(self, 'event_types', 'event_type_id', 'event_type', lookup_refresh)
+
+    def read_sql(self, query, params=None, ttl=None, use_cache=True, compact=False):
+        """캐시를 거쳐 쿼리 결과를 DataFrame으로 조회
+
+        시간 범위 파라미터는 캐시 버킷 경계로 맞춘 값으로 실행되므로,
+        같은 버킷 안의 반복 조회는 DB에 가지 않는다.
+        compact면 알려진 recorder 컬럼을 작은 타입(frame_dtypes.COLUMN_DTYPES)으로 바꾸고
+        메모리 보고를 df.attrs['memory']에 남긴다. 캐시에도 줄어든 크기로 들어간다.
+        """
+        if isinstance(query, str):
+            query = text(query)
+        if not use_cache:
+            with self.engine.connect() as conn:
+                df = self._read_frame(conn, query, params)
+            return self._compact(df) if compact else df
+
+        params = self.cache.snap_params(params)
+        key = self.cache.make_key(query, params) + (compact,)
+        df = self.cache.get(key)
+        if df is None:
+            with self.engine.connect() as conn:
+                df = self._read_frame(conn, query, params)
+            if compact:
+                df = self._compact(df)
+            self.cache.put(key, df, ttl)
+        # 호출자가 결과를 수정해도 캐시된 원본은 그대로 두기 위해 복사본 반환
+        return df.copy()
+
+    @staticmethod
+    def _compact(df):
+        """compact_frame 적용 후 메모리 보고를 attrs에 남긴다 (복사/슬라이스에도 따라간다)"""
+        df, report = compact_frame(df)
+        df.attrs['memory'] = report
+        return df
+
+    def _read_frame(self, conn, query, params=None):
+        """쿼리를 실행해 DataFrame으로 변환 (pd.read_sql과 같은 결과)
+
+        실행, fetch, DataFrame 생성을 나눠 재고 계측 기록(self.profiler)에 남긴다.
+        """
+        start = time.perf_counter()
+        result = conn.execute(query, params or {})
+        executed = time.perf_counter()
+        rows = result.fetchall()
+        fetched = time.perf_counter()
+        df = pd.DataFrame.from_records(rows, columns=list(result.keys()), coerce_float=True)
+        built = time.perf_counter()
+        self.profiler.complete(conn, df, fetched - executed, built - fetched, built - start)
+        return df
 
     def test_connection(self):
         """DB 연결 테스트"""
         try:
             with self.engine.connect() as conn:
-                result = conn.execute(text("SELECT version()"))
-                version = result.scalar()
-                print(f"PostgreSQL 버전: {version}")
+                if self.engine.dialect.name == 'sqlite':
+                    version = conn.execute(text("SELECT sqlite_version()")).scalar()
+                    print(f"SQLite 버전: {version}")
+                else:
+                    version = conn.execute(text("SELECT version()")).scalar()
+                    print(f"PostgreSQL 버전: {version}")
                 return True
         except Exception as e:
             print(f"DB 연결 실패: {str(e)}")
@@ -47,78 +151,612 @@ class HomeAssistantDB:
             print(f"데이터 조회 실패: {str(e)}")
             return None
 
-    def get_table_info(self):
-        """테이블 정보 조회"""
-        query = """
+    def table_info_query(self):
+        """테이블 목록 쿼리 (DB 종류별)"""
+        if self.engine.dialect.name == 'sqlite':
+            # 합성 recorder DB(recorder_generator.py)나 HA 기본 SQLite DB
+            return """
+            SELECT name AS table_name
+            FROM sqlite_master
+            WHERE type = 'table' AND name NOT LIKE 'sqlite_%'
+            ORDER BY name
+            """
+        return """
         SELECT table_name 
         FROM information_schema.tables 
         WHERE table_schema = 'public'
         """
+
+    def get_table_info(self):
+        """테이블 정보 조회"""
         try:
-            with self.engine.connect() as conn:
-                df = pd.read_sql(text(query), conn)
-                print("\n사용 가능한 테이블:")
-                print(df)
-                return df
+            # 테이블 목록은 거의 바뀌지 않으므로 길게 캐시한다
+            df = self.read_sql(self.table_info_query(), ttl=600)
+            print("\n사용 가능한 테이블:")
+            print(df)
+            return df
         except Exception as e:
             print(f"테이블 정보 조회 실패: {str(e)}")
             return None
 
-    def get_logbook(self, start_time=None, end_time=None, entity_id=None):
+    def build_states_query(self, entity_filter=None, start_ts=None, end_ts=None,
+                           limit=100, cursor=None, direction='next'):
+        """states 조회 쿼리와 파라미터 생성
+
+        Args:
+            entity_filter (str): 엔티티 ID 부분 문자열 또는 glob 패턴 (예: light.*)
+            start_ts (float): 시작 타임스탬프
+            end_ts (float): 종료 타임스탬프
+            limit (int): 조회할 행 수 (페이지 크기, None이면 전체)
+            cursor (tuple): keyset 커서 (last_updated_ts, state_id)
+            direction (str): 'next'면 커서보다 과거, 'prev'면 커서보다 최신 행 조회
+        """
+        query = """
+        SELECT 
+            s.state_id,
+            sm.entity_id,
+            s.state,
+            s.attributes_id,
+            s.last_changed_ts,
+            s.last_updated_ts,
+            s.metadata_id
+        FROM states s
+        JOIN states_meta sm ON s.metadata_id = sm.metadata_id
+        """
+
+        where_clauses = []
+        params = {'limit': limit}
+
+        if entity_filter:
+            # 메모리의 states_meta에서 id로 바꿔 (metadata_id, last_updated_ts) 인덱스를 타게 한다
+            where_clauses.append("s.metadata_id IN :metadata_ids")
+            params['metadata_ids'] = self.entities.match(entity_filter)
+
+        if start_ts is not None and end_ts is not None:
+            where_clauses.append("s.last_updated_ts BETWEEN :start_ts AND :end_ts")
+            params['start_ts'] = start_ts
+            params['end_ts'] = end_ts
+
+        return self._finish_query(query, where_clauses, params, 'states', cursor, direction)
+
+    def build_events_query(self, event_type_filter=None, start_ts=None, end_ts=None,
+                           limit=100, cursor=None, direction='next'):
+        """events 조회 쿼리와 파라미터 생성
+
+        Args:
+            event_type_filter (str): 이벤트 타입 부분 문자열 또는 glob 패턴
+            start_ts (float): 시작 타임스탬프
+            end_ts (float): 종료 타임스탬프
+            limit (int): 조회할 행 수 (페이지 크기, None이면 전체)
+            cursor (tuple): keyset 커서 (time_fired_ts, event_id)
+            direction (str): 'next'면 커서보다 과거, 'prev'면 커서보다 최신 행 조회
+        """
+        query = """
+        SELECT 
+            e.event_id,
+            et.event_type as event_type_name,
+            e.time_fired_ts,
+            ed.shared_data as event_data
+        FROM events e
+        LEFT JOIN event_data ed ON e.data_id = ed.data_id
+        LEFT JOIN event_types et ON e.event_type_id = et.event_type_id
+        """
+
+        where_clauses = []
+        params = {'limit': limit}
+
+        if event_type_filter:
+            # (event_type_id, time_fired_ts) 인덱스를 타도록 메모리의 event_types에서 id로 바꾼다
+            where_clauses.append("e.event_type_id IN :event_type_ids")
+            params['event_type_ids'] = self.event_types.match(event_type_filter)
+
+        if start_ts is not None and end_ts is not None:
+            where_clauses.append("e.time_fired_ts BETWEEN :start_ts AND :end_ts")
+            params['start_ts'] = start_ts
+            params['end_ts'] = end_ts
+
+        return self._finish_query(query, where_clauses, params, 'events', cursor, direction)
+
+    def _finish_query(self, query, where_clauses, params, table, cursor, direction):
+        """WHERE 절, keyset 조건, 정렬과 LIMIT를 붙여 쿼리 완성"""
+        ts_col, id_col = self.KEYSET_COLUMNS[table]
+
+        if cursor is not None:
+            # (ts, id) 튜플 비교를 풀어 써서 ts 인덱스를 그대로 사용할 수 있게 한다
+            op = '<' if direction == 'next' else '>'
+            where_clauses.append(
+                f"{ts_col} {op}= :cursor_ts AND ({ts_col} {op} :cursor_ts OR {id_col} {op} :cursor_id)"
+            )
+            params['cursor_ts'], params['cursor_id'] = cursor
+
+        if where_clauses:
+            query += "\nWHERE " + " AND ".join(where_clauses)
+
+        # 이전 페이지는 오름차순으로 가져온 뒤 fetch_page에서 뒤집는다
+        order = 'ASC' if cursor is not None and direction == 'prev' else 'DESC'
+        query += f"\nORDER BY {ts_col} {order}, {id_col} {order}"
+        # limit이 None이면 (내보내기 등) 전체 행을 조회
+        if params.get('limit') is None:
+            params.pop('limit', None)
+        else:
+            query += "\nLIMIT :limit"
+        # id 목록 파라미터는 IN (...)으로 펼친다
+        expanding = [name for name, value in params.items() if isinstance(value, list)]
+        if expanding:
+            query = text(query).bindparams(*(bindparam(name, expanding=True) for name in expanding))
+        return query, params
+
+    def fetch_page(self, table, query, params, direction='next', compact=False):
+        """keyset 페이지 조회
+
+        페이지 크기보다 한 행을 더 가져와 같은 방향으로 다음 페이지가 있는지 판단한다.
+
+        Returns:
+            tuple: (최신순 DataFrame, 첫 행 커서, 마지막 행 커서, 같은 방향으로 더 있는지 여부)
+        """
+        page_size = params['limit']
+        df = self.read_sql(query, {**params, 'limit': page_size + 1}, compact=compact)
+        return self.page_result(table, df, page_size, direction)
+
+    def page_result(self, table, df, page_size, direction='next'):
+        """page_size + 1행 조회 결과를 (페이지, 첫 행 커서, 마지막 행 커서, 더 있는지 여부)로"""
+        ts_col, id_col = (c.split('.')[1] for c in self.KEYSET_COLUMNS[table])
+        has_more = len(df) > page_size
+        df = df.iloc[:page_size]
+        if direction == 'prev':
+            df = df.iloc[::-1]
+        df = df.reset_index(drop=True)
+
+        if df.empty:
+            return df, None, None, False
+
+        # numpy 스칼라는 DB 드라이버가 바인딩하지 못하므로 파이썬 타입으로 변환
+        first = (float(df[ts_col].iloc[0]), int(df[id_col].iloc[0]))
+        last = (float(df[ts_col].iloc[-1]), int(df[id_col].iloc[-1]))
+        return df, first, last, has_more
+
+    def get_logbook(self, start_time=None, end_time=None, entity_id=None,
+                    exclude_states=None, exclude_entities=None, compact=False, use_cache=True):
         """특정 기간의 로그북 조회
+
+        상태 변경(states)과 로그북 이벤트(events)를 모아 하나의 로그북으로 만들고,
+        각 항목에 그 시점의 엔티티 상태를 as-of 조인(merge_asof)으로 붙인다.
+        행마다 상관 서브쿼리를 돌리지 않고 쿼리 몇 개로 끝난다.
         
         Args:
             start_time (datetime): 시작 시간 (기본값: 24시간 전)
             end_time (datetime): 종료 시간 (기본값: 현재)
             entity_id (str): 특정 엔티티 ID (선택사항)
+            exclude_states (list): 제외할 상태 값 (예: ['unavailable']), SQL에서 거른다
+            exclude_entities (list): 제외할 엔티티 ID, states_meta로 metadata_id를 찾아 SQL에서 거른다
+            compact (bool): 결과 컬럼을 작은 타입으로 바꾸고 메모리 보고를 attrs['memory']에 남긴다
+            use_cache (bool): False면 하위 쿼리가 쿼리 캐시를 거치지 않는다 (내보내기 등 일회성 대량 조회)
         """
         if start_time is None:
             start_time = datetime.now() - timedelta(days=1)
         if end_time is None:
             end_time = datetime.now()
 
+        params = {
+            'start_ts': start_time.timestamp(),
+            'end_ts': end_time.timestamp(),
+        }
+        if use_cache:
+            # 하위 쿼리들이 같은 캐시 버킷을 쓰도록 구간을 먼저 버킷 경계로 맞춘다
+            params = self.cache.snap_params(params)
+
+        try:
+            metadata_ids = None
+            if entity_id:
+                # 없는 엔티티면 빈 목록이므로 빈 결과가 된다
+                metadata_id = self.entities.get(entity_id)
+                metadata_ids = [] if metadata_id is None else [metadata_id]
+            exclude_metadata_ids = self.entities.ids_for(exclude_entities) if exclude_entities else []
+
+            states = self._read_logbook_states(
+                params, metadata_ids, exclude_states, exclude_metadata_ids, use_cache
+            )
+            events = self._read_logbook_events(params, use_cache)
+            if entity_id:
+                events = events[events['entity_id'] == entity_id]
+            if exclude_entities:
+                events = events[~events['entity_id'].isin(list(exclude_entities))]
+
+            # as-of 조인의 오른쪽 (각 행에 붙일 그 시점의 엔티티 상태)
+            asof_states = states
+            event_entities = set(events['entity_id'].dropna())
+            if exclude_states and event_entities:
+                # 제외한 상태도 이벤트 시점의 엔티티 상태일 수 있으므로,
+                # 이벤트가 있는 엔티티의 상태는 제외 조건 없이 따로 읽어 합친다
+                event_states = self._read_logbook_states(
+                    params, self.entities.ids_for(event_entities), use_cache=use_cache
+                )
+                asof_states = pd.concat([states, event_states], ignore_index=True)
+                asof_states = asof_states.drop_duplicates('state_id')
+
+            # 이벤트가 엔티티의 구간 내 첫 상태 변경보다 먼저일 수 있으므로
+            # 이벤트가 있는 모든 엔티티의 구간 직전 상태를 (쿼리 한 번으로) 기준점으로 앞에 붙인다
+            if event_entities:
+                seeds = self._read_seed_states(params, event_entities, use_cache)
+                asof_states = pd.concat([seeds, asof_states], ignore_index=True)
+
+            logbook = self._build_logbook(states, events, params['start_ts'], asof_states)
+            return self._compact(logbook) if compact else logbook
+        except Exception as e:
+            print(f"로그북 조회 실패: {str(e)}")
+            return None
+
+    def _read_logbook_states(self, params, metadata_ids=None, exclude_states=None,
+                             exclude_metadata_ids=None, use_cache=True):
+        """기간 내 상태 이력 조회 (상태 변경 로그의 원본이자 as-of 조인의 오른쪽)
+
+        metadata_ids를 주면 그 엔티티만 읽는다. 제외 조건은 SQL에 넣어 걸러진 행은 전송되지 않는다.
+        """
         query = """
         SELECT 
-            l.time_fired,
-            l.entity_id,
-            l.domain,
-            l.message,
-            l.context_id,
-            s.state as entity_state,
-            s.attributes as entity_attributes
-        FROM logbook l
-        LEFT JOIN states s ON l.entity_id = s.entity_id 
-            AND s.last_updated <= l.time_fired 
-            AND s.state_id = (
-                SELECT state_id 
-                FROM states 
-                WHERE entity_id = l.entity_id 
-                AND last_updated <= l.time_fired 
-                ORDER BY last_updated DESC 
+            s.state_id,
+            sm.entity_id,
+            s.state,
+            s.attributes_id,
+            s.last_changed_ts,
+            s.last_updated_ts,
+            s.context_id_bin,
+            s.context_parent_id_bin
+        FROM states s
+        JOIN states_meta sm ON s.metadata_id = sm.metadata_id
+        WHERE s.last_updated_ts BETWEEN :start_ts AND :end_ts
+        """
+        expanding = []
+        if metadata_ids is not None:
+            query += " AND s.metadata_id IN :metadata_ids"
+            params = {**params, 'metadata_ids': sorted(metadata_ids)}
+            expanding.append(bindparam('metadata_ids', expanding=True))
+        if exclude_states:
+            # NOT IN은 NULL에 대해 참이 아니므로 상태가 없는 행은 따로 남긴다
+            query += " AND (s.state IS NULL OR s.state NOT IN :exclude_states)"
+            params = {**params, 'exclude_states': sorted(exclude_states)}
+            expanding.append(bindparam('exclude_states', expanding=True))
+        if exclude_metadata_ids:
+            query += " AND s.metadata_id NOT IN :exclude_metadata_ids"
+            params = {**params, 'exclude_metadata_ids': sorted(exclude_metadata_ids)}
+            expanding.append(bindparam('exclude_metadata_ids', expanding=True))
+        return self.read_sql(text(query).bindparams(*expanding), params, use_cache=use_cache)
+
+    def _read_seed_states(self, params, entity_ids, use_cache=True):
+        """엔티티별로 시작 시각 직전의 마지막 상태 한 행씩 조회"""
+        columns = """
+            s.state_id,
+            sm.entity_id,
+            s.state,
+            s.attributes_id,
+            s.last_changed_ts,
+            s.last_updated_ts,
+            s.context_id_bin,
+            s.context_parent_id_bin
+        """
+        if self.engine.dialect.name == 'postgresql':
+            # 엔티티마다 (metadata_id, last_updated_ts) 인덱스를 역순으로 한 행만 읽는다
+            query = f"""
+            SELECT {columns}
+            FROM states_meta sm
+            CROSS JOIN LATERAL (
+                SELECT *
+                FROM states
+                WHERE metadata_id = sm.metadata_id
+                AND last_updated_ts < :start_ts
+                ORDER BY last_updated_ts DESC
                 LIMIT 1
+            ) s
+            WHERE sm.entity_id IN :entity_ids
+            """
+        else:
+            # LATERAL이 없는 DB(SQLite 등)는 윈도 함수로 엔티티별 최신 행을 고른다
+            query = f"""
+            SELECT {columns}
+            FROM (
+                SELECT 
+                    states.*,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY states.metadata_id
+                        ORDER BY states.last_updated_ts DESC
+                    ) AS rn
+                FROM states
+                JOIN states_meta ON states.metadata_id = states_meta.metadata_id
+                WHERE states_meta.entity_id IN :entity_ids
+                AND states.last_updated_ts < :start_ts
+            ) s
+            JOIN states_meta sm ON s.metadata_id = sm.metadata_id
+            WHERE s.rn = 1
+            """
+        stmt = text(query).bindparams(bindparam('entity_ids', expanding=True))
+        return self.read_sql(stmt, {**params, 'entity_ids': sorted(entity_ids)}, use_cache=use_cache)
+
+    def _read_logbook_events(self, params, use_cache=True):
+        """기간 내 로그북 이벤트 조회 후 event_data에서 엔티티와 메시지 추출"""
+        query = """
+        SELECT 
+            e.event_id,
+            et.event_type,
+            e.time_fired_ts,
+            ed.shared_data,
+            e.context_id_bin,
+            e.context_parent_id_bin
+        FROM events e
+        JOIN event_types et ON e.event_type_id = et.event_type_id
+        LEFT JOIN event_data ed ON e.data_id = ed.data_id
+        WHERE e.time_fired_ts BETWEEN :start_ts AND :end_ts
+        AND et.event_type IN :event_types
+        """
+        stmt = text(query).bindparams(bindparam('event_types', expanding=True))
+        events = self.read_sql(
+            stmt, {**params, 'event_types': list(LOGBOOK_EVENT_TYPES)}, use_cache=use_cache
+        )
+
+        # 로그북 이벤트는 상태 변경보다 훨씬 드물어서 행 단위 파싱 비용이 작다
+        data = events['shared_data'].map(_parse_event_data)
+        events['entity_id'] = data.str.get('entity_id')
+        events['domain'] = data.str.get('domain').fillna(
+            events['entity_id'].str.split('.').str[0]
+        )
+        events['message'] = data.str.get('message').fillna(events['event_type'])
+        events['name'] = data.str.get('name')
+        return events
+
+    def _build_logbook(self, states, events, start_ts, asof_states=None):
+        """상태 변경 행과 이벤트 행을 합치고 as-of 조인으로 엔티티 상태를 붙인다
+
+        asof_states를 주면 엔티티 상태는 states 대신 그 행들에서 찾는다.
+        """
+        if asof_states is None:
+            asof_states = states
+        states = states.rename(columns={
+            'context_id_bin': 'context_id',
+            'context_parent_id_bin': 'context_parent_id',
+        })
+        events = events.rename(columns={
+            'time_fired_ts': 'ts',
+            'context_id_bin': 'context_id',
+            'context_parent_id_bin': 'context_parent_id',
+        })
+
+        # last_changed_ts가 비어 있거나 last_updated_ts와 같으면 상태 값이 바뀐 행이다
+        # (기준점으로 가져온 구간 이전 상태는 로그북 행이 되지 않는다)
+        changed = states[
+            (states['last_updated_ts'] >= start_ts)
+            & (
+                states['last_changed_ts'].isna()
+                | (states['last_changed_ts'] == states['last_updated_ts'])
             )
-        WHERE l.time_fired BETWEEN :start_time AND :end_time
+        ]
+        state_rows = pd.DataFrame({
+            'ts': changed['last_updated_ts'],
+            'event_type': 'state_changed',
+            'entity_id': changed['entity_id'],
+            'domain': changed['entity_id'].str.split('.').str[0],
+            'message': 'changed to ' + changed['state'],
+            'context_id': changed['context_id'],
+            'context_parent_id': changed['context_parent_id'],
+            'name': None,
+        })
+        event_rows = events[[
+            'ts', 'event_type', 'entity_id', 'domain', 'message', 'context_id', 'context_parent_id',
+            'name'
+        ]]
+        logbook = pd.concat([state_rows, event_rows], ignore_index=True)
+
+        # merge_asof의 by 키에는 결측값을 둘 수 없으므로 엔티티 없는 이벤트는 빈 문자열로 묶는다
+        logbook['entity_id'] = logbook['entity_id'].fillna('').astype(str)
+        logbook['ts'] = logbook['ts'].astype('float64')
+        logbook = logbook.sort_values('ts', kind='stable')
+        right = asof_states[['entity_id', 'last_updated_ts', 'state', 'attributes_id']]
+        right = right.astype({'entity_id': str, 'last_updated_ts': 'float64'})
+        right = right.sort_values('last_updated_ts', kind='stable')
+        logbook = pd.merge_asof(
+            logbook,
+            right,
+            left_on='ts',
+            right_on='last_updated_ts',
+            by='entity_id',
+            direction='backward',
+        )
+        logbook['entity_id'] = logbook['entity_id'].mask(logbook['entity_id'].eq(''))
+
+        for col in ('context_id', 'context_parent_id'):
+            logbook[col] = logbook[col].map(lambda b: bytes(b).hex(), na_action='ignore')
+
+        # 속성은 고유 attributes_id마다 한 번만 조회/파싱한 dict를 공유한다
+        logbook = logbook.rename(columns={'state': 'entity_state'})
+        logbook = self.attributes.attach(logbook, name='entity_attributes')
+        # 이름은 이벤트 데이터의 name, 없으면 속성의 friendly_name
+        # (빈 구간이면 속성 컬럼이 float라 .str을 쓸 수 없으므로 map으로 꺼낸다)
+        logbook['name'] = logbook['name'].fillna(
+            logbook['entity_attributes'].map(lambda attrs: attrs.get('friendly_name'), na_action='ignore')
+        )
+        logbook['time_fired'] = pd.to_datetime(logbook['ts'], unit='s', utc=True)
+        logbook = logbook.sort_values('ts', ascending=False, kind='stable')
+        return logbook[[
+            'time_fired',
+            'event_type',
+            'entity_id',
+            'name',
+            'domain',
+            'message',
+            'context_id',
+            'context_parent_id',
+            'entity_state',
+            'attributes_id',
+            'entity_attributes',
+        ]].reset_index(drop=True)
+
+    def export_query(self, query, params, path, fmt='csv', chunksize=50000):
+        """쿼리 결과를 청크 단위로 파일에 기록
+
+        서버 측 커서(stream_results)로 chunksize 행씩 받아 바로 파일에 쓰므로
+        결과 크기와 관계없이 메모리 사용량이 일정하다.
+
+        Args:
+            query (str): 실행할 쿼리
+            params (dict): 쿼리 파라미터
+            path (str): 저장할 파일 경로
+            fmt (str): 'csv' 또는 'parquet'
+            chunksize (int): 한 번에 읽어 쓸 행 수
+
+        Returns:
+            int: 기록한 행 수 (실패 시 None)
         """
-        
-        if entity_id:
-            query += " AND l.entity_id = :entity_id"
-        
-        query += " ORDER BY l.time_fired DESC"
-        
-        params = {
-            'start_time': start_time,
-            'end_time': end_time,
-            'entity_id': entity_id
-        }
-        
         try:
-            with self.engine.connect() as conn:
-                df = pd.read_sql(text(query), conn, params=params)
-                return df
+            with ChunkWriter(path, fmt) as writer:
+                for chunk in self.iter_sql(query, params, chunksize):
+                    writer.write(chunk)
+                return writer.rows
         except Exception as e:
-            print(f"로그북 조회 실패: {str(e)}")
+            print(f"내보내기 실패: {str(e)}")
             return None
 
+    def iter_sql(self, query, params=None, chunksize=50000):
+        """서버 측 커서(stream_results)로 쿼리 결과를 chunksize 행씩 DataFrame으로 생성
+
+        캐시를 거치지 않으며 메모리에는 청크 하나만 올라온다.
+        """
+        if isinstance(query, str):
+            query = text(query)
+        start = time.perf_counter()
+        rows = nbytes = 0
+        with self.engine.connect().execution_options(stream_results=True) as conn:
+            try:
+                for chunk in pd.read_sql(query, conn, params=params, chunksize=chunksize):
+                    rows += len(chunk)
+                    nbytes += int(chunk.memory_usage(deep=False).sum())
+                    yield chunk
+            finally:
+                # 소비자가 중간에 멈춰도 기록을 마무리해 풀에 돌아갈 연결에 profile_last를 남기지 않는다
+                # (청크마다 fetch와 DataFrame 생성이 번갈아 일어나므로 전체 시간과 청크 합계만 남긴다)
+                record = self.profiler.complete(conn, None, total_seconds=time.perf_counter() - start)
+                if record is not None:
+                    record.update(rows=rows, bytes=nbytes)
+
+    def export_states(self, path, fmt='csv', entity_filter=None, start_ts=None, end_ts=None,
+                      chunksize=50000):
+        """states 조회 결과 전체를 파일로 내보내기 (조건은 build_states_query와 동일)"""
+        query, params = self.build_states_query(entity_filter, start_ts, end_ts, limit=None)
+        return self.export_query(query, params, path, fmt, chunksize)
+
+    def export_events(self, path, fmt='csv', event_type_filter=None, start_ts=None, end_ts=None,
+                      chunksize=50000):
+        """events 조회 결과 전체를 파일로 내보내기 (조건은 build_events_query와 동일)"""
+        query, params = self.build_events_query(event_type_filter, start_ts, end_ts, limit=None)
+        return self.export_query(query, params, path, fmt, chunksize)
+
+    def export_logbook(self, path, start_time, end_time, fmt='csv', entity_id=None,
+                       window=timedelta(days=1)):
+        """로그북을 시간 구간(window)별로 조회해 과거 순으로 파일에 이어 쓰기
+
+        as-of 조인은 구간 단위로 끝나므로 메모리는 구간 하나 분량만 사용한다.
+        일회성 대량 조회이므로 쿼리 캐시는 거치지 않고, Parquet 스키마는 logbook_export_schema()로
+        고정한다 (첫 구간이 비어 있거나 값이 모두 비어 있는 컬럼이 있어도 뒤 구간과 맞는다).
+
+        Returns:
+            int: 기록한 행 수 (실패 시 None)
+        """
+        try:
+            schema = logbook_export_schema() if fmt == 'parquet' else None
+            with ChunkWriter(path, fmt, schema=schema) as writer:
+                window_start = start_time
+                while window_start < end_time:
+                    window_end = min(window_start + window, end_time)
+                    logbook = self.get_logbook(window_start, window_end, entity_id, use_cache=False)
+                    if logbook is None:
+                        return None
+                    # BETWEEN은 양 끝을 포함하므로 (마지막 구간이 아니면) 끝 경계 행은 잘라낸다
+                    lower = pd.Timestamp(window_start.timestamp(), unit='s', tz='UTC')
+                    upper = pd.Timestamp(window_end.timestamp(), unit='s', tz='UTC')
+                    in_window = logbook['time_fired'] >= lower
+                    if window_end < end_time:
+                        in_window &= logbook['time_fired'] < upper
+                    else:
+                        in_window &= logbook['time_fired'] <= upper
+                    logbook = logbook[in_window].copy()
+                    logbook['entity_attributes'] = self.attributes.to_json(logbook)
+                    writer.write(logbook.iloc[::-1])
+                    window_start = window_end
+                return writer.rows
+        except Exception as e:
+            print(f"내보내기 실패: {str(e)}")
+            return None
+
+
+def logbook_export_schema():
+    """export_logbook이 쓰는 Parquet 스키마 (get_logbook 컬럼, 속성은 JSON 문자열)"""
+    import pyarrow as pa
+
+    return pa.schema([
+        ('time_fired', pa.timestamp('ns', tz='UTC')),
+        ('event_type', pa.string()),
+        ('entity_id', pa.string()),
+        ('name', pa.string()),
+        ('domain', pa.string()),
+        ('message', pa.string()),
+        ('context_id', pa.string()),
+        ('context_parent_id', pa.string()),
+        ('entity_state', pa.string()),
+        ('attributes_id', pa.int64()),
+        ('entity_attributes', pa.string()),
+    ])
+
+
+class ChunkWriter:
+    """DataFrame 청크를 CSV 또는 Parquet 파일 하나에 이어 쓰는 writer
+
+    schema(pyarrow.Schema)를 주면 Parquet의 모든 청크를 그 스키마로 변환하고,
+    없으면 첫 청크에서 추론한다.
+    """
+
+    def __init__(self, path, fmt='csv', schema=None):
+        if fmt not in ('csv', 'parquet'):
+            raise ValueError(f"지원하지 않는 형식: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.rows = 0
+        self._parquet_writer = None
+        self._schema = schema
+        self._file = None
+
+    def __enter__(self):
+        if self.fmt == 'csv':
+            self._file = open(self.path, 'w', encoding='utf-8', newline='')
+        return self
+
+    def write(self, chunk):
+        """청크 하나 기록 (스키마를 주지 않았으면 첫 청크의 컬럼 구성이 파일 스키마가 된다)"""
+        if self.fmt == 'csv':
+            chunk.to_csv(self._file, index=False, header=self.rows == 0)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._schema is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                # 첫 청크에서 값이 모두 비어 있던 컬럼은 문자열로 간주
+                for i, field in enumerate(schema):
+                    if pa.types.is_null(field.type):
+                        schema = schema.set(i, field.with_type(pa.string()))
+                self._schema = schema.remove_metadata()
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, self._schema)
+            table = pa.Table.from_pandas(
+                chunk[self._schema.names], schema=self._schema, preserve_index=False
+            )
+            self._parquet_writer.write_table(table)
+        self.rows += len(chunk)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._file is not None:
+            self._file.close()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        return False
+
+
 def main():
     ha_db = HomeAssistantDB()
     
@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import threading
+from dotenv import load_dotenv
+from websockets.sync.client import connect
+from states_snapshot import StatesSnapshot
+
+# .env 파일에서 환경 변수 로드
+load_dotenv()
+
+
+class HALiveStates:
+    """Home Assistant WebSocket API로 state_changed를 구독해 유지하는 실시간 상태 스냅샷
+
+    연결 직후 get_states로 한 번 전체 상태를 받은 뒤에는 변경분(state_changed 이벤트)만
+    받아 StatesSnapshot을 갱신한다. 연결이 끊기면 백오프 후 다시 연결하고
+    전체 상태를 새로 받는다.
+    """
+
+    def __init__(self, base_url=None, token=None, ws_url=None, reconnect_delay=1.0,
+                 max_reconnect_delay=30.0):
+        self.base_url = base_url or os.getenv('HA_URL')
+        self.token = token or os.getenv('HA_TOKEN')
+        # http(s)://host -> ws(s)://host/api/websocket
+        self.ws_url = ws_url or (
+            self.base_url.replace('http', 'ws', 1).rstrip('/') + '/api/websocket'
+        )
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread = None
+        self._next_id = 1
+        self._listeners = []
+
+        self.connected = False
+        self.error = None
+        self.version = 0
+        self.events_received = 0
+        self.bytes_received = 0
+        self.last_event_at = None
+
+    def start(self):
+        """백그라운드 스레드에서 연결과 구독 시작"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='ha-live-states', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """구독 중지"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def wait_ready(self, timeout=None):
+        """첫 전체 상태를 받을 때까지 대기"""
+        return self._ready.wait(timeout)
+
+    def add_listener(self, callback):
+        """상태 변경마다 callback(entity_id, old_state, new_state) 호출 (구독 스레드에서 실행)"""
+        self._listeners.append(callback)
+
+    def get_snapshot(self):
+        """현재 스냅샷의 복사본 (아직 받지 못했으면 None)"""
+        return self.get_versioned_snapshot()[1]
+
+    def get_versioned_snapshot(self):
+        """(version, 스냅샷 복사본) 쌍 (같은 lock 안에서 읽어 둘이 어긋나지 않는다)
+
+        복사본은 DataFrame/JSON 캐시가 비어 있으므로, 호출자는 version이 바뀔 때만
+        새로 받아 같은 복사본을 재사용해야 캐시가 유지된다.
+        """
+        with self._lock:
+            if self._snapshot is None:
+                return self.version, None
+            return self.version, self._snapshot.copy()
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            try:
+                self._run_once()
+                delay = self.reconnect_delay
+            except PermissionError as e:
+                # 토큰 오류는 재시도해도 소용없다
+                self.error = str(e)
+                self.connected = False
+                return
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+            self.connected = False
+            self._stop.wait(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _send(self, ws, message):
+        message = {'id': self._next_id, **message}
+        self._next_id += 1
+        ws.send(json.dumps(message))
+        return message['id']
+
+    def _recv(self, ws, timeout=None):
+        raw = ws.recv(timeout=timeout)
+        self.bytes_received += len(raw)
+        return json.loads(raw)
+
+    def _wait_result(self, ws, message_id):
+        while True:
+            message = self._recv(ws)
+            if message.get('type') == 'result' and message.get('id') == message_id:
+                if not message.get('success'):
+                    raise RuntimeError(f"요청 실패: {message.get('error')}")
+                return message.get('result')
+
+    def _run_once(self):
+        with connect(self.ws_url, max_size=None) as ws:
+            # 인증
+            message = self._recv(ws)
+            if message.get('type') == 'auth_required':
+                ws.send(json.dumps({'type': 'auth', 'access_token': self.token}))
+                message = self._recv(ws)
+            if message.get('type') != 'auth_ok':
+                raise PermissionError(f"WebSocket 인증 실패: {message.get('message', message)}")
+
+            # 변경분을 놓치지 않도록 구독을 먼저 걸고 전체 상태를 받는다
+            self._next_id = 1
+            subscription_id = self._send(
+                ws, {'type': 'subscribe_events', 'event_type': 'state_changed'}
+            )
+            self._wait_result(ws, subscription_id)
+            states_id = self._send(ws, {'type': 'get_states'})
+
+            pending = []
+            while True:
+                message = self._recv(ws)
+                if message.get('type') == 'result' and message.get('id') == states_id:
+                    if not message.get('success'):
+                        raise RuntimeError(f"get_states 실패: {message.get('error')}")
+                    snapshot = StatesSnapshot(message.get('result') or [])
+                    break
+                if message.get('type') == 'event' and message.get('id') == subscription_id:
+                    pending.append(message['event'])
+
+            with self._lock:
+                self._snapshot = snapshot
+                for event in pending:
+                    self._apply(event)
+                self.version += 1
+            self.connected = True
+            self.error = None
+            self._ready.set()
+
+            # 변경분 반영
+            while not self._stop.is_set():
+                try:
+                    message = self._recv(ws, timeout=1)
+                except TimeoutError:
+                    continue
+                if message.get('type') != 'event' or message.get('id') != subscription_id:
+                    continue
+                with self._lock:
+                    self._apply(message['event'])
+                    self.version += 1
+
+    def _apply(self, event):
+        """state_changed 이벤트 하나를 스냅샷에 반영 (lock을 잡은 상태에서 호출)"""
+        data = event.get('data', {})
+        entity_id = data.get('entity_id')
+        if not entity_id:
+            return
+        # 구독 직후 도착한 이벤트가 get_states 결과보다 오래된 경우는 건너뛴다
+        current = self._snapshot.by_id.get(entity_id)
+        new_state = data.get('new_state')
+        if (
+            current is not None and new_state is not None
+            and new_state.get('last_updated', '') < current.get('last_updated', '')
+        ):
+            return
+        self._snapshot.update(entity_id, new_state)
+        self.events_received += 1
+        self.last_event_at = time.time()
+        for callback in self._listeners:
+            try:
+                callback(entity_id, data.get('old_state'), new_state)
+            except Exception as e:
+                print(f"상태 변경 콜백 실패: {str(e)}")
@@ -0,0 +1,260 @@
+import os
+import re
+import json
+import gzip
+import time
+import heapq
+import shutil
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+# 전체 구간 길이에 따른 하위 구간 크기 (길이 상한, 하위 구간 크기)
+WINDOW_RULES = [
+    (timedelta(hours=6), None),  # 6시간 이하는 한 번에 요청
+    (timedelta(days=1), timedelta(hours=3)),
+    (timedelta(days=7), timedelta(hours=12)),
+]
+DEFAULT_WINDOW = timedelta(days=1)
+
+# 실패한 하위 구간은 반으로 나눠 다시 시도하되 이보다 작게는 나누지 않는다
+MIN_WINDOW = timedelta(minutes=30)
+
+
+def split_time_range(start_time, end_time):
+    """구간 길이에 맞는 크기로 [start_time, end_time)을 하위 구간 목록으로 분할"""
+    span = end_time - start_time
+    step = DEFAULT_WINDOW
+    for limit, window in WINDOW_RULES:
+        if span <= limit:
+            step = window
+            break
+    if step is None:
+        return [(start_time, end_time)]
+
+    windows = []
+    window_start = start_time
+    while window_start < end_time:
+        window_end = min(window_start + step, end_time)
+        windows.append((window_start, window_end))
+        window_start = window_end
+    return windows
+
+
+def fetch_logbook_window(client, start_time, end_time, entity_id=None):
+    """하위 구간 하나의 /api/logbook 조회"""
+    api_path = f"/api/logbook/{start_time.strftime('%Y-%m-%dT%H:%M:%S')}"
+    params = {'end_time': end_time.strftime('%Y-%m-%dT%H:%M:%S')}
+    if entity_id:
+        params['entity'] = entity_id
+    return client.get(api_path, params=params) or []
+
+
+def _fetch_with_split(client, start_time, end_time, entity_id):
+    """구간 조회가 실패하면 반으로 나눠 다시 시도
+
+    Returns:
+        tuple: (구간별 결과 목록, 끝내 실패한 구간 목록)
+    """
+    try:
+        return [fetch_logbook_window(client, start_time, end_time, entity_id)], []
+    except requests.exceptions.RequestException as e:
+        # 인증 오류 같은 4xx는 구간을 줄여도 소용없다
+        response = getattr(e, 'response', None)
+        client_error = response is not None and response.status_code < 500
+        if client_error or end_time - start_time <= MIN_WINDOW:
+            return [], [(start_time, end_time, str(e))]
+
+    middle = start_time + (end_time - start_time) / 2
+    results, failed = [], []
+    for window_start, window_end in ((start_time, middle), (middle, end_time)):
+        window_results, window_failed = _fetch_with_split(client, window_start, window_end, entity_id)
+        results += window_results
+        failed += window_failed
+    return results, failed
+
+
+def fetch_logbook_range(client, start_time, end_time, entity_id=None, max_workers=4):
+    """긴 구간을 하위 구간으로 나눠 병렬로 조회한 뒤 시간순으로 병합
+
+    하위 구간마다 독립적으로 재시도하므로 일부가 실패해도 나머지 결과는 반환한다.
+
+    Returns:
+        tuple: (시간순 로그 항목 목록, 실패한 (시작, 끝, 오류) 구간 목록)
+    """
+    windows = split_time_range(start_time, end_time)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(windows))) as executor:
+        futures = [
+            executor.submit(_fetch_with_split, client, window_start, window_end, entity_id)
+            for window_start, window_end in windows
+        ]
+        results, failed = [], []
+        for future in futures:
+            window_results, window_failed = future.result()
+            results += window_results
+            failed += window_failed
+
+    return list(merge_entries(results)), failed
+
+
+def merge_entries(sorted_lists):
+    """시간순으로 정렬된 결과 목록들을 하나로 병합 (구간 경계에서 겹친 항목은 한 번만)"""
+    previous = None
+    for entry in heapq.merge(*sorted_lists, key=lambda entry: entry.get('when', '')):
+        if entry != previous:
+            yield entry
+        previous = entry
+
+
+class LogbookCache:
+    """로그북 항목의 디스크 캐시
+
+    항목은 키(전체 또는 엔티티)별 디렉터리에 UTC 날짜 단위 세그먼트 파일
+    (YYYY-MM-DD.jsonl.gz, gzip 멤버를 이어 붙이는 방식이라 추가 쓰기가 싸다)로 저장하고,
+    이미 가져온 시간 구간은 coverage.json에 기록한다. 조회할 때는 덮이지 않은 구간만
+    API로 가져오며, 늦게 기록되는 항목을 잡기 위해 각 빈 구간 앞쪽과 현재 시각 근처는
+    overlap만큼 겹쳐서 다시 요청한다.
+    """
+
+    def __init__(self, root=None, overlap=timedelta(minutes=5)):
+        self.root = root or os.getenv('LOGBOOK_CACHE_DIR', 'logbook_cache')
+        self.overlap = overlap
+        self._lock = threading.Lock()
+
+    def _key_dir(self, entity_id):
+        key = re.sub(r'[^A-Za-z0-9_.,-]', '_', entity_id) if entity_id else '_all'
+        return os.path.join(self.root, key)
+
+    def _load_coverage(self, key_dir):
+        path = os.path.join(key_dir, 'coverage.json')
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding='utf-8') as f:
+            return [tuple(interval) for interval in json.load(f)]
+
+    def _save_coverage(self, key_dir, coverage):
+        os.makedirs(key_dir, exist_ok=True)
+        path = os.path.join(key_dir, 'coverage.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(coverage, f)
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def _add_interval(coverage, start_ts, end_ts):
+        """구간을 추가하고 겹치거나 맞닿은 구간을 합친다"""
+        merged = []
+        for interval_start, interval_end in sorted(coverage + [(start_ts, end_ts)]):
+            if merged and interval_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], interval_end))
+            else:
+                merged.append((interval_start, interval_end))
+        return merged
+
+    @staticmethod
+    def _gaps(coverage, start_ts, end_ts):
+        """[start_ts, end_ts] 안에서 coverage가 덮지 않는 구간 목록"""
+        gaps = []
+        cursor = start_ts
+        for interval_start, interval_end in sorted(coverage):
+            if interval_end <= cursor:
+                continue
+            if interval_start >= end_ts:
+                break
+            if interval_start > cursor:
+                gaps.append((cursor, interval_start))
+            cursor = max(cursor, interval_end)
+        if cursor < end_ts:
+            gaps.append((cursor, end_ts))
+        return gaps
+
+    @staticmethod
+    def _serialize(entry):
+        """세그먼트 파일의 한 줄 (중복 비교도 이 문자열로 하므로 쓰기와 같은 직렬화를 쓴다)"""
+        return json.dumps(entry, sort_keys=True, ensure_ascii=False)
+
+    @staticmethod
+    def _entry_ts(entry):
+        return datetime.fromisoformat(entry['when']).timestamp()
+
+    def _segment_path(self, key_dir, day):
+        return os.path.join(key_dir, f'{day}.jsonl.gz')
+
+    def _read_segment(self, path):
+        if not os.path.exists(path):
+            return []
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _store(self, key_dir, entries):
+        """날짜 세그먼트별로 아직 없는 항목만 이어 쓰기"""
+        os.makedirs(key_dir, exist_ok=True)
+        by_day = {}
+        for entry in entries:
+            day = datetime.fromtimestamp(self._entry_ts(entry), timezone.utc).strftime('%Y-%m-%d')
+            by_day.setdefault(day, []).append(entry)
+
+        for day, day_entries in by_day.items():
+            path = self._segment_path(key_dir, day)
+            existing = {self._serialize(entry) for entry in self._read_segment(path)}
+            lines = []
+            for entry in day_entries:
+                line = self._serialize(entry)
+                if line not in existing:
+                    existing.add(line)
+                    lines.append(line)
+            if lines:
+                with gzip.open(path, 'at', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+
+    def _load(self, key_dir, start_ts, end_ts):
+        """캐시에서 [start_ts, end_ts] 항목을 시간순으로 읽기"""
+        day = datetime.fromtimestamp(start_ts, timezone.utc).date()
+        last_day = datetime.fromtimestamp(end_ts, timezone.utc).date()
+        entries = []
+        while day <= last_day:
+            for entry in self._read_segment(self._segment_path(key_dir, day.isoformat())):
+                if start_ts <= self._entry_ts(entry) <= end_ts:
+                    entries.append(entry)
+            day += timedelta(days=1)
+        entries.sort(key=self._entry_ts)
+        return entries
+
+    def fetch(self, start_time, end_time, fetcher, entity_id=None):
+        """캐시에 없는 구간만 fetcher로 가져와 채운 뒤 전체 구간 결과 반환
+
+        Args:
+            start_time (datetime): 시작 시간
+            end_time (datetime): 종료 시간
+            fetcher (callable): fetcher(start, end) -> (항목 목록, 실패 구간 목록)
+            entity_id (str): 엔티티 필터 (캐시 키로도 사용)
+
+        Returns:
+            tuple: (시간순 로그 항목 목록, 실패한 구간 목록)
+        """
+        start_ts, end_ts = start_time.timestamp(), end_time.timestamp()
+        key_dir = self._key_dir(entity_id)
+        failed = []
+        with self._lock:
+            coverage = self._load_coverage(key_dir)
+            for gap_start, gap_end in self._gaps(coverage, start_ts, end_ts):
+                # 앞쪽을 overlap만큼 겹쳐서 직전 조회 이후 늦게 기록된 항목도 가져온다
+                fetch_start = gap_start - self.overlap.total_seconds() if gap_start > start_ts else gap_start
+                entries, gap_failed = fetcher(
+                    datetime.fromtimestamp(fetch_start), datetime.fromtimestamp(gap_end)
+                )
+                self._store(key_dir, entries)
+                if gap_failed:
+                    failed += gap_failed
+                    continue
+                # 현재 시각 근처는 아직 기록 중일 수 있으므로 덮인 것으로 표시하지 않는다
+                settled_end = min(gap_end, time.time() - self.overlap.total_seconds())
+                if settled_end > gap_start:
+                    coverage = self._add_interval(coverage, gap_start, settled_end)
+            self._save_coverage(key_dir, coverage)
+            return self._load(key_dir, start_ts, end_ts), failed
+
+    def clear(self):
+        """캐시 전체 삭제"""
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
@@ -0,0 +1,373 @@
+import os
+import json
+import argparse
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pandas as pd
+from dotenv import load_dotenv
+from ha_db_reader import HomeAssistantDB
+from lookup_table import match_names
+
+# .env 파일에서 환경 변수 로드
+load_dotenv()
+
+# 반복해서 나타나는 문자열은 사전(dictionary) 인코딩으로 저장
+DICT_STRING = pa.dictionary(pa.int32(), pa.string())
+
+STATES_SCHEMA = pa.schema([
+    ('state_id', pa.int64()),
+    ('metadata_id', pa.int64()),
+    ('entity_id', DICT_STRING),
+    ('state', DICT_STRING),
+    ('attributes_id', pa.int64()),
+    ('last_changed_ts', pa.float64()),
+    ('last_updated_ts', pa.float64()),
+    ('context_id_bin', pa.binary()),
+    ('context_parent_id_bin', pa.binary()),
+    ('day', pa.string()),
+])
+
+EVENTS_SCHEMA = pa.schema([
+    ('event_id', pa.int64()),
+    ('event_type_id', pa.int64()),
+    ('event_type', DICT_STRING),
+    ('data_id', pa.int64()),
+    ('time_fired_ts', pa.float64()),
+    ('context_id_bin', pa.binary()),
+    ('context_parent_id_bin', pa.binary()),
+    ('day', pa.string()),
+])
+
+EVENT_DATA_SCHEMA = pa.schema([
+    ('data_id', pa.int64()),
+    ('shared_data', pa.string()),
+])
+
+TABLE_SCHEMAS = {
+    'states': STATES_SCHEMA,
+    'events': EVENTS_SCHEMA,
+    'event_data': EVENT_DATA_SCHEMA,
+}
+
+DAY_PARTITIONING = ds.partitioning(pa.schema([('day', pa.string())]), flavor='hive')
+
+
+class RecorderMirror:
+    """Home Assistant recorder 테이블의 로컬 Parquet 미러
+
+    states/events는 날짜(day=YYYY-MM-DD, UTC)별 파티션으로, event_data와 states_meta,
+    event_types는 단일 디렉터리/파일로 저장한다. 테이블별 워터마크(state_id, event_id,
+    data_id)를 기록해 두고 다음 동기화에서는 그 이후 행만 가져온다.
+    늦게 커밋된 행을 위해 워터마크 아래 일부 구간도 매번 다시 확인한다.
+    """
+
+    # 동기화마다 워터마크 아래로 다시 확인하는 ID 개수
+    LATE_COMMIT_WINDOW = 1000
+
+    def __init__(self, root=None):
+        self.root = root or os.getenv('MIRROR_DIR', 'recorder_mirror')
+        self.watermark_path = os.path.join(self.root, '_watermarks.json')
+
+    def exists(self):
+        """미러에 states 데이터가 있는지 확인"""
+        return os.path.isdir(os.path.join(self.root, 'states'))
+
+    def load_watermarks(self):
+        """테이블별 마지막으로 가져온 ID"""
+        if not os.path.exists(self.watermark_path):
+            return {'states': 0, 'events': 0, 'event_data': 0}
+        with open(self.watermark_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_watermarks(self, watermarks):
+        # 중간에 중단돼도 파일이 깨지지 않도록 임시 파일에 쓰고 교체
+        tmp_path = self.watermark_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(watermarks, f)
+        os.replace(tmp_path, self.watermark_path)
+
+    def sync(self, ha_db, batch_size=200000):
+        """워터마크 이후의 행만 가져와 미러에 추가
+
+        Returns:
+            dict: 테이블별로 새로 가져온 행 수
+        """
+        os.makedirs(self.root, exist_ok=True)
+        watermarks = self.load_watermarks()
+
+        # 작은 참조 테이블은 매번 통째로 교체
+        for table in ('states_meta', 'event_types'):
+            df = ha_db.read_sql(f"SELECT * FROM {table}", use_cache=False)
+            pq.write_table(
+                pa.Table.from_pandas(df, preserve_index=False),
+                os.path.join(self.root, f'{table}.parquet')
+            )
+
+        counts = {}
+        counts['states'] = self._sync_table(
+            ha_db, watermarks, 'states', 'state_id', """
+            SELECT
+                s.state_id,
+                s.metadata_id,
+                sm.entity_id,
+                s.state,
+                s.attributes_id,
+                s.last_changed_ts,
+                s.last_updated_ts,
+                s.context_id_bin,
+                s.context_parent_id_bin
+            FROM states s
+            JOIN states_meta sm ON s.metadata_id = sm.metadata_id
+            WHERE s.state_id > :watermark
+            ORDER BY s.state_id
+            LIMIT :batch_size
+            """, STATES_SCHEMA, 'last_updated_ts', ['day', 'entity_id', 'last_updated_ts'], batch_size
+        )
+        counts['events'] = self._sync_table(
+            ha_db, watermarks, 'events', 'event_id', """
+            SELECT
+                e.event_id,
+                e.event_type_id,
+                et.event_type,
+                e.data_id,
+                e.time_fired_ts,
+                e.context_id_bin,
+                e.context_parent_id_bin
+            FROM events e
+            LEFT JOIN event_types et ON e.event_type_id = et.event_type_id
+            WHERE e.event_id > :watermark
+            ORDER BY e.event_id
+            LIMIT :batch_size
+            """, EVENTS_SCHEMA, 'time_fired_ts', ['day', 'event_type', 'time_fired_ts'], batch_size
+        )
+        counts['event_data'] = self._sync_table(
+            ha_db, watermarks, 'event_data', 'data_id', """
+            SELECT data_id, shared_data
+            FROM event_data
+            WHERE data_id > :watermark
+            ORDER BY data_id
+            LIMIT :batch_size
+            """, EVENT_DATA_SCHEMA, None, None, batch_size
+        )
+        return counts
+
+    def _sync_table(self, ha_db, watermarks, table, id_col, query, schema,
+                    ts_col, sort_by, batch_size):
+        """ID 순서로 배치를 읽어 파일로 쓰고, 배치마다 워터마크 갱신"""
+        total = self._sync_late_rows(ha_db, watermarks, table, id_col, query, schema, ts_col, sort_by)
+        while True:
+            df = ha_db.read_sql(
+                query,
+                {'watermark': watermarks[table], 'batch_size': batch_size},
+                use_cache=False
+            )
+            if df.empty:
+                return total
+
+            first_id = int(df[id_col].iloc[0])
+            last_id = int(df[id_col].iloc[-1])
+            self._write_rows(table, df, schema, ts_col, sort_by, f'part-{first_id}-{last_id}')
+
+            watermarks[table] = last_id
+            self._save_watermarks(watermarks)
+            total += len(df)
+            print(f"{table}: {id_col} {first_id}~{last_id} ({len(df)}행) 동기화")
+
+    def _sync_late_rows(self, ha_db, watermarks, table, id_col, query, schema, ts_col, sort_by):
+        """워터마크 아래 LATE_COMMIT_WINDOW개 ID를 다시 읽어 미러에 없는 행만 추가
+
+        PostgreSQL/MySQL은 ID를 커밋 전에 배정하므로, 늦게 커밋된 트랜잭션의 행은
+        이미 가져온 행보다 ID가 작을 수 있다. 기본 키로 중복을 걸러 그런 행을 보충한다.
+        """
+        watermark = watermarks[table]
+        if watermark <= 0:
+            return 0
+        low = max(watermark - self.LATE_COMMIT_WINDOW, 0)
+        df = ha_db.read_sql(
+            query, {'watermark': low, 'batch_size': self.LATE_COMMIT_WINDOW}, use_cache=False
+        )
+        df = df[df[id_col] <= watermark]
+        if df.empty:
+            return 0
+        existing = self._scan(
+            table, (ds.field(id_col) > low) & (ds.field(id_col) <= watermark), [id_col]
+        )
+        df = df[~df[id_col].isin(existing[id_col])]
+        if df.empty:
+            return 0
+
+        first_id = int(df[id_col].iloc[0])
+        last_id = int(df[id_col].iloc[-1])
+        # 일반 배치 파일(part-*)과 이름이 겹쳐 덮어쓰지 않도록 접두어를 달리한다
+        self._write_rows(table, df, schema, ts_col, sort_by, f'late-{first_id}-{last_id}')
+        print(f"{table}: 늦게 커밋된 {id_col} {len(df)}행 보충")
+        return len(df)
+
+    def _write_rows(self, table, df, schema, ts_col, sort_by, basename):
+        """행들을 테이블 디렉터리에 Parquet 파일로 추가 (states/events는 day 파티션)"""
+        if ts_col is not None:
+            df = df.copy()
+            df['day'] = pd.to_datetime(df[ts_col], unit='s', utc=True).dt.strftime('%Y-%m-%d')
+            # 같은 파일 안에서 엔티티/타입이 모여 있어야 row group 통계로 건너뛸 수 있다
+            df = df.sort_values(sort_by, kind='stable')
+
+        arrow_table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+        ds.write_dataset(
+            arrow_table,
+            os.path.join(self.root, table),
+            format='parquet',
+            partitioning=DAY_PARTITIONING if ts_col is not None else None,
+            basename_template=f'{basename}-{{i}}.parquet',
+            existing_data_behavior='overwrite_or_ignore',
+        )
+
+    def _dataset(self, table):
+        """테이블 데이터셋 (아직 한 번도 동기화되지 않은 테이블이면 None)"""
+        path = os.path.join(self.root, table)
+        if not os.path.isdir(path):
+            return None
+        if table in ('states', 'events'):
+            return ds.dataset(path, format='parquet', partitioning=DAY_PARTITIONING)
+        return ds.dataset(path, format='parquet')
+
+    def _scan(self, table, filter=None, columns=None):
+        """조건에 맞는 행을 DataFrame으로 (없는 테이블은 빈 결과)"""
+        dataset = self._dataset(table)
+        if dataset is None:
+            empty = TABLE_SCHEMAS[table].empty_table()
+            return empty.select(columns or empty.column_names).to_pandas()
+        return dataset.to_table(columns=columns, filter=filter).to_pandas()
+
+    def _days(self, table):
+        """day 파티션 목록 (최신 날짜부터)"""
+        path = os.path.join(self.root, table)
+        if not os.path.isdir(path):
+            return []
+        return sorted(
+            (name.split('=', 1)[1] for name in os.listdir(path) if name.startswith('day=')),
+            reverse=True
+        )
+
+    def _scan_newest(self, table, conditions, columns, order_by, limit):
+        """조건에 맞는 행 중 정렬 키 기준 최신 limit개
+
+        limit이 있으면 day 파티션을 최신 날짜부터 하나씩 읽고 limit행이 모이면 멈춘다.
+        파티션은 타임스탬프의 UTC 날짜이므로 더 오래된 날짜에 더 최신 행은 없다.
+        """
+        read_columns = None if columns is None else columns + [c for c in order_by if c not in columns]
+        if limit is None:
+            df = self._scan(table, self._combine(conditions), read_columns)
+        else:
+            frames, rows = [], 0
+            for day in self._days(table):
+                if rows >= limit:
+                    break
+                day_filter = self._combine(conditions + [ds.field('day') == day])
+                frame = self._scan(table, day_filter, read_columns)
+                frames.append(frame)
+                rows += len(frame)
+            df = pd.concat(frames, ignore_index=True) if frames else self._scan(table, columns=read_columns)
+        df = self._newest(df, order_by, limit)
+        return df if columns is None else df[columns]
+
+    def _time_filter(self, ts_col, start_ts, end_ts):
+        """시간 조건 (day 파티션 가지치기 + 행 단위 조건)"""
+        conditions = []
+        if start_ts is not None:
+            start_day = pd.Timestamp(start_ts, unit='s', tz='UTC').strftime('%Y-%m-%d')
+            conditions += [ds.field('day') >= start_day, ds.field(ts_col) >= start_ts]
+        if end_ts is not None:
+            end_day = pd.Timestamp(end_ts, unit='s', tz='UTC').strftime('%Y-%m-%d')
+            conditions += [ds.field('day') <= end_day, ds.field(ts_col) <= end_ts]
+        return conditions
+
+    @staticmethod
+    def _combine(conditions):
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def read_table(self, table):
+        """states_meta/event_types 같은 참조 테이블 조회"""
+        return pd.read_parquet(os.path.join(self.root, f'{table}.parquet'))
+
+    def match_entities(self, pattern):
+        """부분 문자열 또는 glob 패턴에 맞는 entity_id 목록 (states_meta 기준, 규칙은 match_names)"""
+        entity_ids = self.read_table('states_meta')['entity_id']
+        return entity_ids[match_names(entity_ids, pattern)].tolist()
+
+    def read_states(self, start_ts=None, end_ts=None, entity_ids=None, columns=None,
+                    limit=None):
+        """states 미러 조회 (시간/엔티티 조건은 Parquet 스캔 단계에서 적용)
+
+        Args:
+            start_ts (float): 시작 타임스탬프
+            end_ts (float): 종료 타임스탬프
+            entity_ids (list): 조회할 엔티티 ID 목록
+            columns (list): 읽을 컬럼 (기본값: 전체)
+            limit (int): 최신순으로 남길 행 수 (기본값: 전체)
+        """
+        conditions = self._time_filter('last_updated_ts', start_ts, end_ts)
+        if entity_ids is not None:
+            conditions.append(ds.field('entity_id').isin(list(entity_ids)))
+        return self._scan_newest(
+            'states', conditions, columns, ['last_updated_ts', 'state_id'], limit
+        )
+
+    def read_events(self, start_ts=None, end_ts=None, event_types=None, columns=None,
+                    with_data=False, limit=None):
+        """events 미러 조회 (with_data면 event_data.shared_data를 붙인다)
+
+        Args:
+            start_ts (float): 시작 타임스탬프
+            end_ts (float): 종료 타임스탬프
+            event_types (list): 조회할 이벤트 타입 목록
+            columns (list): 읽을 컬럼 (기본값: 전체)
+            with_data (bool): event_data 조인 여부
+            limit (int): 최신순으로 남길 행 수 (기본값: 전체)
+        """
+        conditions = self._time_filter('time_fired_ts', start_ts, end_ts)
+        if event_types is not None:
+            conditions.append(ds.field('event_type').isin(list(event_types)))
+        df = self._scan_newest(
+            'events', conditions, columns, ['time_fired_ts', 'event_id'], limit
+        )
+
+        if with_data:
+            data_ids = df['data_id'].dropna().unique().tolist()
+            # event_data가 아직 동기화되지 않았으면 shared_data는 모두 비어 있다
+            data = self._scan('event_data', ds.field('data_id').isin(data_ids))
+            df = df.merge(data, on='data_id', how='left')
+        return df
+
+    @staticmethod
+    def _newest(df, order_by, limit):
+        """정렬 키 기준 최신순 정렬 후 limit개만 남긴다"""
+        if not set(order_by) <= set(df.columns):
+            return df
+        df = df.sort_values(order_by, ascending=False, kind='stable')
+        if limit is not None:
+            df = df.head(limit)
+        return df.reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Home Assistant recorder 로컬 미러")
+    parser.add_argument('command', choices=['sync', 'info'], help="sync: 증분 동기화, info: 워터마크 확인")
+    parser.add_argument('--root', help="미러 디렉터리 (기본값: MIRROR_DIR 또는 recorder_mirror)")
+    parser.add_argument('--batch-size', type=int, default=200000, help="한 번에 가져올 행 수")
+    args = parser.parse_args()
+
+    mirror = RecorderMirror(args.root)
+    if args.command == 'sync':
+        counts = mirror.sync(HomeAssistantDB(), batch_size=args.batch_size)
+        print(f"동기화 완료: {counts}")
+    else:
+        print(f"미러 위치: {mirror.root}")
+        print(f"워터마크: {mirror.load_watermarks()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 import streamlit as st
 import pandas as pd
 from ha_db_reader import HomeAssistantDB
+from ha_db_async import AsyncHomeAssistantDB
+from ha_recorder_mirror import RecorderMirror
+from lookup_table import match_names
 from datetime import datetime, timedelta
 import json
-from sqlalchemy import text
-import pytz
+from local_tz import LOCAL_TZ
 from dotenv import load_dotenv
 
 # .env 파일 로드
@@ -22,23 +24,57 @@ def get_db_connection():
     """DB 연결을 생성하고 캐시"""
     return HomeAssistantDB()
 
-def format_json(json_str):
-    """JSON 문자열을 보기 좋게 포맷팅"""
+@st.cache_resource
+def get_async_db():
+    """asyncio DB 연결을 생성하고 캐시
+
+    Returns:
+        tuple: (AsyncHomeAssistantDB, None) 또는 드라이버가 없으면 (None, 오류 메시지)이고 동기로 조회
+    """
+    try:
+        return AsyncHomeAssistantDB(get_db_connection()), None
+    except Exception as e:
+        print(f"비동기 DB 연결 생성 실패, 동기로 조회합니다: {str(e)}")
+        return None, str(e)
+
+@st.cache_resource
+def get_mirror():
+    """로컬 recorder 미러를 생성하고 캐시"""
+    return RecorderMirror()
+
+# 타임스탬프(초 단위 epoch) 컬럼 (표시용 시간대는 local_tz.LOCAL_TZ)
+TIMESTAMP_COLUMNS = ['last_changed_ts', 'last_updated_ts', 'time_fired_ts']
+
+def load_json(json_str):
+    """JSON 문자열을 파싱 (실패하면 원본 반환)"""
     try:
         if isinstance(json_str, str):
-            return json.dumps(json.loads(json_str), indent=2, ensure_ascii=False)
-        return json.dumps(json_str, indent=2, ensure_ascii=False)
-    except:
+            return json.loads(json_str)
+        return json_str
+    except ValueError:
         return json_str
 
-def format_timestamp(ts):
-    """타임스탬프를 읽기 쉬운 형식으로 변환"""
-    if pd.isna(ts):
-        return None
-    try:
-        return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
-    except:
-        return ts
+def format_timestamps(df):
+    """타임스탬프 컬럼을 한 번에 로컬 시간대의 datetime으로 변환"""
+    for col in TIMESTAMP_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], unit='s', utc=True).dt.tz_convert(LOCAL_TZ)
+    return df
+
+def row_details(row):
+    """상세 보기용으로 한 행을 dict로 변환 (JSON 파싱은 이 시점에 한 행만 수행)"""
+    details = {}
+    for key, value in row.items():
+        if isinstance(value, pd.Timestamp):
+            value = value.strftime('%Y-%m-%d %H:%M:%S')
+        elif pd.api.types.is_scalar(value) and pd.isna(value):
+            value = None
+        elif key == 'event_data':
+            value = load_json(value)
+        elif hasattr(value, 'item'):
+            value = value.item()
+        details[key] = value
+    return details
 
 def get_time_range():
     """시간 범위 선택 옵션"""
@@ -54,7 +90,8 @@ def get_time_range():
             "최근 3일",
             "최근 7일",
             "사용자 지정"
-        ]
+        ],
+        key="time_range"
     )
     
     if time_range == "사용자 지정":
@@ -86,98 +123,245 @@ def get_time_range():
     
     return start_dt.timestamp(), end_dt.timestamp()
 
+def load_from_mirror(mirror, table, table_filter, start_ts, end_ts, limit):
+    """로컬 미러에서 DB 쿼리와 같은 컬럼 구성으로 조회"""
+    if table == 'states':
+        entity_ids = mirror.match_entities(table_filter) if table_filter else None
+        return mirror.read_states(
+            start_ts, end_ts, entity_ids,
+            columns=[
+                'state_id', 'entity_id', 'state', 'attributes_id',
+                'last_changed_ts', 'last_updated_ts', 'metadata_id'
+            ],
+            limit=limit
+        )
+    
+    event_types = None
+    if table_filter:
+        names = mirror.read_table('event_types')['event_type']
+        # DB 조회(LookupTable.match)와 같은 규칙
+        event_types = names[match_names(names, table_filter)].tolist()
+    df = mirror.read_events(
+        start_ts, end_ts, event_types,
+        columns=['event_id', 'event_type', 'time_fired_ts', 'data_id'],
+        with_data=True,
+        limit=limit
+    )
+    df = df.rename(columns={'event_type': 'event_type_name', 'shared_data': 'event_data'})
+    return df.drop(columns=['data_id'])
+
+def get_keyset_nav(signature):
+    """keyset 페이지 이동 상태를 세션에서 가져오고, 조회 조건이 바뀌면 첫 페이지로 초기화"""
+    nav = st.session_state.get('keyset_nav')
+    if nav is None or nav['signature'] != signature:
+        nav = {
+            'signature': signature,
+            'page': 0,
+            'cursor': None,
+            'direction': 'next',
+            'first': None,
+            'last': None,
+            'has_prev': False,
+            'has_next': False,
+        }
+        st.session_state.keyset_nav = nav
+    return nav
+
+def go_first_page():
+    """첫 페이지(가장 최신 행)로 이동"""
+    st.session_state.keyset_nav.update(cursor=None, direction='next', page=0)
+
+def go_next_page():
+    """현재 페이지의 마지막 행 이후(더 과거)로 이동"""
+    nav = st.session_state.keyset_nav
+    nav.update(cursor=nav['last'], direction='next', page=nav['page'] + 1)
+
+def go_prev_page():
+    """현재 페이지의 첫 행 이전(더 최신)으로 이동"""
+    nav = st.session_state.keyset_nav
+    nav.update(cursor=nav['first'], direction='prev', page=max(nav['page'] - 1, 0))
+
+def run_data_query(ha_db, async_db, call):
+    """본 조회 실행 (asyncio 연결이 있으면 테이블 목록 갱신과 동시에 보낸다)
+
+    call은 HomeAssistantDB나 AsyncHomeAssistantDB를 받아 조회를 시작하는 함수로,
+    두 클래스의 같은 이름 메서드를 부른다.
+    """
+    if async_db is None:
+        return call(ha_db)
+    results = async_db.fetch_all({
+        'data': call(async_db),
+        'table_info': async_db.get_table_info(),
+    })
+    store_table_names(results['table_info'])
+    return results['data']
+
+def refresh_table_names(async_db):
+    """본 조회가 DB를 거치지 않을 때(로컬 미러) 다음 렌더에 쓸 테이블 목록만 갱신"""
+    if async_db is not None:
+        store_table_names(async_db.run(async_db.get_table_info()))
+
+def store_table_names(table_info):
+    """받은 테이블 목록을 세션에 저장 (조회 실패면 이전 목록 유지)"""
+    if table_info is not None:
+        st.session_state.table_names = table_info['table_name'].tolist()
+
+def show_query_profile(ha_db):
+    """최근 쿼리 계측 기록 (실행/fetch/DataFrame 생성 시간, 행 수, 크기, 순차 스캔)"""
+    with st.expander("⏱ 쿼리 계측"):
+        records = ha_db.profiler.history()
+        if not records:
+            st.caption("기록된 쿼리가 없습니다. 캐시 적중은 DB에 가지 않으므로 기록되지 않습니다.")
+            return
+        
+        history = pd.DataFrame([
+            {
+                '시각': r['at'].strftime('%H:%M:%S'),
+                '쿼리': ' '.join(r['statement'].split())[:120],
+                '실행(ms)': r['execute_ms'],
+                'fetch(ms)': r['fetch_ms'],
+                'DataFrame(ms)': r['build_ms'],
+                '전체(ms)': r['total_ms'],
+                '행 수': r['rows'],
+                '크기(KB)': None if r['bytes'] is None else r['bytes'] / 1024,
+                '순차 스캔': ', '.join(r['seq_scans'] or []),
+            }
+            for r in records
+        ])
+        st.dataframe(history.round(2), use_container_width=True)
+        
+        scans = sum('states' in (r['seq_scans'] or []) for r in records)
+        if scans:
+            st.warning(f"states 테이블 순차 스캔 {scans}건: 아래에서 해당 쿼리의 조건과 실행 계획을 확인하세요.")
+        
+        index = st.number_input("상세 보기할 기록 번호", min_value=0, max_value=len(records) - 1, value=0)
+        record = records[index]
+        st.code(record['statement'], language='sql')
+        st.caption(f"파라미터: {record['parameters']}")
+        if record['plan']:
+            st.code(record['plan'])
+        elif not ha_db.profiler.explain:
+            st.caption("사이드바에서 '실행 계획(EXPLAIN) 수집'을 켜면 이후 쿼리의 실행 계획이 함께 기록됩니다.")
+        
+        if st.button("계측 기록 비우기"):
+            ha_db.profiler.clear()
+
 def main():
     st.title("🏠 Home Assistant DB Viewer")
     
     # DB 연결
     ha_db = get_db_connection()
+    async_db, async_error = get_async_db()
     
     # 사이드바에 테이블 선택 옵션
     with st.sidebar:
         st.header("테이블 선택")
-        table_info = ha_db.get_table_info()
-        if table_info is not None:
+        # asyncio 연결이 있으면 이전 렌더에서 받은 목록으로 그리고, 새 목록은 본 조회와 함께 받는다
+        table_names = st.session_state.get('table_names')
+        if table_names is None or async_db is None:
+            table_info = ha_db.get_table_info()
+            table_names = table_info['table_name'].tolist() if table_info is not None else None
+            st.session_state.table_names = table_names
+        if table_names is not None:
             selected_table = st.selectbox(
                 "조회할 테이블을 선택하세요",
-                options=table_info['table_name'].tolist()
+                options=table_names
             )
+        if async_db is None:
+            st.caption(f"비동기 조회를 쓸 수 없어 쿼리를 순서대로 실행합니다: {async_error}")
+        
+        # 쿼리 결과 캐시 상태
+        cache_stats = ha_db.cache.stats()
+        st.caption(
+            f"쿼리 캐시: {cache_stats['entries']}개 · {cache_stats['bytes'] / 1024 / 1024:.1f} MB · "
+            f"적중률 {cache_stats['hit_rate']:.0%} (적중 {cache_stats['hits']} / 실패 {cache_stats['misses']})"
+        )
+        if st.button("캐시 비우기"):
+            ha_db.cache.clear()
+        
+        # 쿼리 계측의 실행 계획 수집 여부 (다음 조회부터 적용)
+        ha_db.profiler.explain = st.checkbox(
+            "실행 계획(EXPLAIN) 수집",
+            value=ha_db.profiler.explain,
+            help="PostgreSQL은 EXPLAIN (ANALYZE, BUFFERS)로 쿼리를 한 번 더 실행하므로 문제를 찾을 때만 켜세요."
+        )
         
         st.header("조회 옵션")
+        # 로컬 미러가 있으면 states/events를 운영 DB 대신 미러에서 읽을 수 있다
+        mirror = get_mirror()
+        use_mirror = False
+        if selected_table in ('states', 'events') and mirror.exists():
+            use_mirror = st.radio(
+                "데이터 소스",
+                ["DB", "로컬 미러"],
+                horizontal=True,
+                help="로컬 미러는 ha_recorder_mirror.py sync로 만든 Parquet 사본입니다."
+            ) == "로컬 미러"
+        
         # 시간 범위 선택
         start_ts, end_ts = get_time_range()
         
-        limit = st.number_input("조회할 행 수", min_value=1, max_value=500000, value=100)
+        # states/events는 keyset 커서로 고정 크기 페이지를 조회할 수 있다
+        if selected_table in HomeAssistantDB.KEYSET_COLUMNS and not use_mirror:
+            browse_mode = st.radio(
+                "조회 방식",
+                ["페이지 단위", "전체 조회"],
+                horizontal=True,
+                help="페이지 단위 조회는 이전/다음 이동마다 인덱스를 타는 작은 쿼리 하나만 실행합니다."
+            )
+        else:
+            browse_mode = "전체 조회"
+        
+        if browse_mode == "페이지 단위":
+            limit = st.selectbox("페이지 크기", [50, 100, 200, 500, 1000, 5000], index=1)
+        else:
+            limit = st.number_input("조회할 행 수", min_value=1, max_value=500000, value=100)
         
         if selected_table == 'states':
-            entity_filter = st.text_input("엔티티 ID 필터 (예: light.living_room)")
+            entity_filter = st.text_input(
+                "엔티티 ID 필터 (예: light.living_room, light.*)",
+                help="부분 문자열 또는 glob 패턴을 states_meta에서 찾아 metadata_id 조건으로 조회합니다."
+            )
+            include_attributes = st.checkbox(
+                "속성(attributes) 포함",
+                help="결과에 나온 고유 attributes_id만 한 번씩 조회/파싱해 붙입니다."
+            )
+            attribute_keys = ""
+            if include_attributes:
+                attribute_keys = st.text_input(
+                    "컬럼으로 펼칠 속성 키 (쉼표 구분)",
+                    help="예: friendly_name, unit_of_measurement"
+                )
         elif selected_table == 'events':
-            event_type_filter = st.text_input("이벤트 타입 필터 (예: state_changed)")
+            event_type_filter = st.text_input(
+                "이벤트 타입 필터 (예: automation_triggered, script_*)",
+                help="부분 문자열 또는 glob 패턴을 event_types에서 찾아 event_type_id 조건으로 조회합니다."
+            )
     
     # 메인 영역
     st.header(f"📊 {selected_table} 테이블 데이터")
     
+    nav = None
+    cursor, direction = None, 'next'
+    if browse_mode == "페이지 단위":
+        table_filter = entity_filter if selected_table == 'states' else event_type_filter
+        signature = (selected_table, table_filter, st.session_state.time_range, limit)
+        if st.session_state.time_range == "사용자 지정":
+            signature += (start_ts, end_ts)
+        nav = get_keyset_nav(signature)
+        cursor, direction = nav['cursor'], nav['direction']
+    
     if selected_table == 'states':
         # states 테이블과 states_meta 테이블 조인 쿼리
-        query = """
-        SELECT 
-            s.state_id,
-            sm.entity_id,
-            s.state,
-            s.attributes_id,
-            s.last_changed_ts,
-            s.last_updated_ts,
-            s.metadata_id
-        FROM states s
-        JOIN states_meta sm ON s.metadata_id = sm.metadata_id
-        """
-        
-        where_clauses = []
-        params = {'limit': limit}
-        
-        if entity_filter:
-            where_clauses.append("sm.entity_id LIKE :entity_pattern")
-            params['entity_pattern'] = f"%{entity_filter}%"
-        
-        if start_ts is not None and end_ts is not None:
-            where_clauses.append("s.last_updated_ts BETWEEN :start_ts AND :end_ts")
-            params['start_ts'] = start_ts
-            params['end_ts'] = end_ts
-        
-        if where_clauses:
-            query += "\nWHERE " + " AND ".join(where_clauses)
-        
-        query += "\nORDER BY s.last_updated_ts DESC"
-        query += "\nLIMIT :limit"
+        query, params = ha_db.build_states_query(
+            entity_filter, start_ts, end_ts, limit, cursor, direction
+        )
         
     elif selected_table == 'events':
         # events 테이블과 event_data 테이블 조인 쿼리
-        query = """
-        SELECT 
-            et.event_type as event_type_name,
-            e.time_fired_ts,
-            ed.shared_data as event_data
-        FROM events e
-        LEFT JOIN event_data ed ON e.data_id = ed.data_id
-        LEFT JOIN event_types et ON e.event_type_id = et.event_type_id
-        """
-        
-        where_clauses = []
-        params = {'limit': limit}
-        
-        if event_type_filter:
-            where_clauses.append("(e.event_type LIKE :event_type_pattern OR et.event_type LIKE :event_type_pattern)")
-            params['event_type_pattern'] = f"%{event_type_filter}%"
-        
-        if start_ts is not None and end_ts is not None:
-            where_clauses.append("e.time_fired_ts BETWEEN :start_ts AND :end_ts")
-            params['start_ts'] = start_ts
-            params['end_ts'] = end_ts
-        
-        if where_clauses:
-            query += "\nWHERE " + " AND ".join(where_clauses)
-        
-        query += "\nORDER BY e.time_fired_ts DESC"
-        query += "\nLIMIT :limit"
+        query, params = ha_db.build_events_query(
+            event_type_filter, start_ts, end_ts, limit, cursor, direction
+        )
         
     else:
         # 기본 쿼리 실행
@@ -189,50 +373,121 @@ def main():
         params = {'limit': limit}
     
     # 디버깅을 위한 쿼리 출력
-    st.code(f"실행될 쿼리:\n{query}\n\n파라미터:\n{params}")
+    if use_mirror:
+        table_filter = entity_filter if selected_table == 'states' else event_type_filter
+        st.code(
+            f"로컬 미러 조회: {mirror.root}/{selected_table}\n\n"
+            f"조건:\n{{'filter': {table_filter!r}, 'start_ts': {start_ts}, 'end_ts': {end_ts}, 'limit': {limit}}}"
+        )
+    else:
+        st.code(f"실행될 쿼리:\n{query}\n\n파라미터:\n{params}")
     
     try:
-        with ha_db.engine.connect() as conn:
-            df = pd.read_sql(text(query), conn, params=params)
-            
-            # 타임스탬프를 읽기 쉬운 형식으로 변환
-            timestamp_columns = ['last_changed_ts', 'last_updated_ts', 'time_fired_ts']
-            for col in timestamp_columns:
-                if col in df.columns:
-                    df[col] = df[col].apply(format_timestamp)
-            
-            # JSON 형식 컬럼 포맷팅
-            json_columns = df.select_dtypes(include=['object']).columns
-            for col in json_columns:
-                try:
-                    if col == 'event_data':  # event_data는 JSON으로 파싱
-                        df[col] = df[col].apply(format_json)
-                except:
-                    pass
-            
-            # 데이터프레임 표시
-            if not df.empty:
-                st.write(f"총 {len(df)} 개의 행이 조회되었습니다.")
-                st.dataframe(
-                    df,
-                    use_container_width=True,
-                    height=500
+        if use_mirror:
+            df = load_from_mirror(mirror, selected_table, table_filter, start_ts, end_ts, limit)
+            refresh_table_names(async_db)
+        elif nav is not None:
+            df, first, last, has_more = run_data_query(
+                ha_db, async_db,
+                lambda db: db.fetch_page(selected_table, query, params, direction, compact=True)
+            )
+            if direction == 'prev' and not has_more:
+                # 더 최신 행이 없으면 가득 찬 첫 페이지를 다시 보여준다
+                go_first_page()
+                query, params = (
+                    ha_db.build_states_query(entity_filter, start_ts, end_ts, limit)
+                    if selected_table == 'states'
+                    else ha_db.build_events_query(event_type_filter, start_ts, end_ts, limit)
                 )
-                
-                # 선택된 행 상세 보기
-                if st.checkbox("선택한 행 상세 보기"):
-                    row_index = st.number_input(
-                        "행 번호를 선택하세요",
-                        min_value=0,
-                        max_value=len(df)-1,
-                        value=0
-                    )
-                    st.json(df.iloc[row_index].to_dict())
+                df, first, last, has_more = ha_db.fetch_page(
+                    selected_table, query, params, compact=True
+                )
+            nav.update(first=first, last=last)
+            if nav['direction'] == 'next':
+                nav.update(has_next=has_more, has_prev=nav['cursor'] is not None)
             else:
-                st.info("조회된 데이터가 없습니다.")
+                nav.update(has_next=True, has_prev=True)
+        else:
+            # 알려진 recorder 컬럼은 category/작은 정수로 읽어 큰 구간도 메모리에 여유 있게 올린다
+            df = run_data_query(
+                ha_db, async_db, lambda db: db.read_sql(query, params, compact=True)
+            )
+        
+        # 타임스탬프를 읽기 쉬운 형식으로 변환 (JSON 컬럼은 상세 보기에서만 파싱)
+        df = format_timestamps(df)
+        
+        # 속성은 고유 attributes_id 단위로 조회해 붙인다
+        if selected_table == 'states' and include_attributes and not df.empty:
+            df = ha_db.attributes.attach(df)
+            keys = [k.strip() for k in attribute_keys.split(',') if k.strip()]
+            if keys:
+                df = ha_db.attributes.expand(df, keys)
+        
+        # 데이터프레임 표시
+        if not df.empty:
+            st.write(f"총 {len(df)} 개의 행이 조회되었습니다.")
+            memory = df.attrs.get('memory')
+            if memory and memory['columns']:
+                st.caption(
+                    f"메모리 {memory['before'] / 1024 / 1024:.1f} MB → {memory['after'] / 1024 / 1024:.1f} MB "
+                    f"({1 - memory['after'] / max(memory['before'], 1):.0%} 절감, "
+                    f"변환: {', '.join(memory['columns'])})"
+                )
+            st.dataframe(
+                df,
+                use_container_width=True,
+                height=500
+            )
+            
+            # 선택된 행 상세 보기
+            if st.checkbox("선택한 행 상세 보기"):
+                row_index = st.number_input(
+                    "행 번호를 선택하세요",
+                    min_value=0,
+                    max_value=len(df)-1,
+                    value=0
+                )
+                st.json(row_details(df.iloc[row_index]))
+        else:
+            st.info("조회된 데이터가 없습니다.")
+        
+        # keyset 페이지 이동 버튼
+        if nav is not None:
+            st.caption(f"페이지 {nav['page'] + 1}")
+            nav_cols = st.columns(3)
+            with nav_cols[0]:
+                st.button("⏮ 처음", on_click=go_first_page, disabled=not nav['has_prev'])
+            with nav_cols[1]:
+                st.button("◀ 이전", on_click=go_prev_page, disabled=not nav['has_prev'])
+            with nav_cols[2]:
+                st.button("다음 ▶", on_click=go_next_page, disabled=not nav['has_next'])
     except Exception as e:
         st.error(f"데이터 조회 실패: {str(e)}")
+        show_query_profile(ha_db)
         return
+    
+    # 현재 조건의 전체 결과를 파일로 내보내기 (서버 측 커서로 청크 단위 기록)
+    if selected_table in ('states', 'events') and not use_mirror:
+        with st.expander("📥 전체 결과 내보내기"):
+            st.caption("행 수 제한 없이 현재 필터와 시간 범위의 모든 행을 서버의 파일로 저장합니다.")
+            export_format = st.radio("파일 형식", ["csv", "parquet"], horizontal=True)
+            export_path = st.text_input("저장 경로", f"{selected_table}_export.{export_format}")
+            if st.button("내보내기 실행"):
+                with st.spinner("내보내는 중..."):
+                    if selected_table == 'states':
+                        rows = ha_db.export_states(
+                            export_path, export_format, entity_filter, start_ts, end_ts
+                        )
+                    else:
+                        rows = ha_db.export_events(
+                            export_path, export_format, event_type_filter, start_ts, end_ts
+                        )
+                if rows is None:
+                    st.error("내보내기에 실패했습니다.")
+                else:
+                    st.success(f"{rows}개 행을 {export_path}에 저장했습니다.")
+    
+    show_query_profile(ha_db)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,27 @@
+import os
+import pytz
+from dateutil import tz
+from dotenv import load_dotenv
+
+# .env 파일에서 환경 변수 로드
+load_dotenv()
+
+
+def get_local_tz():
+    """표시/특징 계산에 쓰는 현지 시간대
+
+    HA_TIMEZONE, TZ 순으로 IANA 이름(예: Asia/Seoul)을 읽고,
+    없거나 이름으로 해석할 수 없으면 시스템 현지 시간대를 쓴다.
+    """
+    for var in ('HA_TIMEZONE', 'TZ'):
+        name = os.getenv(var)
+        if not name:
+            continue
+        try:
+            return pytz.timezone(name.lstrip(':'))
+        except pytz.UnknownTimeZoneError:
+            continue
+    return tz.tzlocal()
+
+
+LOCAL_TZ = get_local_tz()
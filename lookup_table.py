@@ -0,0 +1,104 @@
+import time
+import fnmatch
+import threading
+
+
+def match_names(names, pattern):
+    """이름 Series 중 엔티티/이벤트 타입 필터에 맞는 항목의 bool 배열
+
+    *?[가 있으면 glob(전체 일치), 없으면 부분 문자열이다. 예전 LIKE '%x%' 조회처럼
+    대소문자는 구분하지 않는다. DB 조회(LookupTable.match)와 로컬 미러가 같은 규칙을 쓴다.
+    """
+    if any(c in pattern for c in '*?['):
+        # fnmatch.translate는 전체 일치 정규식을 만든다
+        mask = names.str.match(fnmatch.translate(pattern), case=False, na=False)
+    else:
+        mask = names.str.contains(pattern, case=False, regex=False, na=False)
+    return mask.to_numpy(dtype=bool)
+
+
+class LookupTable:
+    """states_meta/event_types처럼 작은 id-이름 표를 메모리에 두고 주기적으로 새로 읽는 캐시
+
+    엔티티/이벤트 타입 필터를 LIKE '%x%' 조인 대신 메모리에서 id 목록으로 바꿔
+    본 쿼리는 metadata_id IN (...)/event_type_id IN (...)로 복합 인덱스를 타게 한다.
+    매칭 규칙은 match_names를 따른다.
+    """
+
+    # 모르는 이름/맞는 항목 없음으로 다시 읽는 최소 간격 (초)
+    # Streamlit은 위젯을 바꿀 때마다 스크립트를 다시 돌리므로 오타 하나로 매번 표를 읽지 않게 한다
+    MISS_RELOAD_SECONDS = 10
+
+    def __init__(self, ha_db, table, id_column, name_column, refresh_seconds=300):
+        self.ha_db = ha_db
+        self.table = table
+        self.id_column = id_column
+        self.name_column = name_column
+        self.refresh_seconds = refresh_seconds
+        self._ids = {}  # 이름 -> id
+        self._names = None  # 이름 Series (id 인덱스)
+        self._loaded_at = None
+        self._last_miss_reload = None
+        self._lock = threading.Lock()
+
+    def _frame(self):
+        """만료됐으면 표를 다시 읽고 (이름 -> id dict, 이름 Series) 반환"""
+        with self._lock:
+            now = time.monotonic()
+            if self._loaded_at is None or now - self._loaded_at > self.refresh_seconds:
+                df = self.ha_db.read_sql(
+                    f"SELECT {self.id_column}, {self.name_column} FROM {self.table}",
+                    use_cache=False
+                )
+                df = df.dropna(subset=[self.name_column])
+                self._names = df.set_index(self.id_column)[self.name_column]
+                self._ids = dict(zip(self._names.tolist(), self._names.index.tolist()))
+                self._loaded_at = now
+            return self._ids, self._names
+
+    def invalidate(self):
+        """다음 조회 때 표를 다시 읽도록 만료"""
+        with self._lock:
+            self._loaded_at = None
+
+    def _reload_after_miss(self):
+        """조회가 빗나갔을 때 최근에 다시 읽지 않았으면 만료시키고 True 반환"""
+        with self._lock:
+            now = time.monotonic()
+            if (self._last_miss_reload is not None
+                    and now - self._last_miss_reload < self.MISS_RELOAD_SECONDS):
+                return False
+            self._last_miss_reload = now
+            self._loaded_at = None
+            return True
+
+    def _ids_for_names(self, names):
+        # 모르는 이름이 있으면 새로 생긴 엔티티일 수 있으므로 한 번 다시 읽는다
+        ids, _ = self._frame()
+        if any(name not in ids for name in names) and self._reload_after_miss():
+            ids, _ = self._frame()
+        return ids
+
+    def get(self, name):
+        """이름의 id (없으면 None)"""
+        value = self._ids_for_names([name]).get(name)
+        return None if value is None else int(value)
+
+    def ids_for(self, names):
+        """이름 목록에 해당하는 id 목록 (없는 이름은 제외, 정렬)"""
+        names = list(names)
+        ids = self._ids_for_names(names)
+        return sorted(int(ids[name]) for name in names if name in ids)
+
+    def match(self, pattern):
+        """부분 문자열 또는 glob 패턴에 맞는 id 목록 (정렬, 규칙은 match_names)"""
+        _, names = self._frame()
+        ids = names.index[match_names(names, pattern)]
+        if not len(ids) and self._reload_after_miss():
+            # 아무것도 맞지 않으면 새로 생긴 엔티티일 수 있으므로 한 번 다시 읽는다
+            _, names = self._frame()
+            ids = names.index[match_names(names, pattern)]
+        return sorted(int(i) for i in ids)
+
+    def __len__(self):
+        return len(self._frame()[1])
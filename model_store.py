@@ -0,0 +1,176 @@
+import os
+import json
+import shutil
+from datetime import datetime
+import numpy as np
+from next_action_predictor import NgramPredictor
+
+# 저장 형식 식별자와 버전 (배열 구성이 바뀌면 올린다)
+FORMAT_NAME = 'ha-next-action-ngram'
+FORMAT_VERSION = 1
+
+# 행동 문자열 표에서 entity_id와 state를 나누는 구분자
+SEPARATOR = '\x1f'
+
+ARRAY_TABLES = ('ctx_keys', 'ctx_totals', 'trans_keys', 'trans_counts')
+
+
+class MappedVocab:
+    """mmap한 문자열 표 위에서 동작하는 읽기 전용 행동 어휘
+
+    행동 문자열을 이어 붙인 blob, 행동별 시작 위치(offsets), 문자열 순으로 정렬한
+    id 배열(sorted_ids)만 가진다. 조회는 이진 탐색이라 시작할 때 dict를 만들지 않는다.
+    ActionVocab 대신 NgramPredictor.vocab으로 쓸 수 있다.
+    """
+
+    def __init__(self, blob, offsets, sorted_ids):
+        self.blob = blob
+        self.offsets = offsets
+        self.sorted_ids = sorted_ids
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def ids(self):
+        # ActionVocab.ids.get(action)과 같은 방식으로 쓸 수 있도록 자신을 반환
+        return self
+
+    def _raw(self, action_id):
+        return self.blob[self.offsets[action_id]:self.offsets[action_id + 1]].tobytes()
+
+    def decode(self, action_id):
+        """id를 (entity_id, state)로 변환"""
+        entity_id, _, state = self._raw(int(action_id)).decode('utf-8').partition(SEPARATOR)
+        return entity_id, state
+
+    def get(self, action, default=None):
+        """(entity_id, state)의 id (없으면 default)"""
+        key = f"{action[0]}{SEPARATOR}{action[1]}".encode('utf-8')
+        lo, hi = 0, len(self.sorted_ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._raw(self.sorted_ids[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.sorted_ids) and self._raw(self.sorted_ids[lo]) == key:
+            return int(self.sorted_ids[lo])
+        return default
+
+
+# 모델 디렉터리 안에서 현재 버전 이름을 담는 포인터 파일과 버전 디렉터리들의 위치
+CURRENT_FILE = 'CURRENT'
+VERSIONS_DIR = 'versions'
+
+# 포인터를 바꾼 뒤에도 남겨 두는 이전 버전 수 (아직 열고 있는 프로세스가 있을 수 있다)
+KEEP_PREVIOUS = 1
+
+
+def _write_arrays(predictor, version_path):
+    """배열 파일과 meta.json을 버전 디렉터리 하나에 기록"""
+    os.makedirs(version_path)
+
+    keys = [
+        f"{predictor.vocab.decode(i)[0]}{SEPARATOR}{predictor.vocab.decode(i)[1]}".encode('utf-8')
+        for i in range(predictor.V)
+    ]
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(key) for key in keys])
+    np.save(os.path.join(version_path, 'vocab_offsets.npy'), offsets)
+    np.save(os.path.join(version_path, 'vocab_sorted.npy'),
+            np.array(sorted(range(len(keys)), key=keys.__getitem__), dtype=np.int64))
+    np.save(os.path.join(version_path, 'vocab_blob.npy'), np.frombuffer(b''.join(keys), dtype=np.uint8))
+
+    np.save(os.path.join(version_path, 'unigram.npy'), predictor.unigram)
+    for table in ARRAY_TABLES:
+        for order, array in getattr(predictor, table).items():
+            np.save(os.path.join(version_path, f'{table}_{order}.npy'), array)
+
+    with open(os.path.join(version_path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'format': FORMAT_NAME,
+            'version': FORMAT_VERSION,
+            'order': predictor.order,
+            'backoff': predictor.backoff,
+            'vocab_size': predictor.V,
+            'orders': sorted(predictor.ctx_keys),
+            'created_at': datetime.now().isoformat(),
+            'stats': predictor.stats(),
+        }, f, ensure_ascii=False, indent=2)
+
+
+def save_model(predictor, path):
+    """예측기를 모델 디렉터리에 새 버전으로 저장
+
+    배열은 path/versions/<버전>/ 아래 .npy와 meta.json으로 쓰고, 다 쓴 뒤 현재 버전 이름을 담은
+    path/CURRENT 파일을 os.replace로 원자적으로 교체한다. 디렉터리 이름을 바꾸지 않으므로
+    실행 중인 서비스가 이전 버전을 mmap으로 열고 있어도 (Windows 포함) 저장할 수 있고,
+    읽는 쪽은 언제나 CURRENT가 가리키는 완성된 버전 하나를 본다.
+
+    Returns:
+        str: 새 버전 디렉터리 경로
+    """
+    versions_path = os.path.join(path, VERSIONS_DIR)
+    os.makedirs(versions_path, exist_ok=True)
+    version = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{os.getpid()}"
+    version_path = os.path.join(versions_path, version)
+    _write_arrays(predictor, version_path)
+
+    current_path = os.path.join(path, CURRENT_FILE)
+    with open(current_path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(current_path + '.tmp', current_path)
+
+    _remove_old_versions(versions_path, version)
+    return version_path
+
+
+def _remove_old_versions(versions_path, current):
+    """현재 버전과 직전 KEEP_PREVIOUS개를 빼고 지우기
+
+    아직 mmap으로 열려 있어 지울 수 없는 버전(Windows)은 남겨 두고 다음 저장 때 다시 시도한다.
+    """
+    older = sorted(name for name in os.listdir(versions_path) if name < current)
+    for name in older[:max(len(older) - KEEP_PREVIOUS, 0)]:
+        shutil.rmtree(os.path.join(versions_path, name), ignore_errors=True)
+
+
+def resolve_model_path(path):
+    """모델 디렉터리에서 현재 버전 디렉터리 경로 (CURRENT가 없으면 path 자체가 버전 디렉터리)"""
+    current_path = os.path.join(path, CURRENT_FILE)
+    if not os.path.exists(current_path):
+        return path
+    with open(current_path, encoding='utf-8') as f:
+        return os.path.join(path, VERSIONS_DIR, f.read().strip())
+
+
+def load_model(path):
+    """save_model로 저장한 예측기를 mmap으로 열기
+
+    배열은 np.load(mmap_mode='r')로 열어 실제로 읽는 페이지만 디스크에서 올라오고,
+    같은 모델을 여는 여러 프로세스는 운영체제 페이지 캐시를 공유한다.
+    모델 크기와 관계없이 시작 비용은 파일을 여는 정도다.
+    path는 save_model의 모델 디렉터리(CURRENT가 가리키는 버전을 연다)나 버전 디렉터리다.
+    """
+    path = resolve_model_path(path)
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format') != FORMAT_NAME:
+        raise ValueError(f"모델 형식이 아닙니다: {path}")
+    if meta.get('version') != FORMAT_VERSION:
+        raise ValueError(
+            f"지원하지 않는 모델 버전입니다: {meta.get('version')} (지원: {FORMAT_VERSION})"
+        )
+
+    def array(name):
+        # memmap 하위 클래스는 연산마다 부가 비용이 있어 같은 버퍼의 일반 ndarray 뷰로 쓴다
+        return np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r').view(np.ndarray)
+
+    predictor = NgramPredictor(order=meta['order'], backoff=meta['backoff'])
+    predictor.V = meta['vocab_size']
+    predictor.vocab = MappedVocab(array('vocab_blob'), array('vocab_offsets'), array('vocab_sorted'))
+    predictor.unigram = array('unigram')
+    for table in ARRAY_TABLES:
+        setattr(predictor, table, {order: array(f'{table}_{order}') for order in meta['orders']})
+    return predictor
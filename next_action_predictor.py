@@ -0,0 +1,303 @@
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+# .env 파일에서 환경 변수 로드
+load_dotenv()
+
+# 행동으로 보지 않는 상태 값
+IGNORED_STATES = ('unavailable', 'unknown')
+
+
+def actions_from_logbook(logbook, exclude_states=IGNORED_STATES):
+    """로그북을 시간순 행동(엔티티, 상태) 목록으로 변환
+
+    HomeAssistantDB.get_logbook 결과(time_fired, event_type, entity_state)와
+    /api/logbook 응답(when, state, 리스트 또는 DataFrame)을 모두 받는다.
+
+    Returns:
+        DataFrame: ts(초 단위 UTC 타임스탬프), entity_id, state
+    """
+    df = logbook if isinstance(logbook, pd.DataFrame) else pd.DataFrame(logbook)
+    if df.empty:
+        return pd.DataFrame({'ts': pd.Series(dtype='float64'), 'entity_id': [], 'state': []})
+
+    if 'time_fired' in df.columns:
+        # DB 로그북: 상태 변경 행만 행동으로 사용
+        df = df[df['event_type'] == 'state_changed']
+        df = pd.DataFrame({
+            'when': df['time_fired'], 'entity_id': df['entity_id'], 'state': df['entity_state'],
+        })
+    else:
+        df = df.reindex(columns=['when', 'entity_id', 'state'])
+
+    df = df.dropna(subset=['when', 'entity_id', 'state'])
+    if exclude_states:
+        df = df[~df['state'].isin(list(exclude_states))]
+
+    when = pd.to_datetime(df['when'], utc=True, format='ISO8601')
+    actions = pd.DataFrame({
+        'ts': (when - pd.Timestamp(0, tz='UTC')) / pd.Timedelta(seconds=1),
+        'entity_id': df['entity_id'].astype(str),
+        'state': df['state'].astype(str),
+    })
+    return actions.sort_values('ts', kind='stable').reset_index(drop=True)
+
+
+def backoff_scores(levels, unigram, backoff, k):
+    """문맥 차수별 후속 행동 횟수를 stupid backoff 점수로 합쳐 상위 k개 반환
+
+    Args:
+        levels (list): 긴 문맥부터 (차수, 행동 id 배열, 횟수 배열, 문맥 전체 횟수)
+        unigram (array): 행동별 전체 횟수 (문맥 후보가 k개보다 적을 때만 사용)
+        backoff (float): 차수가 하나 낮아질 때마다 곱하는 가중치
+        k (int): 반환할 개수
+
+    Returns:
+        tuple: (행동 id 배열, 점수 배열) 점수 내림차순
+    """
+    candidates, scores = [], []
+    deepest = levels[0][0] if levels else 0
+    for order, action_ids, counts, total in levels:
+        candidates.append(action_ids)
+        scores.append(backoff ** (deepest - order) * counts / total)
+
+    # 문맥이 일치하는 후보가 k개보다 적을 때만 전체 빈도로 채운다
+    if sum(len(c) for c in candidates) < k:
+        candidates.append(np.arange(len(unigram)))
+        scores.append(backoff ** deepest * unigram / max(unigram.sum(), 1))
+
+    candidates = np.concatenate(candidates)
+    scores = np.concatenate(scores)
+    # 같은 후보는 가장 긴 문맥(먼저 나온 것)의 점수만 사용
+    candidates, first = np.unique(candidates, return_index=True)
+    scores = scores[first]
+
+    top = np.argsort(-scores, kind='stable')[:k]
+    return candidates[top], scores[top]
+
+
+class ActionVocab:
+    """(entity_id, state) 행동과 연속된 정수 id 사이의 변환표"""
+
+    def __init__(self):
+        self.ids = {}
+        self.actions = []
+
+    def __len__(self):
+        return len(self.actions)
+
+    def add(self, action):
+        """행동의 id 반환 (처음 보는 행동이면 새 id 부여)"""
+        action_id = self.ids.get(action)
+        if action_id is None:
+            action_id = len(self.actions)
+            self.ids[action] = action_id
+            self.actions.append(action)
+        return action_id
+
+    def encode(self, entity_ids, states, add=True):
+        """엔티티/상태 배열을 id 배열로 변환 (add=False면 모르는 행동은 -1)
+
+        고유한 (엔티티, 상태) 쌍만 사전을 조회하므로 행 수가 많아도 빠르다.
+        """
+        codes, uniques = pd.factorize(pd.MultiIndex.from_arrays([entity_ids, states]))
+        if add:
+            mapping = np.array([self.add(action) for action in uniques], dtype=np.int64)
+        else:
+            mapping = np.array([self.ids.get(action, -1) for action in uniques], dtype=np.int64)
+        return mapping[codes] if len(codes) else np.empty(0, dtype=np.int64)
+
+    def decode(self, action_id):
+        """id를 (entity_id, state)로 변환"""
+        return self.actions[action_id]
+
+
+class NgramPredictor:
+    """가변 차수 n-gram(마르코프) 다음 행동 예측기
+
+    행동을 정수 id로 바꾼 뒤 차수 k(1..order)마다 다음 배열만 가진다.
+
+    - ctx_keys[k]: 정렬된 문맥 키. 길이 k 문맥의 키는
+      (가장 최근 k-1개 문맥의 인덱스) * V + (k번째 이전 행동 id)라서 int64 하나에 들어간다.
+    - ctx_totals[k]: 문맥별 전체 등장 횟수
+    - trans_keys[k], trans_counts[k]: 정렬된 (문맥 인덱스 * V + 다음 행동 id)와 등장 횟수
+
+    한 문맥의 다음 행동들은 trans_keys에서 연속된 구간이므로 조회는 searchsorted 몇 번이면
+    끝난다. 점수는 가장 긴 일치 문맥부터 상대 빈도를 쓰고, 짧은 문맥에서만 나온 후보는
+    차수가 낮아질 때마다 backoff를 곱한다(stupid backoff).
+    """
+
+    def __init__(self, order=3, backoff=0.4):
+        self.order = order
+        self.backoff = backoff
+        self.vocab = ActionVocab()
+        self.V = 0
+        self.unigram = np.zeros(0, dtype=np.int64)
+        self.ctx_keys = {}
+        self.ctx_totals = {}
+        self.trans_keys = {}
+        self.trans_counts = {}
+
+    def fit(self, ids, starts=None, targets=None, vocab_size=None):
+        """id 배열로 전이 횟수 집계
+
+        Args:
+            ids (array): 시간순 행동 id
+            starts (array): 새 시퀀스가 시작되는 위치 표시 (bool, 기본값: 처음만)
+            targets (array): 다음 행동으로 집계할 위치 표시 (bool, 기본값: 전체).
+                문맥은 전체 시퀀스에서 만들고 전이는 표시된 위치만 센다 (분할 학습용)
+            vocab_size (int): 어휘 크기 (기본값: 어휘 또는 최대 id로 결정)
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        n = len(ids)
+        V = self.V = vocab_size or max(len(self.vocab), int(ids.max()) + 1 if n else 0)
+
+        positions = np.arange(n)
+        if starts is None:
+            starts = positions == 0
+        if targets is None:
+            targets = np.ones(n, dtype=bool)
+        self.unigram = np.bincount(ids[targets], minlength=V)
+        # 각 위치가 속한 시퀀스의 시작 위치 (시퀀스 경계를 넘는 문맥은 만들지 않는다)
+        seq_start = np.maximum.accumulate(np.where(starts, positions, 0)) if n else positions
+
+        prev_idx = np.zeros(n, dtype=np.int64)  # 차수 k-1 문맥의 인덱스 (차수 0은 빈 문맥 하나)
+        for k in range(1, self.order + 1):
+            t = positions[(positions - seq_start >= k) & targets]
+            keys = prev_idx[t] * V + ids[t - k]
+            ctx_keys, inverse = np.unique(keys, return_inverse=True)
+            trans_keys, trans_counts = np.unique(inverse * V + ids[t], return_counts=True)
+
+            self.ctx_keys[k] = ctx_keys
+            self.ctx_totals[k] = np.bincount(inverse, minlength=len(ctx_keys)).astype(np.int32)
+            self.trans_keys[k] = trans_keys
+            self.trans_counts[k] = trans_counts.astype(np.int32)
+
+            prev_idx = np.zeros(n, dtype=np.int64)
+            prev_idx[t] = inverse
+        return self
+
+    def fit_logbook(self, logbook, max_gap=timedelta(minutes=30)):
+        """로그북으로 어휘와 전이 횟수를 새로 만든다 (max_gap보다 긴 공백에서 시퀀스를 나눔)"""
+        return self.fit_actions(actions_from_logbook(logbook), max_gap)
+
+    def fit_actions(self, actions, max_gap=timedelta(minutes=30)):
+        """시간순 행동(ts, entity_id, state) DataFrame으로 어휘와 전이 횟수를 새로 만든다
+
+        sessionizer.episode_actions 결과를 넣으면 에피소드 하나가 행동 하나가 된다.
+        """
+        self.vocab = ActionVocab()
+        ids = self.vocab.encode(actions['entity_id'], actions['state'])
+        gaps = np.diff(actions['ts'].to_numpy(), prepend=-np.inf)
+        return self.fit(ids, starts=gaps > max_gap.total_seconds())
+
+    def _contexts(self, history):
+        """history 끝과 일치하는 (차수, 문맥 인덱스) 목록 (짧은 차수부터)"""
+        found = []
+        idx = 0
+        for k in range(1, min(self.order, len(history)) + 1):
+            action_id = history[-k]
+            if action_id < 0 or action_id >= self.V:
+                break
+            key = idx * self.V + action_id
+            ctx_keys = self.ctx_keys[k]
+            pos = np.searchsorted(ctx_keys, key)
+            if pos == len(ctx_keys) or ctx_keys[pos] != key:
+                break
+            idx = int(pos)
+            found.append((k, idx))
+        return found
+
+    def successors(self, order, idx):
+        """차수 order 문맥 idx 다음에 나온 (행동 id 배열, 횟수 배열)"""
+        trans_keys = self.trans_keys[order]
+        base = idx * self.V
+        lo, hi = np.searchsorted(trans_keys, [base, base + self.V])
+        return trans_keys[lo:hi] - base, self.trans_counts[order][lo:hi]
+
+    def predict_ids(self, history, k=5):
+        """최근 행동 id 목록 다음에 올 행동 상위 k개
+
+        Returns:
+            tuple: (행동 id 배열, 점수 배열) 점수 내림차순
+        """
+        if not self.V:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        levels = [
+            (order, *self.successors(order, idx), self.ctx_totals[order][idx])
+            for order, idx in reversed(self._contexts(history))
+        ]
+        return backoff_scores(levels, self.unigram, self.backoff, k)
+
+    def predict(self, history, k=5):
+        """최근 행동 (entity_id, state) 목록 다음에 올 행동 상위 k개
+
+        Returns:
+            list: [((entity_id, state), 점수), ...]
+        """
+        history_ids = [self.vocab.ids.get(tuple(action), -1) for action in history[-self.order:]]
+        action_ids, scores = self.predict_ids(history_ids, k)
+        return [
+            (self.vocab.decode(action_id), float(score))
+            for action_id, score in zip(action_ids, scores)
+        ]
+
+    def nbytes(self):
+        """전이 통계 배열의 전체 크기 (바이트)"""
+        arrays = [self.unigram]
+        for table in (self.ctx_keys, self.ctx_totals, self.trans_keys, self.trans_counts):
+            arrays += table.values()
+        return sum(array.nbytes for array in arrays)
+
+    def stats(self):
+        """어휘 크기, 차수별 문맥/전이 수, 메모리 사용량"""
+        return {
+            'vocab': self.V,
+            'contexts': {k: len(keys) for k, keys in self.ctx_keys.items()},
+            'transitions': {k: len(keys) for k, keys in self.trans_keys.items()},
+            'nbytes': self.nbytes(),
+        }
+
+
+def main():
+    from ha_db_reader import HomeAssistantDB
+
+    parser = argparse.ArgumentParser(description="recorder 로그북으로 다음 행동 예측기 학습")
+    parser.add_argument('--days', type=int, default=7, help="학습에 사용할 최근 일수")
+    parser.add_argument('--order', type=int, default=3, help="최대 문맥 길이")
+    parser.add_argument('--top', type=int, default=5, help="출력할 예측 수")
+    parser.add_argument('--episodes', action='store_true',
+                        help="context 단위 에피소드마다 첫 상태 변경만 행동으로 사용")
+    parser.add_argument('--save', help="학습한 모델을 저장할 디렉터리 (model_store 형식)")
+    args = parser.parse_args()
+
+    end_time = datetime.now()
+    logbook = HomeAssistantDB().get_logbook(end_time - timedelta(days=args.days), end_time)
+    if logbook is None:
+        return
+
+    if args.episodes:
+        from sessionizer import sessionize, episode_actions
+        actions = episode_actions(sessionize(logbook)[1])
+    else:
+        actions = actions_from_logbook(logbook)
+    predictor = NgramPredictor(order=args.order).fit_actions(actions)
+    print(f"학습 완료: {predictor.stats()}")
+    if args.save:
+        from model_store import save_model
+        save_model(predictor, args.save)
+        print(f"모델 저장: {args.save}")
+
+    recent = actions.tail(args.order)
+    history = list(zip(recent['entity_id'], recent['state']))
+    print(f"최근 행동: {history}")
+    for action, score in predictor.predict(history, args.top):
+        print(f"  {action[0]} -> {action[1]}: {score:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+import math
+import random
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+import numpy as np
+from next_action_predictor import IGNORED_STATES
+
+# 가중치 배율이 이만큼 커지면 전체 가중치를 다시 정규화한다 (float64 범위 안에서 여유 있게)
+MAX_LOG_SCALE = 500.0
+
+
+class OnlinePredictor:
+    """이벤트가 들어올 때마다 제자리에서 갱신하는 시간 감쇠 다음 행동 예측기
+
+    모든 구조가 고정 크기 배열이라 아무리 오래 돌려도 메모리가 늘지 않는다.
+
+    - 행동 어휘는 최대 max_actions개. 가득 차면 임의로 고른 몇 개 중 가중치가 가장 작은
+      행동을 내보내고 그 id를 재사용한다. id마다 세대(generation)를 두어 재사용된 id를
+      가리키는 옛 후속 슬롯은 무시된다.
+    - 문맥(최근 1..order개 행동)은 해시로 contexts개 행 중 하나에 직접 대응되고,
+      행마다 후속 행동 슬롯이 slots개 있다. 자리가 없으면 가중치가 가장 작은 슬롯을 교체한다.
+    - 감쇠는 배열 전체를 곱하지 않고 전역 배율로 처리한다. 시각 t의 이벤트는
+      exp(rate * (t - ref_ts))만큼 더하므로 오래된 가중치는 상대적으로 작아진다.
+      배율이 너무 커지면 한 번 전체를 정규화한다 (분할 상환 O(1)).
+
+    따라서 이벤트 하나의 갱신 비용은 O(order * slots)로 상수다.
+    """
+
+    def __init__(self, order=2, max_actions=4096, contexts=65536, slots=16,
+                 half_life=timedelta(days=3), max_gap=timedelta(minutes=30),
+                 backoff=0.4, evict_samples=8):
+        self.order = order
+        self.max_actions = max_actions
+        self.contexts = contexts
+        self.slots = slots
+        self.rate = math.log(2) / half_life.total_seconds()
+        self.max_gap = max_gap.total_seconds()
+        self.backoff = backoff
+        self.evict_samples = evict_samples
+
+        # 행동 어휘
+        self.ids = {}
+        self.actions = [None] * max_actions
+        self.generation = np.zeros(max_actions, dtype=np.int32)
+        self.action_weight = np.zeros(max_actions, dtype=np.float64)
+        self.size = 0
+
+        # 문맥 테이블 (tag 0은 빈 행)
+        self.ctx_tag = np.zeros(contexts, dtype=np.int64)
+        self.succ_id = np.full((contexts, slots), -1, dtype=np.int32)
+        self.succ_gen = np.zeros((contexts, slots), dtype=np.int32)
+        self.succ_weight = np.zeros((contexts, slots), dtype=np.float64)
+
+        self.ref_ts = None
+        self.last_ts = None
+        self.history = deque(maxlen=order)  # 최근 (id, 세대)
+        self._lock = threading.Lock()
+        self.events = 0
+        self.evictions = 0
+
+    # ----- 갱신 -----
+
+    def update(self, entity_id, state, ts):
+        """행동 하나 반영
+
+        Args:
+            entity_id (str): 엔티티 ID
+            state (str): 새 상태
+            ts (float): 초 단위 UTC 타임스탬프 (대략 시간순이어야 한다)
+        """
+        if state is None or state in IGNORED_STATES:
+            return
+        with self._lock:
+            self._update(entity_id, state, float(ts))
+
+    def update_many(self, actions):
+        """actions_from_logbook 형식(ts, entity_id, state) DataFrame을 시간순으로 반영"""
+        # 엔티티나 상태가 없는 행(NULL/NaN)은 행동으로 보지 않는다
+        # (NaN은 자신과 같지 않아 행마다 새 행동 키가 되므로 is not None으로는 거를 수 없다)
+        keep = (
+            actions['entity_id'].notna()
+            & actions['state'].notna()
+            & ~actions['state'].isin(IGNORED_STATES)
+        )
+        actions = actions[keep]
+        with self._lock:
+            for ts, entity_id, state in zip(actions['ts'], actions['entity_id'], actions['state']):
+                self._update(entity_id, state, float(ts))
+
+    def _update(self, entity_id, state, ts):
+        if self.ref_ts is None:
+            self.ref_ts = ts
+        if self.last_ts is not None and ts - self.last_ts > self.max_gap:
+            self.history.clear()
+        self.last_ts = max(ts, self.last_ts or ts)
+
+        log_scale = self.rate * (ts - self.ref_ts)
+        if log_scale > MAX_LOG_SCALE:
+            self._renormalize(ts)
+            log_scale = 0.0
+        weight = math.exp(log_scale)
+
+        action_id = self._action_id((entity_id, state))
+        self.action_weight[action_id] += weight
+        current = (action_id, int(self.generation[action_id]))
+
+        history = list(self.history)
+        for k in range(1, min(self.order, len(history)) + 1):
+            row = self._row(history[-k:], create=True)
+            self._add_successor(row, current, weight)
+
+        self.history.append(current)
+        self.events += 1
+
+    def _renormalize(self, ts):
+        """기준 시각을 ts로 옮기고 저장된 가중치를 한 번에 줄인다"""
+        factor = math.exp(-self.rate * (ts - self.ref_ts))
+        self.action_weight *= factor
+        self.succ_weight *= factor
+        self.ref_ts = ts
+
+    def _action_id(self, action):
+        action_id = self.ids.get(action)
+        if action_id is not None:
+            return action_id
+        if self.size < self.max_actions:
+            action_id = self.size
+            self.size += 1
+        else:
+            action_id = self._evict()
+        self.ids[action] = action_id
+        self.actions[action_id] = action
+        return action_id
+
+    def _evict(self):
+        """임의로 고른 몇 개 중 가중치가 가장 작은 행동을 내보내고 그 id 반환"""
+        in_history = {action_id for action_id, _ in self.history}
+        candidates = [
+            action_id for action_id in random.sample(range(self.max_actions), self.evict_samples)
+            if action_id not in in_history
+        ] or [random.randrange(self.max_actions)]
+        action_id = min(candidates, key=lambda i: self.action_weight[i])
+
+        del self.ids[self.actions[action_id]]
+        self.generation[action_id] += 1
+        self.action_weight[action_id] = 0.0
+        self.evictions += 1
+        return action_id
+
+    def _tag(self, context):
+        """문맥 (id, 세대) 목록의 0이 아닌 해시"""
+        return hash(tuple(context)) or 1
+
+    def _row(self, context, create=False):
+        tag = self._tag(context)
+        row = tag % self.contexts
+        if self.ctx_tag[row] != tag:
+            if not create:
+                return None
+            # 직접 대응 테이블이므로 충돌하면 기존 문맥을 덮어쓴다
+            self.ctx_tag[row] = tag
+            self.succ_id[row] = -1
+            self.succ_weight[row] = 0.0
+        return row
+
+    def _live_slots(self, row):
+        """현재 세대와 일치하는 (살아 있는) 슬롯 표시"""
+        ids = self.succ_id[row]
+        return (ids >= 0) & (self.succ_gen[row] == self.generation[np.maximum(ids, 0)])
+
+    def _add_successor(self, row, current, weight):
+        action_id, generation = current
+        ids = self.succ_id[row]
+        live = self._live_slots(row)
+        match = np.flatnonzero(live & (ids == action_id))
+        if len(match):
+            self.succ_weight[row, match[0]] += weight
+            return
+        # 빈 슬롯(또는 내보낸 행동의 슬롯)이 없으면 가중치가 가장 작은 슬롯을 교체
+        weights = np.where(live, self.succ_weight[row], -1.0)
+        slot = int(np.argmin(weights))
+        self.succ_id[row, slot] = action_id
+        self.succ_gen[row, slot] = generation
+        self.succ_weight[row, slot] = weight
+
+    # ----- 예측 -----
+
+    def predict(self, history, k=5):
+        """최근 행동 (entity_id, state) 목록 다음에 올 행동 상위 k개
+
+        Returns:
+            list: [((entity_id, state), 점수), ...]
+        """
+        with self._lock:
+            context = []
+            for action in history[-self.order:]:
+                action_id = self.ids.get(tuple(action))
+                if action_id is None:
+                    context = []
+                    continue
+                context.append((action_id, int(self.generation[action_id])))
+
+            scores = {}
+            deepest = None
+            for length in range(min(self.order, len(context)), 0, -1):
+                row = self._row(context[-length:])
+                if row is None:
+                    continue
+                live = self._live_slots(row)
+                total = self.succ_weight[row][live].sum()
+                if total <= 0:
+                    continue
+                deepest = deepest or length
+                weight = self.backoff ** (deepest - length)
+                for action_id, w in zip(self.succ_id[row][live], self.succ_weight[row][live]):
+                    scores.setdefault(int(action_id), weight * w / total)
+
+            # 문맥으로 k개를 못 채우면 전체 빈도로 채운다
+            if len(scores) < k and self.size:
+                weights = self.action_weight[:self.size]
+                total = weights.sum()
+                weight = self.backoff ** (deepest or 0)
+                for action_id in np.argsort(-weights)[:k]:
+                    if weights[action_id] > 0:
+                        scores.setdefault(int(action_id), weight * weights[action_id] / total)
+
+            top = sorted(scores.items(), key=lambda item: -item[1])[:k]
+            return [(self.actions[action_id], float(score)) for action_id, score in top]
+
+    def recent(self):
+        """예측 문맥으로 쓰이는 최근 행동 목록"""
+        with self._lock:
+            return [self.actions[action_id] for action_id, _ in self.history]
+
+    def stats(self):
+        """어휘/문맥 사용량과 메모리 크기"""
+        with self._lock:
+            return {
+                'events': self.events,
+                'actions': self.size,
+                'max_actions': self.max_actions,
+                'evictions': self.evictions,
+                'contexts_used': int(np.count_nonzero(self.ctx_tag)),
+                'nbytes': sum(array.nbytes for array in (
+                    self.generation, self.action_weight, self.ctx_tag,
+                    self.succ_id, self.succ_gen, self.succ_weight,
+                )),
+            }
+
+    # ----- 입력 연결 -----
+
+    def live_listener(self, entity_id, old_state, new_state):
+        """HALiveStates.add_listener용 콜백 (속성만 바뀐 이벤트는 무시)"""
+        if new_state is None:
+            return
+        if old_state is not None and old_state.get('state') == new_state.get('state'):
+            return
+        self.update(entity_id, new_state.get('state'), _parse_ts(new_state.get('last_changed')))
+
+
+def _parse_ts(value):
+    """ISO 시각 문자열을 초 단위 타임스탬프로 (없으면 현재 시각)"""
+    if not value:
+        return datetime.now().timestamp()
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+class SnapshotDiffFeed:
+    """연속된 StatesSnapshot을 비교해 바뀐 상태만 예측기에 넣는 피드
+
+    API Viewer처럼 주기적으로 /api/states 전체를 받는 경우에 쓴다.
+    첫 스냅샷은 기준으로만 삼고 반영하지 않는다.
+    """
+
+    def __init__(self, predictor):
+        self.predictor = predictor
+        self._last = None  # entity_id -> (state, last_changed)
+
+    def feed(self, snapshot):
+        """스냅샷 하나를 반영하고 새로 반영한 변경 수 반환"""
+        current = {
+            entity_id: (state.get('state'), state.get('last_changed'))
+            for entity_id, state in snapshot.by_id.items()
+        }
+        changes = []
+        if self._last is not None:
+            for entity_id, (state, last_changed) in current.items():
+                previous = self._last.get(entity_id)
+                if previous is None or previous[0] != state:
+                    changes.append((_parse_ts(last_changed), entity_id, state))
+        self._last = current
+
+        changes.sort()
+        for ts, entity_id, state in changes:
+            self.predictor.update(entity_id, state, ts)
+        return len(changes)
+
+
+class RecorderFeed:
+    """recorder DB의 states를 state_id 워터마크 이후만 읽어 예측기에 넣는 피드"""
+
+    QUERY = """
+    SELECT
+        s.state_id,
+        sm.entity_id,
+        s.state,
+        s.last_updated_ts AS ts
+    FROM states s
+    JOIN states_meta sm ON s.metadata_id = sm.metadata_id
+    WHERE s.state_id > :watermark
+      AND (s.last_changed_ts IS NULL OR s.last_changed_ts = s.last_updated_ts)
+    ORDER BY s.state_id
+    LIMIT :batch_size
+    """
+
+    def __init__(self, ha_db, predictor, watermark=0):
+        self.ha_db = ha_db
+        self.predictor = predictor
+        self.watermark = watermark
+
+    def poll(self, batch_size=10000):
+        """워터마크 이후 상태 변경을 반영하고 반영한 행 수 반환"""
+        total = 0
+        while True:
+            df = self.ha_db.read_sql(
+                self.QUERY, {'watermark': self.watermark, 'batch_size': batch_size},
+                use_cache=False
+            )
+            if df is None or df.empty:
+                return total
+            # state_id 순서와 시간 순서는 거의 같지만 같은 배치 안에서는 시간순으로 맞춘다
+            self.predictor.update_many(df.sort_values('ts', kind='stable'))
+            self.watermark = int(df['state_id'].max())
+            total += len(df)
+            if len(df) < batch_size:
+                return total
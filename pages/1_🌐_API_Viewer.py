@@ -1,10 +1,11 @@
 import streamlit as st
 import pandas as pd
-import json
-import os
-import requests
 from dotenv import load_dotenv
 import sys
+from states_snapshot import StatesSnapshot
+from ha_live_states import HALiveStates
+from ha_api_client import get_default_client
+from online_predictor import OnlinePredictor, SnapshotDiffFeed
 
 # .env 파일 로드
 load_dotenv()
@@ -18,19 +19,13 @@ st.set_page_config(
 
 class HAApi:
     def __init__(self):
-        self.base_url = os.getenv('HA_URL')  # HA 주소
-        self.token = os.getenv('HA_TOKEN')
-        self.headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json",
-        }
+        # 커넥션 풀과 재시도를 공유하는 REST 클라이언트
+        self.client = get_default_client()
 
     def get_states(self):
         """현재 모든 엔티티의 상태를 조회"""
         try:
-            response = requests.get(f"{self.base_url}/api/states", headers=self.headers)
-            response.raise_for_status()
-            return response.json()
+            return self.client.get("/api/states")
         except Exception as e:
             st.error(f"HA API 호출 실패: {str(e)}")
             return None
@@ -40,9 +35,22 @@ def get_ha_api():
     """HA API 클라이언트를 생성하고 캐시"""
     return HAApi()
 
-def get_object_size(obj):
-    """객체의 메모리 크기를 계산"""
-    return len(json.dumps(obj).encode('utf-8'))
+@st.cache_resource
+def get_online_predictor():
+    """상태 변경을 들어오는 대로 반영하는 다음 행동 예측기"""
+    return OnlinePredictor()
+
+@st.cache_resource
+def get_snapshot_feed():
+    """새로고침한 스냅샷끼리 비교해 바뀐 상태만 예측기에 넣는 피드"""
+    return SnapshotDiffFeed(get_online_predictor())
+
+@st.cache_resource
+def get_live_states():
+    """WebSocket 실시간 상태 구독을 시작하고 캐시"""
+    live = HALiveStates()
+    live.add_listener(get_online_predictor().live_listener)
+    return live.start()
 
 def format_size(size_bytes):
     """바이트 크기를 읽기 쉬운 형식으로 변환"""
@@ -62,6 +70,12 @@ def main():
     with st.sidebar:
         st.header("필터 옵션")
         entity_filter = st.text_input("엔티티 ID 필터 (예: light.living_room)")
+        
+        st.header("데이터 소스")
+        live_mode = st.checkbox(
+            "실시간 모드 (WebSocket)",
+            help="처음 한 번 전체 상태를 받은 뒤 state_changed 변경분만 받아 최신 상태를 유지합니다."
+        )
     
     # 메인 영역
     col1, col2 = st.columns([2, 3])
@@ -69,35 +83,48 @@ def main():
     with col1:
         st.header("엔티티 목록")
         
-        # 세션 상태 초기화
+        # 세션 상태 초기화 (응답은 fetch할 때 한 번만 인덱싱해 둔다)
         if 'current_states' not in st.session_state:
             st.session_state.current_states = None
         
-        if st.button("새로고침", key="refresh_api"):
-            st.session_state.current_states = ha_api.get_states()
-        
-        # 데이터가 없으면 자동으로 처음 로드
-        if st.session_state.current_states is None:
-            st.session_state.current_states = ha_api.get_states()
-        
-        if st.session_state.current_states:
-            # 데이터프레임으로 변환
-            states_data = []
-            for state in st.session_state.current_states:
-                domain = state['entity_id'].split('.')[0]
-                states_data.append({
-                    'domain': domain,
-                    'entity_id': state['entity_id'],
-                    'state': state['state'],
-                    'last_updated': state['last_updated'],
-                    'size': get_object_size(state)
-                })
+        if live_mode:
+            # 구독 스레드가 유지하는 스냅샷을 가져오므로 새로고침에 HTTP 요청이 없다
+            live = get_live_states()
+            st.button("새로고침", key="refresh_live")
+            if not live.wait_ready(timeout=10):
+                st.error(f"WebSocket 연결 실패: {live.error or '응답 대기 시간 초과'}")
+            # 변경이 있을 때만 새 복사본을 받아 DataFrame/JSON 캐시를 재실행 사이에 유지한다
+            cached = st.session_state.get('live_snapshot')
+            if cached is None or cached[1] is None or cached[0] != live.version:
+                cached = live.get_versioned_snapshot()
+                st.session_state.live_snapshot = cached
+            st.session_state.current_states = cached[1]
+            status = "연결됨" if live.connected else f"재연결 중 ({live.error})"
+            st.caption(
+                f"WebSocket {status} · 수신 이벤트 {live.events_received}개 · "
+                f"수신량 {format_size(live.bytes_received)}"
+            )
+        else:
+            summary = ha_api.client.metrics_summary()
+            if summary:
+                st.caption(summary)
+            if st.button("새로고침", key="refresh_api"):
+                st.session_state.current_states = None
             
-            df_current = pd.DataFrame(states_data)
+            # 데이터가 없으면 자동으로 처음 로드
+            if st.session_state.current_states is None:
+                states = ha_api.get_states()
+                if states:
+                    st.session_state.current_states = StatesSnapshot(states)
+                    get_snapshot_feed().feed(st.session_state.current_states)
+        
+        snapshot = st.session_state.current_states
+        if snapshot:
+            df_current = snapshot.df
             
             # 도메인 체크박스 생성
             st.subheader("도메인 필터")
-            domains = sorted(df_current['domain'].unique())
+            domains = snapshot.domains
             
             # 전체 선택/해제 버튼
             cols = st.columns(2)
@@ -117,7 +144,7 @@ def main():
             for i, domain in enumerate(domains):
                 with domain_cols[i % 3]:
                     if st.checkbox(
-                        f"{domain} ({len(df_current[df_current['domain'] == domain])})",
+                        f"{domain} ({snapshot.domain_count(domain)})",
                         value=domain in st.session_state.selected_domains,
                         key=f"domain_{domain}"
                     ):
@@ -169,19 +196,13 @@ def main():
     with col2:
         # 선택된 도메인의 전체 데이터 표시
         st.header("선택된 도메인 데이터")
-        if st.session_state.current_states and not df_filtered.empty:
-            # 선택된 도메인의 모든 엔티티 데이터 수집
-            selected_entities_data = [
-                state for state in st.session_state.current_states 
-                if state['entity_id'].split('.')[0] in st.session_state.selected_domains
-            ]
-            
-            # 데이터 크기 계산 및 표시
-            total_size = sum(get_object_size(state) for state in selected_entities_data)
+        if snapshot and not df_filtered.empty:
+            # 데이터 크기 표시 (fetch 시 계산해 둔 도메인별 크기 합)
+            total_size = snapshot.total_size(st.session_state.selected_domains)
             st.info(f"전체 데이터 크기: {format_size(total_size)}")
             
-            # 전체 데이터를 JSON으로 변환
-            json_data = json.dumps(selected_entities_data, indent=2, ensure_ascii=False)
+            # 전체 데이터를 JSON으로 변환 (선택이 바뀔 때만 다시 직렬화)
+            json_data = snapshot.selected_json(st.session_state.selected_domains)
             
             # 데이터 복사를 위한 텍스트 영역과 버튼
             st.text_area("전체 데이터 (복사하려면 선택 후 Ctrl+C)", json_data, height=200)
@@ -196,7 +217,7 @@ def main():
         
         # 개별 엔티티 상세 정보 표시
         st.header("엔티티 상세 정보")
-        if st.session_state.current_states and not df_filtered.empty:
+        if snapshot and not df_filtered.empty:
             # 엔티티 선택
             entity_options = sorted(df_filtered['entity_id'].tolist())
             selected_entity = st.selectbox(
@@ -206,11 +227,7 @@ def main():
             
             if selected_entity:
                 # 선택된 엔티티 정보 찾기
-                entity_data = next(
-                    (state for state in st.session_state.current_states 
-                     if state['entity_id'] == selected_entity),
-                    None
-                )
+                entity_data = snapshot.by_id.get(selected_entity)
                 if entity_data:
                     # 주요 정보 표시
                     st.subheader("기본 정보")
@@ -222,11 +239,34 @@ def main():
                     with cols[2]:
                         st.metric("마지막 업데이트", entity_data['last_updated'].split('T')[1].split('.')[0])
                     with cols[3]:
-                        st.metric("데이터 크기", format_size(get_object_size(entity_data)))
+                        st.metric("데이터 크기", format_size(snapshot.sizes[selected_entity]))
                     
                     # 전체 데이터 표시
                     st.subheader("전체 데이터")
                     st.json(entity_data)
+        
+        # 관찰한 상태 변경으로 갱신되는 온라인 예측
+        st.header("다음 행동 예측")
+        predictor = get_online_predictor()
+        stats = predictor.stats()
+        if stats['events']:
+            recent = predictor.recent()
+            st.caption(
+                f"반영한 상태 변경 {stats['events']}개 · 행동 {stats['actions']}개 · "
+                f"모델 크기 {format_size(stats['nbytes'])}"
+            )
+            st.write("최근 행동: " + " → ".join(f"{entity_id}={state}" for entity_id, state in recent))
+            predictions = predictor.predict(recent)
+            if predictions:
+                st.dataframe(
+                    pd.DataFrame(
+                        [(entity_id, state, score) for (entity_id, state), score in predictions],
+                        columns=['entity_id', 'state', 'score']
+                    ),
+                    use_container_width=True
+                )
+        else:
+            st.info("아직 관찰한 상태 변경이 없습니다. 실시간 모드를 켜거나 새로고침하면 변경분이 반영됩니다.")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
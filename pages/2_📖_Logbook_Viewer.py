@@ -1,10 +1,13 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-import requests
 import os
 from dotenv import load_dotenv
-import pytz
+from ha_api_client import get_default_client
+from ha_logbook import fetch_logbook_range, LogbookCache
+from ha_db_reader import HomeAssistantDB
+from frame_dtypes import compact_frame
+from local_tz import LOCAL_TZ
 
 # .env 파일 로드
 load_dotenv()
@@ -16,16 +19,29 @@ st.set_page_config(
     layout="wide"
 )
 
-def get_ha_headers():
-    """Home Assistant API 헤더 생성"""
-    token = os.getenv('HA_TOKEN')
-    if not token:
+def get_ha_client():
+    """설정을 확인하고 공용 Home Assistant REST 클라이언트 반환"""
+    if not os.getenv('HA_URL'):
+        st.error("HA_URL이 .env 파일에 설정되지 않았습니다.")
+        st.stop()
+    if not os.getenv('HA_TOKEN'):
         st.error("HA_TOKEN이 .env 파일에 설정되지 않았습니다.")
         st.stop()
-    return {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-    }
+    return get_default_client()
+
+@st.cache_resource
+def get_logbook_cache():
+    """로그북 디스크 캐시를 생성하고 캐시"""
+    return LogbookCache()
+
+@st.cache_resource
+def get_db_connection():
+    """DB 연결을 생성하고 캐시"""
+    return HomeAssistantDB()
+
+def parse_entity_list(text):
+    """쉼표나 공백으로 구분된 엔티티 ID 문자열을 집합으로 변환"""
+    return set(e.strip() for e in text.replace(',', ' ').split() if e.strip())
 
 def get_time_range():
     """시간 범위 선택 옵션"""
@@ -70,49 +86,69 @@ def get_time_range():
     
     return start_dt, end_dt
 
-def fetch_logbook(start_time, end_time, entity_id=None, exclude_entities=None):
-    """Home Assistant Logbook API 호출"""
-    ha_url = os.getenv('HA_URL')
-    if not ha_url:
-        st.error("HA_URL이 .env 파일에 설정되지 않았습니다.")
-        st.stop()
+def fetch_logbook(start_time, end_time, entity_id=None, exclude_entities=None, use_cache=True):
+    """Home Assistant Logbook API 호출 (긴 구간은 하위 구간으로 나눠 병렬 조회)
 
-    # API 엔드포인트 구성
-    api_url = f"{ha_url}/api/logbook/{start_time.strftime('%Y-%m-%dT%H:%M:%S')}"
-    
-    # 쿼리 파라미터 구성
-    params = {
-        'end_time': end_time.strftime('%Y-%m-%dT%H:%M:%S')
-    }
-    
-    # 엔티티 필터 추가
-    if entity_id:
-        params['entity'] = entity_id
-
-    try:
-        response = requests.get(api_url, headers=get_ha_headers(), params=params, timeout=30)
-        response.raise_for_status()
-        data = response.json()
+    use_cache면 디스크 캐시에 없는 구간만 API로 가져온다.
+    """
+    client = get_ha_client()
+
+    def fetcher(window_start, window_end):
+        return fetch_logbook_range(client, window_start, window_end, entity_id)
+
+    if use_cache:
+        data, failed = get_logbook_cache().fetch(start_time, end_time, fetcher, entity_id)
+    else:
+        data, failed = fetcher(start_time, end_time)
+    if failed:
+        failed_ranges = ", ".join(
+            f"{window_start:%m-%d %H:%M}~{window_end:%m-%d %H:%M}" for window_start, window_end, _ in failed
+        )
+        if not data:
+            st.error(f"API 호출 실패: {failed[0][2]}")
+            return None
+        st.warning(f"일부 구간을 가져오지 못했습니다: {failed_ranges}")
+
+    if data:
+        # 필터링할 조건들을 리스트로 관리
+        filtered_data = data
         
-        if data:
-            # 필터링할 조건들을 리스트로 관리
-            filtered_data = data
-            
-            # 1. unavailable 상태 제외
-            filtered_data = [entry for entry in filtered_data if entry.get('state') != 'unavailable']
-            
-            # 2. 제외할 엔티티가 있는 경우 필터링
-            if exclude_entities:
-                # 쉼표나 공백으로 구분된 엔티티를 리스트로 변환
-                exclude_list = set(e.strip() for e in exclude_entities.replace(',', ' ').split() if e.strip())
-                # 제외할 엔티티를 필터링
-                filtered_data = [entry for entry in filtered_data if entry.get('entity_id') not in exclude_list]
-            
-            return filtered_data
-        return data
-    except requests.exceptions.RequestException as e:
-        st.error(f"API 호출 실패: {str(e)}")
+        # 1. unavailable 상태 제외
+        filtered_data = [entry for entry in filtered_data if entry.get('state') != 'unavailable']
+        
+        # 2. 제외할 엔티티가 있는 경우 필터링
+        if exclude_entities:
+            # 쉼표나 공백으로 구분된 엔티티를 리스트로 변환
+            exclude_list = parse_entity_list(exclude_entities)
+            # 제외할 엔티티를 필터링
+            filtered_data = [entry for entry in filtered_data if entry.get('entity_id') not in exclude_list]
+        
+        return filtered_data
+    return data
+
+def fetch_logbook_db(start_time, end_time, entity_id=None, exclude_entities=None):
+    """recorder DB에서 로그북 조회 (제외 조건은 SQL에서 적용)
+
+    REST API 응답과 같은 컬럼(when, name, entity_id, state, domain, message)으로 맞춘 뒤
+    작은 타입으로 바꾸고, 그 표시용 컬럼 기준의 메모리 보고를 attrs['memory']에 남긴다.
+    """
+    ha_db = get_db_connection()
+    df = ha_db.get_logbook(
+        start_time,
+        end_time,
+        entity_id or None,
+        exclude_states=['unavailable'],
+        exclude_entities=parse_entity_list(exclude_entities) if exclude_entities else None,
+    )
+    if df is None:
+        st.error("DB 로그북 조회에 실패했습니다.")
         return None
+    
+    df = df.rename(columns={'time_fired': 'when'})
+    df['state'] = df['entity_state'].where(df['event_type'] == 'state_changed')
+    df, memory = compact_frame(df[['when', 'name', 'entity_id', 'state', 'domain', 'message']])
+    df.attrs['memory'] = memory
+    return df
 
 def main():
     st.title("📖 Home Assistant Logbook Viewer")
@@ -120,6 +156,15 @@ def main():
     # 사이드바 설정
     with st.sidebar:
         st.header("조회 옵션")
+        # DB_URL이 있으면 recorder DB에서 직접 조회할 수 있다
+        source = "REST API"
+        if os.getenv('DB_URL'):
+            source = st.radio(
+                "데이터 소스",
+                ["REST API", "DB"],
+                horizontal=True,
+                help="DB는 unavailable 상태와 제외할 엔티티를 SQL에서 걸러서 표시할 행만 가져옵니다."
+            )
         start_time, end_time = get_time_range()
         
         st.subheader("엔티티 필터")
@@ -135,6 +180,17 @@ def main():
                 help="여러 엔티티를 제외하려면 쉼표나 공백으로 구분하여 입력하세요. (예: sensor.temp1, binary_sensor.motion)"
             )
         
+        use_cache = False
+        if source == "REST API":
+            st.subheader("캐시")
+            use_cache = st.checkbox(
+                "로컬 캐시 사용",
+                value=True,
+                help="이미 가져온 구간은 디스크 캐시에서 읽고, 새로 필요한 구간만 API로 요청합니다."
+            )
+            if st.button("로그북 캐시 비우기"):
+                get_logbook_cache().clear()
+        
         # 필터 상태 표시
         if entity_filter or exclude_filter:
             st.markdown("---")
@@ -145,17 +201,22 @@ def main():
                 st.warning(f"제외: {exclude_filter}")
     
     # 로그북 데이터 가져오기
-    logbook_data = fetch_logbook(start_time, end_time, entity_filter, exclude_filter)
+    if source == "DB":
+        logbook_data = fetch_logbook_db(start_time, end_time, entity_filter, exclude_filter)
+    else:
+        logbook_data = fetch_logbook(start_time, end_time, entity_filter, exclude_filter, use_cache)
     
-    if logbook_data:
-        # 데이터프레임 변환
-        df = pd.DataFrame(logbook_data)
+    if logbook_data is not None and len(logbook_data):
+        # 데이터프레임 변환 (DB 소스는 이미 DataFrame)
+        if isinstance(logbook_data, pd.DataFrame):
+            df = logbook_data.copy()
+        else:
+            df = pd.DataFrame(logbook_data)
         
         if not df.empty:
             # 시간대 정보 추가
-            local_tz = pytz.timezone('Asia/Seoul')
             if 'when' in df.columns:
-                df['when'] = pd.to_datetime(df['when']).dt.tz_convert(local_tz)
+                df['when'] = pd.to_datetime(df['when']).dt.tz_convert(LOCAL_TZ)
             
             # 필요한 컬럼만 선택하고 순서 재정렬
             available_columns = []
@@ -189,6 +250,16 @@ def main():
             
             # 데이터 표시
             st.write(f"총 {len(df)} 개의 로그 항목이 조회되었습니다.")
+            memory = logbook_data.attrs.get('memory') if isinstance(logbook_data, pd.DataFrame) else None
+            if memory:
+                st.caption(
+                    f"메모리 {memory['before'] / 1024 / 1024:.1f} MB → {memory['after'] / 1024 / 1024:.1f} MB "
+                    f"({1 - memory['after'] / max(memory['before'], 1):.0%} 절감)"
+                )
+            if source == "REST API":
+                summary = get_default_client().metrics_summary()
+                if summary:
+                    st.caption(summary)
             
             # 데이터프레임 표시 설정
             st.dataframe(
@@ -209,7 +280,10 @@ def main():
             
             # API 응답 원본 데이터 보기 옵션
             if st.checkbox("API 응답 원본 데이터 보기"):
-                st.json(logbook_data)
+                if isinstance(logbook_data, pd.DataFrame):
+                    st.dataframe(logbook_data, use_container_width=True)
+                else:
+                    st.json(logbook_data)
         else:
             st.info("해당 기간에 로그 데이터가 없습니다.")
     else:
@@ -0,0 +1,204 @@
+import os
+import time
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from dotenv import load_dotenv
+from next_action_predictor import (
+    ActionVocab, NgramPredictor, actions_from_logbook, backoff_scores,
+)
+
+# .env 파일에서 환경 변수 로드
+load_dotenv()
+
+
+def domain_of(entity_id):
+    """엔티티 ID의 도메인 (페이지들의 도메인 그룹과 동일)"""
+    return entity_id.split('.')[0]
+
+
+class SharedArrays:
+    """NumPy 배열들을 공유 메모리 블록에 올리고 이름으로 다른 프로세스에서 붙이는 도우미
+
+    작업 프로세스는 pickle된 복사본 대신 같은 물리 페이지를 읽는다.
+    """
+
+    def __init__(self, arrays):
+        self._blocks = []
+        self.specs = {}
+        for key, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            self._blocks.append(block)
+            self.specs[key] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# 작업 프로세스에서 붙인 공유 배열 (프로세스마다 한 번)
+_attached = {}
+
+
+def _attach(specs):
+    for key, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        _attached[key] = (block, np.ndarray(shape, np.dtype(dtype), buffer=block.buf))
+
+
+def _fit_partition(partition, order, backoff, vocab_size):
+    """공유 메모리의 전체 시퀀스로 문맥을 만들고 partition에 속한 다음 행동만 집계"""
+    ids = _attached['ids'][1]
+    starts = _attached['starts'][1]
+    partitions = _attached['partitions'][1]
+    start = time.perf_counter()
+    model = NgramPredictor(order=order, backoff=backoff).fit(
+        ids, starts, targets=partitions[ids] == partition, vocab_size=vocab_size
+    )
+    return partition, model, time.perf_counter() - start
+
+
+class EnsemblePredictor:
+    """다음 행동 기준으로 나눠 학습한 모델들을 합친 예측기
+
+    분할마다 다음 행동이 겹치지 않으므로 문맥별 전체 횟수는 분할별 횟수의 합이고,
+    후속 행동 후보는 분할별 후보를 이어 붙인 것이다. 그래서 결과는 전체를 한 번에
+    학습한 NgramPredictor와 같다.
+    """
+
+    def __init__(self, models, vocab, partition_names=None):
+        self.models = models
+        self.vocab = vocab
+        self.partition_names = partition_names or list(range(len(models)))
+        self.order = max((model.order for model in models), default=0)
+        self.backoff = models[0].backoff if models else 0.4
+        self.V = len(vocab)
+        self.unigram = sum(model.unigram for model in models) if models else np.zeros(0)
+
+    def predict_ids(self, history, k=5):
+        """최근 행동 id 목록 다음에 올 행동 상위 k개 (점수 내림차순)"""
+        by_order = {}
+        for model in self.models:
+            for order, idx in model._contexts(history):
+                action_ids, counts = model.successors(order, idx)
+                level = by_order.setdefault(order, ([], [], [0]))
+                level[0].append(action_ids)
+                level[1].append(counts)
+                level[2][0] += int(model.ctx_totals[order][idx])
+
+        levels = [
+            (order, np.concatenate(ids), np.concatenate(counts), total[0])
+            for order, (ids, counts, total) in sorted(by_order.items(), reverse=True)
+        ]
+        return backoff_scores(levels, self.unigram, self.backoff, k)
+
+    def predict(self, history, k=5):
+        """최근 행동 (entity_id, state) 목록 다음에 올 행동 상위 k개"""
+        history_ids = [self.vocab.ids.get(tuple(action), -1) for action in history[-self.order:]]
+        action_ids, scores = self.predict_ids(history_ids, k)
+        return [
+            (self.vocab.decode(action_id), float(score))
+            for action_id, score in zip(action_ids, scores)
+        ]
+
+    def stats(self):
+        """분할별 전이 수와 전체 메모리 사용량"""
+        return {
+            'vocab': self.V,
+            'partitions': {
+                name: sum(len(keys) for keys in model.trans_keys.values())
+                for name, model in zip(self.partition_names, self.models)
+            },
+            'nbytes': sum(model.nbytes() for model in self.models),
+        }
+
+
+def train_partitioned(actions, order=3, backoff=0.4, partition_of=domain_of,
+                      max_workers=None, max_gap=timedelta(minutes=30)):
+    """행동 시퀀스를 다음 행동의 분할(기본값: 도메인)별로 나눠 프로세스 풀에서 학습
+
+    Args:
+        actions (DataFrame): 시간순 행동 (ts, entity_id, state)
+        partition_of (callable or dict): entity_id -> 분할 이름 (영역별로 나누려면
+            엔티티-영역 대응 dict를 넘긴다, 없는 엔티티는 도메인으로)
+        max_workers (int): 프로세스 수 (기본값: CPU 수)
+
+    Returns:
+        tuple: (EnsemblePredictor, 분할별 학습 시간 dict)
+    """
+    if isinstance(partition_of, dict):
+        mapping = partition_of
+        partition_of = lambda entity_id: mapping.get(entity_id, domain_of(entity_id))
+
+    vocab = ActionVocab()
+    ids = vocab.encode(actions['entity_id'], actions['state'])
+    gaps = np.diff(actions['ts'].to_numpy(), prepend=-np.inf)
+    starts = gaps > max_gap.total_seconds()
+
+    # 행동 id -> 분할 번호
+    names = {}
+    action_partitions = np.array(
+        [names.setdefault(partition_of(entity_id), len(names)) for entity_id, _ in vocab.actions],
+        dtype=np.int32
+    )
+    # 큰 분할부터 시작해야 마지막에 한 프로세스만 오래 도는 일이 줄어든다
+    sizes = np.bincount(action_partitions[ids], minlength=len(names))
+    schedule = [int(p) for p in np.argsort(-sizes) if sizes[p]]
+
+    models, timings = {}, {}
+    with SharedArrays({'ids': ids, 'starts': starts, 'partitions': action_partitions}) as shared, \
+            ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                                initializer=_attach, initargs=(shared.specs,)) as executor:
+        futures = [
+            executor.submit(_fit_partition, partition, order, backoff, len(vocab))
+            for partition in schedule
+        ]
+        for future in futures:
+            partition, model, seconds = future.result()
+            models[partition] = model
+            timings[partition] = seconds
+
+    partition_names = {number: name for name, number in names.items()}
+    ensemble = EnsemblePredictor(
+        [models[p] for p in schedule], vocab, [partition_names[p] for p in schedule]
+    )
+    return ensemble, {partition_names[p]: timings[p] for p in schedule}
+
+
+def main():
+    from ha_db_reader import HomeAssistantDB
+
+    parser = argparse.ArgumentParser(description="도메인별 다중 프로세스 다음 행동 모델 학습")
+    parser.add_argument('--days', type=int, default=30, help="학습에 사용할 최근 일수")
+    parser.add_argument('--order', type=int, default=3, help="최대 문맥 길이")
+    parser.add_argument('--workers', type=int, help="프로세스 수 (기본값: CPU 수)")
+    args = parser.parse_args()
+
+    end_time = datetime.now()
+    logbook = HomeAssistantDB().get_logbook(end_time - timedelta(days=args.days), end_time)
+    if logbook is None:
+        return
+
+    start = time.perf_counter()
+    ensemble, timings = train_partitioned(
+        actions_from_logbook(logbook), order=args.order, max_workers=args.workers
+    )
+    print(f"학습 완료 ({time.perf_counter() - start:.2f}초): {ensemble.stats()}")
+    for name, seconds in timings.items():
+        print(f"  {name}: {seconds:.2f}초")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import json
+import time
+import argparse
+import threading
+import http.client
+from urllib.parse import urlparse
+import numpy as np
+import pandas as pd
+
+
+def synthetic_predictor(entities=500, events=200000, order=3, seed=0):
+    """HA 없이 서비스를 띄우기 위한 합성 이력 학습 모델 (루틴 몇 개 + 잡음)"""
+    from next_action_predictor import NgramPredictor
+
+    rng = np.random.default_rng(seed)
+    names = np.array([f"light.room_{i}" for i in range(entities)])
+    routines = rng.integers(0, entities, size=(50, 4))
+    picks = []
+    while len(picks) < events:
+        if rng.random() < 0.7:
+            picks.extend(routines[rng.integers(0, len(routines))])
+        else:
+            picks.append(rng.integers(0, entities))
+    picks = np.array(picks[:events])
+    actions = pd.DataFrame({
+        'ts': np.arange(events) * 30.0,
+        'entity_id': names[picks],
+        'state': np.where(rng.random(events) < 0.5, 'on', 'off'),
+    })
+    return NgramPredictor(order=order).fit_actions(actions), actions
+
+
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+
+def run_load(url, bodies, concurrency):
+    """concurrency개의 keep-alive 연결로 bodies를 나눠 보내고 요청별 왕복 시간 목록 반환"""
+    target = urlparse(url)
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker(chunk):
+        conn = http.client.HTTPConnection(target.hostname, target.port, timeout=10)
+        local = []
+        for body in chunk:
+            data = json.dumps(body)
+            start = time.perf_counter()
+            try:
+                conn.request('POST', '/predict', data, {'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors.append(response.status)
+            except (OSError, http.client.HTTPException) as e:
+                errors.append(str(e))
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port, timeout=10)
+                continue
+            local.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [
+        threading.Thread(target=worker, args=(bodies[i::concurrency],)) for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors, time.perf_counter() - start
+
+
+def fetch_metrics(url):
+    target = urlparse(url)
+    conn = http.client.HTTPConnection(target.hostname, target.port, timeout=10)
+    conn.request('GET', '/metrics')
+    return json.loads(conn.getresponse().read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="예측 서비스 부하 테스트")
+    parser.add_argument('--url', default='http://127.0.0.1:8765', help="예측 서비스 주소")
+    parser.add_argument('--stand-in', action='store_true',
+                        help="합성 모델로 서비스를 이 프로세스 안에 띄워서 테스트")
+    parser.add_argument('--requests', type=int, default=5000, help="보낼 요청 수")
+    parser.add_argument('--concurrency', type=int, default=8, help="동시 연결 수")
+    parser.add_argument('--batch', type=int, default=1, help="요청 하나에 담을 문맥 수")
+    parser.add_argument('--k', type=int, default=5, help="예측 개수")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    if args.stand_in:
+        from prediction_service import make_server
+
+        predictor, actions = synthetic_predictor()
+        server = make_server(predictor, '127.0.0.1', 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        args.url = f"http://127.0.0.1:{server.server_address[1]}"
+        print(f"stand-in 서비스: {args.url} ({predictor.stats()['vocab']}개 행동)")
+        pairs = list(zip(actions['entity_id'], actions['state']))
+    else:
+        pairs = [(f"light.room_{i}", 'on') for i in range(100)]
+
+    def context():
+        start = rng.integers(0, len(pairs) - 3)
+        return [list(action) for action in pairs[start:start + 3]]
+
+    if args.batch > 1:
+        bodies = [
+            {'batch': [{'history': context()} for _ in range(args.batch)], 'k': args.k}
+            for _ in range(args.requests)
+        ]
+    else:
+        bodies = [{'history': context(), 'k': args.k} for _ in range(args.requests)]
+
+    latencies, errors, elapsed = run_load(args.url, bodies, args.concurrency)
+    if latencies:
+        print(
+            f"요청 {len(latencies)}개 ({args.batch}개 문맥씩) · {len(latencies) / elapsed:.0f} req/s · "
+            f"p50 {percentile(latencies, 0.50):.2f} ms · p99 {percentile(latencies, 0.99):.2f} ms · "
+            f"max {latencies[-1] * 1000:.2f} ms"
+        )
+    if errors:
+        print(f"오류 {len(errors)}개: {errors[:5]}")
+    print(f"서버 측 지표: {fetch_metrics(args.url)}")
+
+
+if __name__ == "__main__":
+    main()
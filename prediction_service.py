@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+from next_action_predictor import NgramPredictor
+from model_store import load_model, save_model
+
+# .env 파일에서 환경 변수 로드
+load_dotenv()
+
+# 한 요청에 담을 수 있는 최대 문맥 수
+MAX_BATCH = 1000
+
+
+class PredictionService:
+    """상주 모델로 다음 행동을 예측하고 처리 시간을 기록"""
+
+    def __init__(self, predictor, default_k=5, history=10000):
+        self.predictor = predictor
+        self.default_k = default_k
+        self._latencies = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.contexts = 0
+        self.errors = 0
+        self.started_at = time.time()
+
+    def predict(self, history, k=None):
+        """문맥 하나의 예측 결과 목록"""
+        actions = [self._parse_action(action) for action in history]
+        return [
+            {'entity_id': entity_id, 'state': state, 'score': round(score, 6)}
+            for (entity_id, state), score in self.predictor.predict(actions, k or self.default_k)
+        ]
+
+    @staticmethod
+    def _parse_action(action):
+        """["light.a", "on"], {"entity_id": ..., "state": ...}, "light.a=on" 형식을 튜플로"""
+        if isinstance(action, dict):
+            return action['entity_id'], action['state']
+        if isinstance(action, str):
+            entity_id, _, state = action.partition('=')
+            return entity_id, state
+        entity_id, state = action
+        return entity_id, state
+
+    def handle(self, body):
+        """요청 본문(dict) 처리
+
+        단일: {"history": [...], "k": 5} -> {"predictions": [...]}
+        일괄: {"batch": [{"history": [...], "k": 5}, ...]} -> {"results": [[...], ...]}
+        """
+        if 'batch' in body:
+            batch = body['batch']
+            if len(batch) > MAX_BATCH:
+                raise ValueError(f"batch는 최대 {MAX_BATCH}개까지 가능합니다")
+            k = body.get('k')
+            return {'results': [self.predict(item['history'], item.get('k', k)) for item in batch]}
+        return {'predictions': self.predict(body['history'], body.get('k'))}
+
+    def record(self, seconds, contexts=0, ok=True):
+        with self._lock:
+            self._latencies.append(seconds)
+            self.requests += 1
+            self.contexts += contexts
+            if not ok:
+                self.errors += 1
+
+    def metrics(self):
+        """최근 요청 처리 시간 통계 (밀리초)"""
+        with self._lock:
+            samples = sorted(self._latencies)
+        metrics = {
+            'requests': self.requests,
+            'contexts': self.contexts,
+            'errors': self.errors,
+            'uptime_s': round(time.time() - self.started_at, 1),
+        }
+        if samples:
+            def percentile(p):
+                return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+            metrics.update({
+                'p50_ms': round(percentile(0.50), 3),
+                'p99_ms': round(percentile(0.99), 3),
+                'max_ms': round(samples[-1] * 1000, 3),
+            })
+        return metrics
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """POST /predict, GET /metrics, GET /health"""
+
+    # keep-alive로 연결을 재사용해 요청마다 TCP 연결 비용을 내지 않는다
+    protocol_version = 'HTTP/1.1'
+    # 헤더와 본문을 따로 보낼 때 Nagle + delayed ACK로 수십 ms씩 지연되지 않도록
+    disable_nagle_algorithm = True
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok', **service.predictor.stats()})
+        elif self.path == '/metrics':
+            self._send_json(200, service.metrics())
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        service = self.server.service
+        if self.path != '/predict':
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        start = time.perf_counter()
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            payload = service.handle(body)
+        except (ValueError, KeyError, TypeError) as e:
+            service.record(time.perf_counter() - start, ok=False)
+            self._send_json(400, {'error': f"잘못된 요청: {str(e)}"})
+            return
+        service.record(time.perf_counter() - start, len(payload.get('results', [None])))
+        self._send_json(200, payload)
+
+    def log_message(self, format, *args):
+        # 요청마다 stderr에 쓰면 지연 시간이 늘어나므로 기록하지 않는다
+        pass
+
+
+def make_server(predictor, host='127.0.0.1', port=8765):
+    """예측 서비스를 띄울 HTTP 서버 생성 (serve_forever는 호출자가 실행)"""
+    server = ThreadingHTTPServer((host, port), PredictionHandler)
+    server.daemon_threads = True
+    server.service = PredictionService(predictor)
+    return server
+
+
+def build_predictor_from_ha(days=14, order=3):
+    """HA_URL/HA_TOKEN의 /api/logbook으로 최근 기록을 받아 예측기 학습"""
+    from ha_api_client import HAClient
+    from ha_logbook import fetch_logbook_range, LogbookCache
+
+    client = HAClient()
+    if not client.base_url or not client.token:
+        raise RuntimeError("HA_URL과 HA_TOKEN 환경변수가 필요합니다")
+
+    end_time = datetime.now()
+    entries, failed = LogbookCache().fetch(
+        end_time - timedelta(days=days), end_time,
+        lambda start, end: fetch_logbook_range(client, start, end)
+    )
+    if failed:
+        print(f"로그북 일부 구간 조회 실패: {len(failed)}개 구간")
+    return NgramPredictor(order=order).fit_logbook(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="로컬 다음 행동 예측 HTTP 서비스")
+    parser.add_argument('--host', default=os.getenv('PREDICT_HOST', '127.0.0.1'), help="바인드 주소")
+    parser.add_argument('--port', type=int, default=int(os.getenv('PREDICT_PORT', '8765')), help="포트")
+    parser.add_argument('--days', type=int, default=14, help="학습에 사용할 최근 일수")
+    parser.add_argument('--order', type=int, default=3, help="최대 문맥 길이")
+    parser.add_argument('--model', help="저장된 모델 디렉터리 (지정하면 학습 없이 mmap으로 연다)")
+    parser.add_argument('--save', help="학습한 모델을 저장할 디렉터리")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.model:
+        predictor = load_model(args.model)
+    else:
+        predictor = build_predictor_from_ha(args.days, args.order)
+        if args.save:
+            save_model(predictor, args.save)
+    print(f"모델 준비 완료 ({time.perf_counter() - start:.3f}초): {predictor.stats()}")
+
+    server = make_server(predictor, args.host, args.port)
+    print(f"예측 서비스 시작: http://{args.host}:{args.port}/predict")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# 시간 구간으로 취급해 버킷 단위로 맞추는 쿼리 파라미터 (시작은 내림, 종료는 올림)
+START_PARAMS = ('start_ts',)
+END_PARAMS = ('end_ts',)
+
+
+class QueryCache:
+    """쿼리 결과(DataFrame) 캐시
+
+    키는 공백을 정규화한 쿼리 문자열과 파라미터로 만든다. 시간 범위 파라미터는
+    버킷 단위로 맞춰서 '최근 24시간'처럼 매번 조금씩 달라지는 구간도 같은 키가 된다.
+    전체 크기(바이트) 한도를 넘으면 가장 오래 사용하지 않은 항목부터 제거하고,
+    항목마다 TTL이 지나면 만료된다.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl=60, bucket_seconds=60):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bucket_seconds = bucket_seconds
+        self._entries = OrderedDict()  # key -> (DataFrame, 크기, 만료 시각)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def snap_params(self, params):
+        """시간 범위 파라미터를 버킷 경계로 맞춘 새 dict 반환"""
+        if not params or not self.bucket_seconds:
+            return dict(params or {})
+        bucket = self.bucket_seconds
+        snapped = dict(params)
+        for name in START_PARAMS:
+            if snapped.get(name) is not None:
+                snapped[name] = math.floor(snapped[name] / bucket) * bucket
+        for name in END_PARAMS:
+            if snapped.get(name) is not None:
+                snapped[name] = math.ceil(snapped[name] / bucket) * bucket
+        return snapped
+
+    def make_key(self, query, params):
+        """정규화한 쿼리와 파라미터로 캐시 키 생성"""
+        normalized = ' '.join(str(query).split())
+        items = tuple(sorted(
+            (name, tuple(value) if isinstance(value, (list, set)) else value)
+            for name, value in (params or {}).items()
+        ))
+        return normalized, items
+
+    def get(self, key):
+        """캐시된 DataFrame 반환 (없거나 만료되면 None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            df, size, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return df
+
+    def put(self, key, df, ttl=None):
+        """결과 저장 후 크기 한도를 넘으면 LRU 순서로 제거"""
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (df, size, expires_at)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        """모든 항목 제거 (통계는 유지)"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """적중/실패 횟수와 현재 사용량"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
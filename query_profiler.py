@@ -0,0 +1,148 @@
+import re
+import time
+import threading
+from collections import deque
+from datetime import datetime
+from sqlalchemy import event
+
+# 계측 기록에 남길 쿼리 문자열 최대 길이
+MAX_STATEMENT_CHARS = 4000
+
+# 실행 계획에서 순차 스캔을 찾는 패턴 (PostgreSQL: Seq Scan on states s, SQLite: SCAN s)
+SEQ_SCAN_PATTERNS = (
+    re.compile(r'Seq Scan on (\w+)'),
+    # 인덱스 없이 훑는 줄만 (SCAN s USING INDEX ...는 인덱스 순서로 읽는 것이라 제외)
+    re.compile(r'^\s*SCAN (?:TABLE )?(\w+)(?: AS \w+)?\s*$', re.MULTILINE),
+)
+
+# 쿼리의 테이블 별칭 (FROM states s, JOIN states_meta AS sm)
+TABLE_ALIAS_PATTERN = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+
+
+class QueryProfiler:
+    """SQLAlchemy 엔진 이벤트로 문장마다 실행 시간과 결과 크기를 기록하는 계측기
+
+    before/after_cursor_execute 리스너가 DB 실행 시간을 재고, HomeAssistantDB.read_sql이
+    fetch 시간, DataFrame 생성 시간, 행 수, 대략적인 바이트 수를 같은 기록에 채운다.
+    explain을 켜면 조회가 끝난 뒤 같은 연결에서 실행 계획을 받아 둔다. PostgreSQL은
+    EXPLAIN (ANALYZE, BUFFERS)라 쿼리를 한 번 더 실행하므로 문제를 찾을 때만 켠다.
+    asyncio 엔진은 engine.sync_engine에 붙이고, complete는 conn.run_sync 안에서 부른다.
+    최근 history개 기록만 보관한다.
+    """
+
+    def __init__(self, history=200, explain=False):
+        self.records = deque(maxlen=history)
+        self.explain = explain
+        self._lock = threading.Lock()
+
+    def attach(self, engine):
+        """엔진에 실행 리스너 등록"""
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+        return self
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['profile_started'].pop()
+        # 실행 계획을 받는 문장 자체는 기록하지 않는다 (asyncio 엔진은 한 스레드에서 여러
+        # 연결이 번갈아 실행되므로 표시는 스레드가 아니라 연결에 둔다)
+        if conn.info.get('profile_explaining'):
+            return
+        record = {
+            'at': datetime.now(),
+            'statement': statement[:MAX_STATEMENT_CHARS],
+            'parameters': parameters,
+            'dialect': conn.dialect.name,
+            'execute_ms': (time.perf_counter() - started) * 1000,
+            'fetch_ms': None,
+            'build_ms': None,
+            'total_ms': None,
+            'rows': None,
+            'bytes': None,
+            'plan': None,
+            'seq_scans': None,
+        }
+        conn.info['profile_last'] = record
+        with self._lock:
+            self.records.append(record)
+
+    def _handle_error(self, context):
+        # 실행이 실패하면 after_cursor_execute가 불리지 않으므로 시작 시각을 여기서 꺼낸다
+        # (풀에 돌아간 연결의 info에 쌓이지 않도록)
+        conn = context.connection
+        if conn is not None and conn.info.get('profile_started'):
+            conn.info['profile_started'].pop()
+
+    def complete(self, conn, df, fetch_seconds=None, build_seconds=None, total_seconds=None):
+        """마지막으로 실행한 문장의 기록에 fetch/DataFrame 생성 시간과 결과 크기를 채운다"""
+        record = conn.info.pop('profile_last', None)
+        if record is None:
+            return None
+        if fetch_seconds is not None:
+            record['fetch_ms'] = fetch_seconds * 1000
+        if build_seconds is not None:
+            record['build_ms'] = build_seconds * 1000
+        if total_seconds is not None:
+            record['total_ms'] = total_seconds * 1000
+        if df is not None:
+            record['rows'] = len(df)
+            # 문자열 컬럼은 버퍼 크기가 잡히고 객체 컬럼은 포인터만 세므로 대략적인 값이다
+            record['bytes'] = int(df.memory_usage(deep=False).sum())
+        if self.explain:
+            self._capture_plan(conn, record)
+        return record
+
+    def _capture_plan(self, conn, record):
+        """같은 연결에서 기록된 문장의 실행 계획을 받아 기록에 붙인다"""
+        if not record['statement'].lstrip().upper().startswith(('SELECT', 'WITH')):
+            return
+        dialect = record['dialect']
+        if dialect == 'postgresql':
+            prefix = 'EXPLAIN (ANALYZE, BUFFERS) '
+        elif dialect == 'sqlite':
+            prefix = 'EXPLAIN QUERY PLAN '
+        else:
+            prefix = 'EXPLAIN '
+
+        conn.info['profile_explaining'] = True
+        try:
+            rows = conn.exec_driver_sql(prefix + record['statement'], record['parameters']).fetchall()
+        except Exception as e:
+            record['plan'] = f"실행 계획 조회 실패: {str(e)}"
+            return
+        finally:
+            conn.info['profile_explaining'] = False
+
+        if dialect == 'sqlite':
+            # (id, parent, notused, detail) -> 부모 단계만큼 들여쓴 트리
+            depth = {0: -1}
+            lines = []
+            for node_id, parent, _, detail in rows:
+                depth[node_id] = depth.get(parent, -1) + 1
+                lines.append('  ' * depth[node_id] + detail)
+        else:
+            lines = [str(row[0]) for row in rows]
+        record['plan'] = '\n'.join(lines)
+        # SQLite 계획은 별칭으로 나오므로 쿼리의 FROM/JOIN에서 실제 테이블 이름을 찾는다
+        aliases = {}
+        for table, alias in TABLE_ALIAS_PATTERN.findall(record['statement']):
+            aliases[table] = table
+            if alias and alias.upper() not in ('ON', 'WHERE', 'JOIN', 'LEFT', 'INNER', 'ORDER', 'GROUP', 'LIMIT'):
+                aliases[alias] = table
+        record['seq_scans'] = sorted({
+            aliases.get(name, name)
+            for pattern in SEQ_SCAN_PATTERNS for name in pattern.findall(record['plan'])
+        })
+
+    def history(self):
+        """보관 중인 기록 목록 (최신순)"""
+        with self._lock:
+            return list(reversed(self.records))
+
+    def clear(self):
+        """기록 모두 제거"""
+        with self._lock:
+            self.records.clear()
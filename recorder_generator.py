@@ -0,0 +1,347 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+# 도메인별 엔티티 비율과 상대 활동량 (센서가 가장 자주 바뀐다)
+DOMAINS = {
+    'sensor': (0.40, 4.0),
+    'binary_sensor': (0.15, 2.0),
+    'light': (0.15, 1.0),
+    'switch': (0.10, 1.0),
+    'media_player': (0.05, 0.5),
+    'climate': (0.05, 0.5),
+    'cover': (0.05, 0.3),
+    'automation': (0.05, 0.1),
+}
+
+# 자동화가 상태를 바꾸는 도메인
+AUTOMATED_DOMAINS = ('light', 'switch', 'cover')
+
+ROOMS = ['living_room', 'kitchen', 'bedroom', 'bathroom', 'office', 'hallway', 'garage', 'garden']
+
+# 현재 HA recorder 스키마 (사용하지 않는 레거시 컬럼 포함)와 레거시 logbook 테이블
+SCHEMA = """
+CREATE TABLE states_meta (
+    metadata_id INTEGER PRIMARY KEY,
+    entity_id VARCHAR(255)
+);
+CREATE TABLE state_attributes (
+    attributes_id INTEGER PRIMARY KEY,
+    hash BIGINT,
+    shared_attrs TEXT
+);
+CREATE TABLE states (
+    state_id INTEGER PRIMARY KEY,
+    entity_id CHAR(0),
+    state VARCHAR(255),
+    attributes CHAR(0),
+    event_id SMALLINT,
+    last_changed CHAR(0),
+    last_changed_ts FLOAT,
+    last_reported_ts FLOAT,
+    last_updated CHAR(0),
+    last_updated_ts FLOAT,
+    old_state_id INTEGER,
+    attributes_id INTEGER,
+    context_id CHAR(0),
+    context_user_id CHAR(0),
+    context_parent_id CHAR(0),
+    origin_idx SMALLINT,
+    context_id_bin BLOB,
+    context_user_id_bin BLOB,
+    context_parent_id_bin BLOB,
+    metadata_id INTEGER
+);
+CREATE TABLE event_types (
+    event_type_id INTEGER PRIMARY KEY,
+    event_type VARCHAR(64)
+);
+CREATE TABLE event_data (
+    data_id INTEGER PRIMARY KEY,
+    hash BIGINT,
+    shared_data TEXT
+);
+CREATE TABLE events (
+    event_id INTEGER PRIMARY KEY,
+    event_type CHAR(0),
+    event_data CHAR(0),
+    origin CHAR(0),
+    origin_idx SMALLINT,
+    time_fired CHAR(0),
+    time_fired_ts FLOAT,
+    context_id CHAR(0),
+    context_user_id CHAR(0),
+    context_parent_id CHAR(0),
+    data_id INTEGER,
+    context_id_bin BLOB,
+    context_user_id_bin BLOB,
+    context_parent_id_bin BLOB,
+    event_type_id INTEGER
+);
+CREATE TABLE logbook (
+    logbook_id INTEGER PRIMARY KEY,
+    time_fired_ts FLOAT,
+    name VARCHAR(255),
+    message VARCHAR(255),
+    domain VARCHAR(64),
+    entity_id VARCHAR(255),
+    context_id_bin BLOB
+);
+"""
+
+# 데이터를 모두 넣은 뒤 만드는 인덱스 (HA recorder와 같은 이름/구성)
+INDEXES = """
+CREATE UNIQUE INDEX ix_states_meta_entity_id ON states_meta (entity_id);
+CREATE INDEX ix_state_attributes_hash ON state_attributes (hash);
+CREATE INDEX ix_states_metadata_id_last_updated_ts ON states (metadata_id, last_updated_ts);
+CREATE INDEX ix_states_last_updated_ts ON states (last_updated_ts);
+CREATE INDEX ix_states_attributes_id ON states (attributes_id);
+CREATE INDEX ix_states_old_state_id ON states (old_state_id);
+CREATE INDEX ix_states_context_id_bin ON states (context_id_bin);
+CREATE UNIQUE INDEX ix_event_types_event_type ON event_types (event_type);
+CREATE INDEX ix_event_data_hash ON event_data (hash);
+CREATE INDEX ix_events_time_fired_ts ON events (time_fired_ts);
+CREATE INDEX ix_events_event_type_id_time_fired_ts ON events (event_type_id, time_fired_ts);
+CREATE INDEX ix_events_data_id ON events (data_id);
+CREATE INDEX ix_events_context_id_bin ON events (context_id_bin);
+CREATE INDEX ix_logbook_time_fired_ts ON logbook (time_fired_ts);
+"""
+
+EVENT_TYPES = [
+    'automation_triggered', 'script_started', 'call_service', 'logbook_entry',
+    'homeassistant_start', 'homeassistant_stop', 'component_loaded',
+]
+
+
+def _entities(count, rng):
+    """도메인 비율에 맞춰 엔티티 목록과 엔티티별 활동 가중치(Zipf) 생성"""
+    domains, weights = [], []
+    for domain, (share, activity) in DOMAINS.items():
+        n = max(1, int(round(count * share)))
+        domains += [domain] * n
+        weights += [activity] * n
+    domains = np.array(domains)
+    # 같은 도메인 안에서도 소수 엔티티가 대부분의 변경을 만든다
+    rank = rng.permutation(len(domains)) + 1
+    weights = np.array(weights) / rank ** 1.1
+    counters = {}
+    entity_ids = []
+    for domain in domains:
+        counters[domain] = counters.get(domain, 0) + 1
+        room = ROOMS[counters[domain] % len(ROOMS)]
+        entity_ids.append(f"{domain}.{room}_{counters[domain]}")
+    return np.array(entity_ids), domains, weights / weights.sum()
+
+
+def _attributes(entity_id, domain, variant):
+    name = entity_id.split('.', 1)[1].replace('_', ' ').title()
+    attrs = {'friendly_name': name}
+    if domain == 'sensor':
+        attrs.update({'unit_of_measurement': '°C', 'device_class': 'temperature',
+                      'state_class': 'measurement'})
+    elif domain == 'light':
+        attrs.update({'supported_color_modes': ['brightness'], 'brightness': 50 * variant or None})
+    elif domain == 'binary_sensor':
+        attrs['device_class'] = 'motion'
+    elif domain == 'climate':
+        attrs.update({'hvac_modes': ['off', 'heat', 'cool'], 'temperature': 20 + variant})
+    elif domain == 'automation':
+        # hash()는 프로세스마다 솔트가 달라 같은 시드로도 값이 바뀌므로 crc32를 쓴다
+        attrs.update({'id': str(zlib.crc32(entity_id.encode('utf-8'))), 'mode': 'single'})
+    return attrs
+
+
+def _states_for(domains, rng):
+    """행별 도메인에 맞는 상태 문자열"""
+    n = len(domains)
+    states = np.where(rng.random(n) < 0.5, 'on', 'off').astype(object)
+    sensor = domains == 'sensor'
+    states[sensor] = np.char.mod('%.1f', np.round(21 + 3 * rng.standard_normal(sensor.sum()), 1))
+    media = domains == 'media_player'
+    states[media] = rng.choice(['playing', 'paused', 'idle', 'off'], media.sum())
+    climate = domains == 'climate'
+    states[climate] = rng.choice(['heat', 'cool', 'off'], climate.sum())
+    cover = domains == 'cover'
+    states[cover] = rng.choice(['open', 'closed'], cover.sum())
+    # 가끔 기기가 끊긴다
+    states[rng.random(n) < 0.005] = 'unavailable'
+    return states
+
+
+def _contexts(n, rng):
+    """16바이트 임의 context id 목록"""
+    raw = rng.bytes(16 * n)
+    return [raw[i:i + 16] for i in range(0, 16 * n, 16)]
+
+
+def generate(path, rows=100000, entities=None, days=30, batch_size=200000, seed=0, end=None):
+    """합성 recorder SQLite DB 생성
+
+    Args:
+        path (str): 만들 SQLite 파일 경로 (있으면 덮어쓴다)
+        rows (int): states 행 수
+        entities (int): 엔티티 수 (기본값: 행 수에 맞춰 20~5000)
+        days (int): 데이터가 퍼져 있는 기간 (현재 시각까지)
+        batch_size (int): 한 번에 만들어 넣는 행 수
+        seed (int): 난수 시드
+        end (datetime): 데이터의 마지막 시각 (기본값: 현재, 같은 시드와 함께 주면 같은 DB가 나온다)
+
+    Returns:
+        dict: 테이블별 행 수
+    """
+    rng = np.random.default_rng(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript("PRAGMA journal_mode=OFF; PRAGMA synchronous=OFF;" + SCHEMA)
+
+    entity_count = entities or int(min(5000, max(20, np.sqrt(rows) / 2)))
+    entity_ids, domains, weights = _entities(entity_count, rng)
+    conn.executemany(
+        "INSERT INTO states_meta (metadata_id, entity_id) VALUES (?, ?)",
+        [(i + 1, entity_id) for i, entity_id in enumerate(entity_ids)]
+    )
+
+    # 엔티티마다 속성 묶음 1~3개를 공유한다
+    variants = rng.integers(1, 4, len(entity_ids))
+    attributes_base = np.concatenate([[0], np.cumsum(variants)[:-1]]) + 1
+    attribute_rows = []
+    for i, (entity_id, domain) in enumerate(zip(entity_ids, domains)):
+        for variant in range(variants[i]):
+            shared = json.dumps(_attributes(entity_id, domain, variant), separators=(',', ':'))
+            attribute_rows.append(
+                (int(attributes_base[i]) + variant, zlib.crc32(shared.encode('utf-8')) & 0x7fffffff, shared)
+            )
+    conn.executemany("INSERT INTO state_attributes VALUES (?, ?, ?)", attribute_rows)
+
+    conn.executemany(
+        "INSERT INTO event_types (event_type_id, event_type) VALUES (?, ?)",
+        [(i + 1, event_type) for i, event_type in enumerate(EVENT_TYPES)]
+    )
+    automations = np.flatnonzero(domains == 'automation')
+    data_rows = [
+        (i + 1, i + 1, json.dumps({
+            'name': entity_ids[a].split('.', 1)[1].replace('_', ' ').title(),
+            'entity_id': entity_ids[a],
+            'source': 'state of binary_sensor',
+        }))
+        for i, a in enumerate(automations)
+    ]
+    conn.executemany("INSERT INTO event_data VALUES (?, ?, ?)", data_rows)
+
+    end_ts = (end or datetime.now()).timestamp()
+    start_ts = end_ts - timedelta(days=days).total_seconds()
+    span = (end_ts - start_ts) / max(1, -(-rows // batch_size))
+    last_state_id = np.zeros(len(entity_ids), dtype=np.int64)  # 엔티티별 직전 state_id
+    state_id = event_id = logbook_id = 0
+    automated = np.isin(domains, AUTOMATED_DOMAINS)
+    motion = domains == 'binary_sensor'
+
+    for batch_start in range(0, rows, batch_size):
+        n = min(batch_size, rows - batch_start)
+        t0 = start_ts + span * (batch_start // batch_size)
+        ts = np.sort(t0 + rng.random(n) * span)
+        entity = rng.choice(len(entity_ids), n, p=weights)
+        row_domains = domains[entity]
+        ids = np.arange(state_id + 1, state_id + n + 1)
+        state_id += n
+
+        # 엔티티별 직전 state_id (배치 경계를 넘어 이어진다)
+        previous = pd.Series(ids).groupby(entity).shift(1).to_numpy(dtype=float, copy=True)
+        first = np.isnan(previous)
+        previous[first] = last_state_id[entity[first]]
+        old_state = np.where(previous > 0, previous, np.nan)
+        last = pd.Series(ids).groupby(entity).last()
+        last_state_id[last.index.to_numpy()] = last.to_numpy()
+
+        states = _states_for(row_domains, rng)
+        # 센서는 속성만 바뀌는 갱신이 많다 (last_changed_ts는 상태가 바뀔 때만 기록)
+        attribute_only = (row_domains == 'sensor') & (rng.random(n) < 0.3)
+        last_changed = np.where(attribute_only, ts - rng.random(n) * 600, np.nan)
+        attributes_id = attributes_base[entity] + rng.integers(0, variants[entity])
+
+        contexts = _contexts(n, rng)
+        parents = [None] * n
+
+        # 자동화가 바꾼 조명/스위치/커버: 직전 모션 감지가 부모 context, 자동화 실행 이벤트가 같은 context
+        effects = np.flatnonzero(automated[entity] & (rng.random(n) < 0.3))
+        motion_rows = np.flatnonzero(motion[entity])
+        event_rows, logbook_rows = [], []
+        for row in effects:
+            trigger = np.searchsorted(motion_rows, row) - 1
+            parent = contexts[motion_rows[trigger]] if trigger >= 0 else None
+            parents[row] = parent
+            automation = automations[rng.integers(0, len(automations))]
+            event_id += 1
+            event_rows.append((
+                event_id, float(ts[row] - 0.2), int(automations.searchsorted(automation)) + 1,
+                contexts[row], parent, 1,
+            ))
+            logbook_id += 1
+            logbook_rows.append((
+                logbook_id, float(ts[row] - 0.2), entity_ids[automation].split('.', 1)[1],
+                'triggered', 'automation', entity_ids[automation], contexts[row],
+            ))
+        # 그 외 이벤트 (서비스 호출, 로그북 항목 등)
+        for row in rng.choice(n, max(1, n // 50), replace=False):
+            event_id += 1
+            event_rows.append((
+                event_id, float(ts[row]), None, _contexts(1, rng)[0], None,
+                int(rng.integers(2, len(EVENT_TYPES) + 1)),
+            ))
+
+        conn.executemany(
+            "INSERT INTO states (state_id, state, last_changed_ts, last_updated_ts, "
+            "old_state_id, attributes_id, origin_idx, context_id_bin, context_parent_id_bin, "
+            "metadata_id) VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?)",
+            zip(
+                ids.tolist(), states.tolist(),
+                [None if np.isnan(v) else v for v in last_changed.tolist()],
+                ts.tolist(),
+                [None if np.isnan(v) else int(v) for v in old_state.tolist()],
+                attributes_id.tolist(), contexts, parents, (entity + 1).tolist(),
+            )
+        )
+        conn.executemany(
+            "INSERT INTO events (event_id, time_fired_ts, data_id, context_id_bin, "
+            "context_parent_id_bin, event_type_id, origin_idx) VALUES (?, ?, ?, ?, ?, ?, 0)",
+            event_rows
+        )
+        conn.executemany("INSERT INTO logbook VALUES (?, ?, ?, ?, ?, ?, ?)", logbook_rows)
+        conn.commit()
+
+    conn.executescript(INDEXES + "ANALYZE;")
+    counts = {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ('states', 'states_meta', 'state_attributes', 'events', 'event_data',
+                      'event_types', 'logbook')
+    }
+    conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="합성 Home Assistant recorder SQLite DB 생성")
+    parser.add_argument('path', help="만들 SQLite 파일 경로")
+    parser.add_argument('--rows', type=int, default=100000, help="states 행 수")
+    parser.add_argument('--entities', type=int, help="엔티티 수 (기본값: 행 수에 비례)")
+    parser.add_argument('--days', type=int, default=30, help="데이터 기간 (일)")
+    parser.add_argument('--seed', type=int, default=0, help="난수 시드")
+    parser.add_argument('--end', type=datetime.fromisoformat,
+                        help="데이터의 마지막 시각 (예: 2024-01-31T00:00:00, 기본값: 현재)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(args.path, args.rows, args.entities, args.days, seed=args.seed, end=args.end)
+    print(f"생성 완료 ({time.perf_counter() - start:.1f}초): {counts}")
+    print(f"DB_URL=sqlite:///{os.path.abspath(args.path)}")
+
+
+if __name__ == "__main__":
+    main()
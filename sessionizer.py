@@ -0,0 +1,159 @@
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from next_action_predictor import IGNORED_STATES
+
+# 자동화가 실행됐음을 나타내는 로그북 이벤트 타입
+AUTOMATION_EVENT_TYPES = ('automation_triggered', 'script_started')
+
+# 부모 context를 따라 올라가는 최대 단계 (순환 방지)
+MAX_CONTEXT_DEPTH = 16
+
+
+def _normalize(logbook):
+    """DB 로그북(get_logbook)이나 REST 로그북을 공통 컬럼으로 맞추고 시간순 정렬
+
+    Returns:
+        DataFrame: ts, event_type, entity_id, state(상태 변경 행만), context_id, context_parent_id
+    """
+    df = logbook if isinstance(logbook, pd.DataFrame) else pd.DataFrame(logbook)
+    if 'time_fired' in df.columns:
+        when = df['time_fired']
+        event_type = df['event_type']
+        state = df['entity_state'].where(event_type == 'state_changed')
+    else:
+        when = df['when']
+        # REST 응답은 state가 있는 항목이 상태 변경이다
+        state = df['state'] if 'state' in df.columns else pd.Series(np.nan, index=df.index)
+        event_type = df.get('event_type', pd.Series(np.nan, index=df.index))
+        event_type = event_type.where(event_type.notna(), np.where(state.notna(), 'state_changed', None))
+
+    when = pd.to_datetime(when, utc=True, format='ISO8601')
+    out = pd.DataFrame({
+        'ts': (when - pd.Timestamp(0, tz='UTC')) / pd.Timedelta(seconds=1),
+        'event_type': event_type,
+        'entity_id': df.get('entity_id'),
+        'state': state,
+        'context_id': df.get('context_id'),
+        'context_parent_id': df.get('context_parent_id'),
+    }, index=df.index)
+    return out.sort_values('ts', kind='stable').reset_index(drop=True)
+
+
+def resolve_root_contexts(context_ids, parent_ids, max_depth=MAX_CONTEXT_DEPTH):
+    """각 행의 최상위(root) context
+
+    context id를 정수 코드로 바꾸고 코드별 부모 배열을 만든 뒤, parent = parent[parent]
+    (포인터 점프)를 바뀌지 않을 때까지 반복해 모든 사슬을 한꺼번에 root까지 올린다.
+    반복 횟수는 가장 긴 부모 사슬 길이의 로그에 비례한다.
+
+    Returns:
+        tuple: (행별 root 코드 배열, 행별 자기 context 코드 배열, 코드 -> context id 배열)
+            context가 없는 행은 혼자 하나의 root가 되도록 코드 표 뒤쪽의 고유 코드를 받는다.
+    """
+    n = len(context_ids)
+    codes, uniques = pd.factorize(
+        pd.concat([pd.Series(context_ids), pd.Series(parent_ids)], ignore_index=True)
+    )
+    own, parents = codes[:n], codes[n:]
+
+    parent = np.arange(len(uniques))
+    linked = (own >= 0) & (parents >= 0) & (own != parents)
+    parent[own[linked]] = parents[linked]
+    for _ in range(max_depth):
+        jumped = parent[parent]
+        if np.array_equal(jumped, parent):
+            break
+        parent = jumped
+
+    missing = own < 0
+    roots = np.where(missing, 0, parent[np.maximum(own, 0)])
+    roots[missing] = len(uniques) + np.arange(missing.sum())
+    return roots, own, np.asarray(uniques, dtype=object)
+
+
+def sessionize(logbook, max_gap=timedelta(minutes=5)):
+    """로그북을 context 단위 에피소드로 묶기
+
+    같은 root context(같은 사용자 동작/자동화 실행과 그로 인해 이어진 변경)를 공유하는 행을
+    하나의 에피소드로 묶되, 같은 root 안에서도 max_gap보다 오래 조용하면 새 에피소드로 나눈다.
+    (root, 시각) 순으로 한 번 정렬한 뒤 인접 행만 비교하므로 몇 달치 로그북도 빠르다.
+
+    Returns:
+        tuple: (episode/root_context 컬럼이 붙은 행 DataFrame, 에피소드 요약 DataFrame)
+            요약 컬럼: episode, start_ts, end_ts, rows, changes, root_context,
+            entity_id/state/change_ts(첫 상태 변경과 그 시각), automation(자동화 이벤트 포함 여부),
+            automation_root(자동화 실행 자체가 시작점인지 여부)
+    """
+    rows = _normalize(logbook)
+    episode_columns = [
+        'episode', 'start_ts', 'end_ts', 'rows', 'changes', 'root_context',
+        'entity_id', 'state', 'change_ts', 'automation', 'automation_root',
+    ]
+    if rows.empty:
+        rows['root_context'] = pd.Series(dtype=object)
+        rows['episode'] = pd.Series(dtype='int64')
+        return rows, pd.DataFrame(columns=episode_columns)
+
+    n = len(rows)
+    roots, own, labels = resolve_root_contexts(rows['context_id'], rows['context_parent_id'])
+    ts = rows['ts'].to_numpy()
+
+    # root별로 모으되 root 안에서는 원래(시간) 순서 유지
+    order = np.lexsort((np.arange(n), roots))
+    sorted_roots, sorted_ts = roots[order], ts[order]
+    boundary = np.ones(n, dtype=bool)
+    boundary[1:] = (sorted_roots[1:] != sorted_roots[:-1]) | (np.diff(sorted_ts) > max_gap.total_seconds())
+    segment = np.empty(n, dtype=np.int64)
+    segment[order] = np.cumsum(boundary) - 1
+
+    # 에피소드 번호는 시작 시각 순서 (구간의 첫 행 위치 순서)
+    first_rows = order[boundary]
+    rank = np.empty(len(first_rows), dtype=np.int64)
+    rank[np.argsort(first_rows)] = np.arange(len(first_rows))
+    episode = rank[segment]
+    rows['episode'] = episode
+    known = np.where(roots < len(labels), roots, -1)
+    rows['root_context'] = pd.Categorical.from_codes(known, categories=pd.Index(labels, dtype=object))
+
+    is_change = (rows['event_type'].eq('state_changed') & rows['state'].notna()).to_numpy()
+    is_automation = rows['event_type'].isin(AUTOMATION_EVENT_TYPES).to_numpy()
+    count = len(first_rows)
+    starts = np.sort(first_rows)
+
+    episodes = pd.DataFrame({
+        'episode': np.arange(count),
+        'start_ts': ts[starts],
+        'end_ts': pd.Series(ts).groupby(episode).max().to_numpy(),
+        'rows': np.bincount(episode, minlength=count),
+        'changes': np.bincount(episode, weights=is_change, minlength=count).astype(np.int64),
+        'root_context': rows['root_context'].to_numpy()[starts],
+        'automation': np.bincount(episode, weights=is_automation, minlength=count) > 0,
+        # 사람이나 기기가 아니라 자동화 실행 자체가 root인 경우 (시간 트리거 등)
+        'automation_root': np.bincount(
+            episode, weights=is_automation & (own == roots), minlength=count
+        ) > 0,
+    })
+    first_change = rows[is_change].groupby('episode')[['entity_id', 'state', 'ts']].first()
+    first_change = first_change.rename(columns={'ts': 'change_ts'})
+    episodes = episodes.join(first_change, on='episode')
+    return rows, episodes[episode_columns]
+
+
+def episode_actions(episodes, drop_automation_root=True, exclude_states=IGNORED_STATES):
+    """에피소드마다 첫 상태 변경 하나만 남긴 행동 시퀀스
+
+    자동화가 만들어낸 나머지 변경(에코)은 빠지고, 시간 트리거처럼 자동화가 시작점인
+    에피소드는 drop_automation_root면 통째로 뺀다.
+
+    Returns:
+        DataFrame: ts, entity_id, state (actions_from_logbook과 같은 형식)
+    """
+    mask = episodes['entity_id'].notna() & episodes['state'].notna()
+    if drop_automation_root:
+        mask &= ~episodes['automation_root'].astype(bool)
+    if exclude_states:
+        mask &= ~episodes['state'].isin(list(exclude_states))
+    # 행동 시각은 에피소드 시작(자동화 이벤트 등일 수 있다)이 아니라 그 상태 변경의 시각
+    actions = episodes.loc[mask, ['change_ts', 'entity_id', 'state']].rename(columns={'change_ts': 'ts'})
+    return actions.reset_index(drop=True)
@@ -0,0 +1,115 @@
+import json
+import pandas as pd
+
+
+def get_object_size(obj):
+    """객체의 직렬화 크기(바이트)를 계산"""
+    return len(json.dumps(obj).encode('utf-8'))
+
+
+class StatesSnapshot:
+    """/api/states 응답을 한 번에 인덱싱한 스냅샷
+
+    엔티티별 dict 인덱스, 직렬화 크기, 도메인별 엔티티 수/크기를 fetch 시점에
+    한 번만 계산해 두어 Streamlit 재실행마다 직렬화나 선형 탐색을 반복하지 않는다.
+    """
+
+    def __init__(self, states):
+        self.by_id = {}
+        self.sizes = {}
+        self.by_domain = {}
+        self.domain_sizes = {}
+        for state in states:
+            self._index(state)
+        self._json_cache = (None, None)
+        self._df = None
+
+    def _index(self, state):
+        entity_id = state['entity_id']
+        domain = entity_id.split('.')[0]
+        size = get_object_size(state)
+        self.by_id[entity_id] = state
+        self.sizes[entity_id] = size
+        self.by_domain.setdefault(domain, set()).add(entity_id)
+        self.domain_sizes[domain] = self.domain_sizes.get(domain, 0) + size
+
+    def update(self, entity_id, new_state):
+        """state_changed 하나를 반영 (new_state가 None이면 엔티티 제거)"""
+        domain = entity_id.split('.')[0]
+        if entity_id in self.by_id:
+            del self.by_id[entity_id]
+            self.domain_sizes[domain] -= self.sizes.pop(entity_id)
+            self.by_domain[domain].discard(entity_id)
+            if not self.by_domain[domain]:
+                del self.by_domain[domain]
+                del self.domain_sizes[domain]
+        if new_state is not None:
+            self._index(new_state)
+        self._json_cache = (None, None)
+        self._df = None
+
+    def copy(self):
+        """현재 인덱스의 얕은 복사본 (상태 dict는 공유)"""
+        snapshot = StatesSnapshot([])
+        snapshot.by_id = dict(self.by_id)
+        snapshot.sizes = dict(self.sizes)
+        snapshot.by_domain = {domain: set(ids) for domain, ids in self.by_domain.items()}
+        snapshot.domain_sizes = dict(self.domain_sizes)
+        return snapshot
+
+    def __len__(self):
+        return len(self.by_id)
+
+    @property
+    def states(self):
+        """원본 상태 목록"""
+        return list(self.by_id.values())
+
+    @property
+    def df(self):
+        """엔티티 목록 DataFrame (domain, entity_id, state, last_updated, size)"""
+        if self._df is None:
+            self._df = pd.DataFrame(
+                [
+                    {
+                        'domain': entity_id.split('.')[0],
+                        'entity_id': entity_id,
+                        'state': state['state'],
+                        'last_updated': state['last_updated'],
+                        'size': self.sizes[entity_id],
+                    }
+                    for entity_id, state in self.by_id.items()
+                ],
+                columns=['domain', 'entity_id', 'state', 'last_updated', 'size']
+            )
+        return self._df
+
+    @property
+    def domains(self):
+        """정렬된 도메인 목록"""
+        return sorted(self.by_domain)
+
+    def domain_count(self, domain):
+        """도메인의 엔티티 수"""
+        return len(self.by_domain.get(domain, ()))
+
+    def total_size(self, domains):
+        """여러 도메인의 전체 직렬화 크기"""
+        return sum(self.domain_sizes.get(domain, 0) for domain in domains)
+
+    def selected_states(self, domains):
+        """선택된 도메인의 상태 목록 (entity_id 순)"""
+        entity_ids = sorted(
+            entity_id for domain in domains for entity_id in self.by_domain.get(domain, ())
+        )
+        return [self.by_id[entity_id] for entity_id in entity_ids]
+
+    def selected_json(self, domains):
+        """선택된 도메인 데이터를 들여쓴 JSON으로 (같은 선택이면 다시 직렬화하지 않음)"""
+        key = frozenset(domains)
+        if self._json_cache[0] != key:
+            self._json_cache = (
+                key,
+                json.dumps(self.selected_states(domains), indent=2, ensure_ascii=False)
+            )
+        return self._json_cache[1]
@@ -0,0 +1,54 @@
+import json
+import sqlite3
+from datetime import datetime, timezone
+import pytest
+from recorder_generator import SCHEMA
+from ha_db_reader import HomeAssistantDB
+
+START = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+END = datetime(2024, 1, 1, 13, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    path = tmp_path / 'recorder.db'
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany('INSERT INTO states_meta VALUES (?, ?)', [
+        (1, 'automation.bedroom'),
+        (2, 'light.bedroom'),
+    ])
+    conn.execute('INSERT INTO state_attributes VALUES (1, 0, ?)',
+                 (json.dumps({'friendly_name': 'Bedroom'}),))
+    start = START.timestamp()
+    conn.executemany(
+        'INSERT INTO states (state_id, metadata_id, state, attributes_id, '
+        'last_changed_ts, last_updated_ts) VALUES (?, ?, ?, ?, ?, ?)',
+        [
+            # 구간 이전 상태 (기준점)
+            (1, 1, 'on', 1, start - 3600, start - 3600),
+            # 구간 안 첫 상태 변경은 이벤트보다 늦다
+            (2, 1, 'off', 1, start + 1200, start + 1200),
+            (3, 2, 'on', None, start + 60, start + 60),
+        ],
+    )
+    conn.execute("INSERT INTO event_types VALUES (1, 'automation_triggered')")
+    conn.execute('INSERT INTO event_data VALUES (1, 0, ?)',
+                 (json.dumps({'entity_id': 'automation.bedroom', 'name': 'Bedroom'}),))
+    conn.execute('INSERT INTO events (event_id, event_type_id, data_id, time_fired_ts) '
+                 'VALUES (1, 1, 1, ?)', (start + 600,))
+    conn.commit()
+    conn.close()
+    monkeypatch.setenv('DB_URL', f'sqlite:///{path}')
+    return HomeAssistantDB()
+
+
+def test_event_before_first_state_change_uses_seed_state(db):
+    logbook = db.get_logbook(START, END)
+    event = logbook[logbook['event_type'] == 'automation_triggered'].iloc[0]
+    assert event['entity_state'] == 'on'
+    assert event['entity_attributes'] == {'friendly_name': 'Bedroom'}
+
+    # 기준점 행은 로그북 행이 되지 않는다
+    changes = logbook[logbook['event_type'] == 'state_changed']
+    assert sorted(changes['message']) == ['changed to off', 'changed to on']
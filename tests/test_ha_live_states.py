@@ -0,0 +1,178 @@
+import json
+import time
+import threading
+import pytest
+from websockets.sync.server import serve
+from ha_live_states import HALiveStates
+
+TOKEN = 'test-token'
+
+
+def wait_for(condition, timeout=5):
+    """condition()이 참이 될 때까지 대기"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def make_state(entity_id, state, last_updated):
+    return {
+        'entity_id': entity_id,
+        'state': state,
+        'attributes': {'friendly_name': entity_id},
+        'last_updated': last_updated,
+        'last_changed': last_updated,
+    }
+
+
+class FakeHomeAssistant:
+    """Home Assistant WebSocket API 흉내 (auth, subscribe_events, get_states만 지원)"""
+
+    def __init__(self, states):
+        self.states = {state['entity_id']: state for state in states}
+        self.connections = []
+        self.auth_attempts = 0
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        self._server = serve(self._handler, 'localhost', 0)
+        self.url = f"ws://localhost:{self._server.socket.getsockname()[1]}/api/websocket"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._thread.join(timeout=5)
+
+    def _handler(self, ws):
+        ws.send(json.dumps({'type': 'auth_required'}))
+        message = json.loads(ws.recv())
+        self.auth_attempts += 1
+        if message.get('type') != 'auth' or message.get('access_token') != TOKEN:
+            ws.send(json.dumps({'type': 'auth_invalid', 'message': 'Invalid access token'}))
+            return
+        ws.send(json.dumps({'type': 'auth_ok'}))
+        with self._lock:
+            self.connections.append(ws)
+
+        for raw in ws:
+            message = json.loads(raw)
+            if message['type'] == 'subscribe_events':
+                with self._lock:
+                    self._subscriptions[ws] = message['id']
+                result = None
+            elif message['type'] == 'get_states':
+                with self._lock:
+                    result = list(self.states.values())
+            else:
+                ws.send(json.dumps({
+                    'id': message['id'], 'type': 'result', 'success': False,
+                    'error': {'code': 'unknown_command'},
+                }))
+                continue
+            ws.send(json.dumps({
+                'id': message['id'], 'type': 'result', 'success': True, 'result': result,
+            }))
+
+    def change_state(self, entity_id, state, last_updated):
+        """상태를 바꾸고 구독 중인 최신 연결에 state_changed 전송"""
+        with self._lock:
+            old_state = self.states.get(entity_id)
+            new_state = make_state(entity_id, state, last_updated)
+            self.states[entity_id] = new_state
+            ws = self.connections[-1]
+            subscription_id = self._subscriptions[ws]
+        ws.send(json.dumps({
+            'id': subscription_id,
+            'type': 'event',
+            'event': {
+                'event_type': 'state_changed',
+                'data': {'entity_id': entity_id, 'old_state': old_state, 'new_state': new_state},
+            },
+        }))
+
+    def drop_connection(self):
+        """최신 연결을 서버 쪽에서 끊기"""
+        with self._lock:
+            ws = self.connections[-1]
+        ws.close()
+
+
+@pytest.fixture
+def fake_ha():
+    states = [
+        make_state('light.living_room', 'off', '2024-01-01T00:00:00+00:00'),
+        make_state('switch.fan', 'on', '2024-01-01T00:00:00+00:00'),
+    ]
+    with FakeHomeAssistant(states) as server:
+        yield server
+
+
+@pytest.fixture
+def live(fake_ha):
+    live = HALiveStates(ws_url=fake_ha.url, token=TOKEN, reconnect_delay=0.05)
+    yield live
+    live.stop()
+
+
+def test_initial_states_after_auth(fake_ha, live):
+    live.start()
+    assert live.wait_ready(timeout=5)
+    assert live.connected
+    assert fake_ha.auth_attempts == 1
+
+    snapshot = live.get_snapshot()
+    assert len(snapshot) == 2
+    assert snapshot.by_id['light.living_room']['state'] == 'off'
+    assert snapshot.domains == ['light', 'switch']
+
+
+def test_state_changed_updates_snapshot(fake_ha, live):
+    changes = []
+    live.add_listener(lambda entity_id, old, new: changes.append((entity_id, new['state'])))
+    live.start()
+    assert live.wait_ready(timeout=5)
+    version = live.version
+
+    fake_ha.change_state('light.living_room', 'on', '2024-01-01T00:01:00+00:00')
+    fake_ha.change_state('sensor.new', '21.5', '2024-01-01T00:01:00+00:00')
+    assert wait_for(lambda: live.events_received == 2)
+
+    version_after, snapshot = live.get_versioned_snapshot()
+    assert version_after == version + 2
+    assert snapshot.by_id['light.living_room']['state'] == 'on'
+    assert snapshot.domain_count('sensor') == 1
+    assert changes == [('light.living_room', 'on'), ('sensor.new', '21.5')]
+
+
+def test_reconnect_reloads_states(fake_ha, live):
+    live.start()
+    assert live.wait_ready(timeout=5)
+
+    # 이벤트로 전달되지 않은 변경은 재연결 후 get_states로 다시 받아야 한다
+    with fake_ha._lock:
+        fake_ha.states['switch.fan'] = make_state('switch.fan', 'off', '2024-01-01T00:02:00+00:00')
+    fake_ha.drop_connection()
+    assert wait_for(lambda: len(fake_ha.connections) == 2 and live.connected)
+    assert wait_for(lambda: live.get_snapshot().by_id['switch.fan']['state'] == 'off')
+
+    fake_ha.change_state('light.living_room', 'on', '2024-01-01T00:03:00+00:00')
+    assert wait_for(lambda: live.get_snapshot().by_id['light.living_room']['state'] == 'on')
+
+
+def test_invalid_token_stops_without_retry(fake_ha):
+    live = HALiveStates(ws_url=fake_ha.url, token='wrong', reconnect_delay=0.05)
+    live.start()
+    try:
+        assert wait_for(lambda: live.error is not None)
+        assert not live.wait_ready(timeout=0.2)
+        assert 'Invalid access token' in live.error
+        assert not live.connected
+        assert fake_ha.auth_attempts == 1
+    finally:
+        live.stop()
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta, timezone
+from ha_logbook import LogbookCache
+
+
+def make_fetcher(entries):
+    """항상 같은 항목을 돌려주는 fetcher (호출 횟수 기록)"""
+    calls = []
+
+    def fetcher(start_time, end_time):
+        calls.append((start_time, end_time))
+        return list(entries), []
+
+    fetcher.calls = calls
+    return fetcher
+
+
+def test_refetch_does_not_duplicate_non_ascii_entries(tmp_path):
+    now = datetime.now()
+    when = (now - timedelta(minutes=1)).astimezone(timezone.utc).isoformat()
+    entries = [
+        {'when': when, 'name': '거실 조명', 'message': '켜짐', 'entity_id': 'light.living_room'},
+        {'when': when, 'name': 'Fan', 'message': 'turned on', 'entity_id': 'switch.fan'},
+    ]
+    fetcher = make_fetcher(entries)
+    cache = LogbookCache(root=str(tmp_path))
+
+    # 끝이 현재 시각 근처라 덮인 구간으로 기록되지 않으므로 매번 다시 가져온다
+    for _ in range(3):
+        result, failed = cache.fetch(now - timedelta(hours=1), now, fetcher)
+        assert failed == []
+        assert sorted(entry['name'] for entry in result) == ['Fan', '거실 조명']
+
+    assert len(fetcher.calls) == 3
+
+
+def test_covered_range_is_served_from_disk(tmp_path):
+    start = datetime(2024, 1, 1, 0, 0)
+    end = start + timedelta(hours=2)
+    when = (start + timedelta(minutes=30)).astimezone(timezone.utc).isoformat()
+    fetcher = make_fetcher([{'when': when, 'name': '현관문', 'message': '열림'}])
+    cache = LogbookCache(root=str(tmp_path))
+
+    first, _ = cache.fetch(start, end, fetcher)
+    second, _ = cache.fetch(start, end, fetcher)
+    assert first == second == [{'when': when, 'name': '현관문', 'message': '열림'}]
+    assert len(fetcher.calls) == 1
@@ -0,0 +1,31 @@
+import sqlite3
+from datetime import datetime
+from recorder_generator import generate
+from ha_db_reader import HomeAssistantDB
+from ha_recorder_mirror import RecorderMirror
+
+
+def test_sync_picks_up_rows_committed_below_watermark(tmp_path, monkeypatch):
+    path = tmp_path / 'recorder.db'
+    generate(str(path), rows=2000, days=3, end=datetime(2024, 1, 1))
+    conn = sqlite3.connect(path)
+    # 늦게 커밋된 트랜잭션 흉내: 워터마크보다 작은 ID의 행을 첫 동기화 뒤에 넣는다
+    late = conn.execute('SELECT * FROM states ORDER BY state_id DESC LIMIT 5 OFFSET 20').fetchall()
+    conn.executemany('DELETE FROM states WHERE state_id = ?', [(row[0],) for row in late])
+    conn.commit()
+
+    monkeypatch.setenv('DB_URL', f'sqlite:///{path}')
+    db = HomeAssistantDB()
+    mirror = RecorderMirror(str(tmp_path / 'mirror'))
+    assert mirror.sync(db)['states'] == 1995
+
+    placeholders = ', '.join('?' * len(late[0]))
+    conn.executemany(f'INSERT INTO states VALUES ({placeholders})', late)
+    conn.commit()
+    conn.close()
+    assert mirror.sync(db)['states'] == 5
+    assert mirror.sync(db)['states'] == 0
+
+    states = mirror.read_states()
+    assert len(states) == 2000
+    assert states['state_id'].is_unique
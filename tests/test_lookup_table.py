@@ -0,0 +1,40 @@
+import pandas as pd
+from lookup_table import LookupTable, match_names
+
+
+class FakeDB:
+    """LookupTable이 쓰는 read_sql만 흉내 내는 DB (읽은 횟수 기록)"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.reads = 0
+
+    def read_sql(self, query, params=None, use_cache=True):
+        self.reads += 1
+        return pd.DataFrame(self.rows, columns=['metadata_id', 'entity_id'])
+
+
+def test_match_names_ignores_case():
+    names = pd.Series(['light.living_room', 'switch.fan', None])
+    assert match_names(names, 'LIGHT').tolist() == [True, False, False]
+    assert match_names(names, 'Switch.*').tolist() == [False, True, False]
+
+
+def test_match_reloads_once_when_nothing_matches():
+    db = FakeDB([(1, 'light.living_room')])
+    table = LookupTable(db, 'states_meta', 'metadata_id', 'entity_id', refresh_seconds=300)
+    assert table.match('light') == [1]
+
+    db.rows.append((2, 'sensor.new'))
+    assert table.match('sensor') == [2]
+    assert db.reads == 2
+
+    # 바로 이어진 빗나간 조회는 표를 다시 읽지 않는다
+    assert table.match('garage') == []
+    assert table.get('light.typo') is None
+    assert db.reads == 2
+
+    # 간격이 지나면 빗나간 조회가 다시 표를 읽는다
+    table._last_miss_reload -= LookupTable.MISS_RELOAD_SECONDS
+    assert table.match('garage') == []
+    assert db.reads == 3
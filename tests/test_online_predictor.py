@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+from online_predictor import OnlinePredictor
+
+
+def test_update_many_skips_missing_entity_and_state():
+    predictor = OnlinePredictor()
+    actions = pd.DataFrame({
+        'ts': [1.0, 2.0, 3.0, 4.0, 5.0],
+        'entity_id': ['light.x', 'light.x', np.nan, 'light.x', 'light.y'],
+        'state': [np.nan, 'on', 'on', None, 'unavailable'],
+    })
+    predictor.update_many(actions)
+    predictor.update_many(actions)
+
+    # NaN 행이 반복될 때마다 새 행동 키가 생기지 않아야 한다
+    assert predictor.ids == {('light.x', 'on'): 0}
+    assert predictor.events == 2